@@ -0,0 +1,212 @@
+"""
+Benchmark of the orchestration overhead of the pipeline, run against the fake Metashape module
+of the test suite, so it needs neither a license nor GPUs.
+
+A synthetic campaign tree of '_unprocessed' folders is generated and the time spent outside of
+Metashape is measured for scanning, chunk collection, logging, file moves and complete runs of
+MetashapeProcessor, in which every Metashape call takes a configurable latency.
+
+Usage:
+    python benchmarks/benchmark.py --folders 2 --subfolders 4 --images 1000 --latency 0.01
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tests")]
+
+import fake_metashape
+
+# Spawned scheduler workers import this module again, so they get the fake as well
+try:
+    import Metashape
+except ImportError:
+    sys.modules["Metashape"] = fake_metashape
+
+from pipeline.catalog import ImageCatalog
+from pipeline.transfer import TransferEngine
+from pipeline.metashape_processor import MetashapeProcessor
+from pipeline.utils import setup_logger, stop_logging
+
+# Metashape calls that make up the processing stages
+STAGE_METHODS = ["addPhotos", "matchPhotos", "alignCameras", "buildDepthMaps", "buildPointCloud", "buildModel",
+                 "smoothModel", "buildDem", "buildOrthomosaic", "exportRaster", "exportPointCloud"]
+
+def make_campaign(input_folder, folders, subfolders, images, image_bytes):
+    """
+    Generates a campaign tree of '_unprocessed' flight folders with RGB photos.
+
+    Args:
+        input_folder (str): Folder the flight folders are created in.
+        folders (int): Number of flight folders.
+        subfolders (int): Photo subfolders (chunks) per flight folder.
+        images (int): Photos per subfolder.
+        image_bytes (int): Size of every photo.
+
+    Returns:
+        list: Paths of the flight folders.
+    """
+    content = b"\0" * image_bytes
+    folder_paths = []
+    for folder in range(folders):
+        folder_path = os.path.join(input_folder, f"flight{folder:03d}_unprocessed")
+        for subfolder in range(subfolders):
+            photos_dir = os.path.join(folder_path, "photos", f"sub{subfolder:02d}")
+            os.makedirs(photos_dir)
+            for image in range(images):
+                with open(os.path.join(photos_dir, f"DJI_{image:04d}.JPG"), 'wb') as file:
+                    file.write(content)
+        folder_paths.append(folder_path)
+    return folder_paths
+
+def measure(results, name, function, *args):
+    """
+    Runs a function and stores its wall time in seconds under the given name.
+
+    Returns:
+        The result of the function.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    results[name] = round(time.perf_counter() - start, 4)
+    return result
+
+def benchmark_logging(log_file, lines, progress_interval):
+    """
+    Writes Metashape-like console output through the redirected stdout, half of it progress lines.
+    """
+    setup_logger(log_file, progress_interval)
+    try:
+        for line in range(lines):
+            if line % 2:
+                sys.stdout.write(f"BuildDepthMaps: {100 * line / lines:.1f}%\r")
+            else:
+                print(f"processing camera {line} of {lines}")
+    finally:
+        stop_logging()
+
+def stage_seconds(input_folder):
+    """
+    Sums the measured stage wall times of the run reports of all processed folders.
+    """
+    total = 0.0
+    for folder_name in os.listdir(input_folder):
+        export_folder = os.path.join(input_folder, folder_name, "export")
+        for report_name in os.listdir(export_folder) if os.path.isdir(export_folder) else []:
+            if report_name.endswith("_run_report.json") and "_preview" not in report_name:
+                with open(os.path.join(export_folder, report_name)) as file:
+                    totals = json.load(file)["stage_totals"]
+                total += sum(stage["wall_seconds"] for stage in totals.values())
+    return total
+
+def run(work_dir, folders=2, subfolders=4, images=250, image_kb=64, latency=0.0, save_latency=0.0, workers=1,
+        log_lines=10000):
+    """
+    Runs all benchmarks on a fresh campaign tree.
+
+    Args:
+        work_dir (str): Folder the campaign, temporary folder and logs are created in.
+        folders (int): Number of flight folders.
+        subfolders (int): Photo subfolders (chunks) per flight folder.
+        images (int): Photos per subfolder.
+        image_kb (int): Size of every photo in KiB.
+        latency (float): Seconds every Metashape processing call takes.
+        save_latency (float): Seconds every project save takes.
+        workers (int): Chunks processed in parallel by CPU-only scheduler workers.
+        log_lines (int): Console lines written in the logging benchmark.
+
+    Returns:
+        dict: Seconds per benchmark, plus the derived orchestration overhead of the processing run.
+    """
+    input_folder = os.path.join(work_dir, "input")
+    tmp_folder = os.path.join(work_dir, "tmp")
+    os.makedirs(tmp_folder)
+    results = {"folders": folders, "chunks": folders * subfolders, "images": folders * subfolders * images}
+
+    folder_paths = measure(results, "generate_seconds", make_campaign, input_folder, folders, subfolders, images,
+                           image_kb * 1024)
+
+    # Scanning: first pass over the tree, then the cached pass of the processor after the summary
+    catalog = ImageCatalog(metadata={"enabled": False})
+    measure(results, "scan_cold_seconds", lambda: [catalog.flight(path) for path in folder_paths])
+    measure(results, "scan_cached_seconds", lambda: [catalog.flight(path) for path in folder_paths])
+
+    measure(results, "logging_seconds", benchmark_logging, os.path.join(work_dir, "logging.log"), log_lines, 10.0)
+
+    # File moves of a copy of the first flight into a second folder
+    source = os.path.join(work_dir, "transfer_source")
+    shutil.copytree(os.path.join(folder_paths[0], "photos"), source)
+    stats = measure(results, "transfer_seconds", TransferEngine().move_tree, source,
+                    os.path.join(work_dir, "transfer_dest"))
+    results["transfer_mb_per_s"] = stats["mb_per_s"]
+
+    # Complete processing runs with the modelled Metashape latencies
+    method_latencies = dict.fromkeys(STAGE_METHODS, latency)
+    method_latencies["save"] = save_latency
+    fake_metashape.latencies.update(method_latencies)
+    os.environ["FAKE_METASHAPE_LATENCIES"] = json.dumps(method_latencies)
+
+    config = {
+        "input_folder": input_folder,
+        "tmp_folder": tmp_folder,
+        "gpu_option": "cpu",
+        "cpu_enabled": True,
+        "disk": {"reserve_gb": 0},
+        "metadata": {"enabled": False},
+        "parallel": {"cpu_workers": workers, "max_workers": workers},
+    }
+    log_file = os.path.join(work_dir, "run.log")
+    open(log_file, 'w').close()
+    try:
+        processor = MetashapeProcessor(config, log_file, catalog)
+        measure(results, "collect_seconds", lambda: [processor.collect_chunk_jobs(path) for path in folder_paths])
+        measure(results, "process_seconds", processor.process_folders)
+    finally:
+        stop_logging()
+        fake_metashape.latencies.clear()
+        os.environ.pop("FAKE_METASHAPE_LATENCIES", None)
+
+    # Stage time includes the latencies; with several workers the stages overlap
+    results["stage_seconds"] = round(stage_seconds(input_folder), 4)
+    results["overhead_seconds"] = round(results["process_seconds"] - results["stage_seconds"] / workers, 4)
+    return results
+
+def main():
+    """
+    Runs the benchmarks with the command line settings and prints the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Measure the orchestration overhead of the pipeline.")
+    parser.add_argument("--folders", type=int, default=2, help="flight folders")
+    parser.add_argument("--subfolders", type=int, default=4, help="photo subfolders (chunks) per flight folder")
+    parser.add_argument("--images", type=int, default=250, help="photos per subfolder")
+    parser.add_argument("--image-kb", type=int, default=64, help="size of every photo in KiB")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every Metashape call takes")
+    parser.add_argument("--save-latency", type=float, default=0.0, help="seconds every project save takes")
+    parser.add_argument("--workers", type=int, default=1, help="chunks processed in parallel")
+    parser.add_argument("--log-lines", type=int, default=10000, help="console lines in the logging benchmark")
+    parser.add_argument("--work-dir", help="folder for the generated data (default: a temporary folder)")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="metashape_benchmark_")
+    try:
+        results = run(work_dir, args.folders, args.subfolders, args.images, args.image_kb, args.latency,
+                      args.save_latency, args.workers, args.log_lines)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 import sys
 import os
+import signal
+import argparse
 from pipeline.metashape_processor import MetashapeProcessor
-from pipeline.utils import create_log_file, check_free_space, load_config
+from pipeline.watcher import FolderWatcher
+from pipeline.catalog import ImageCatalog
+from pipeline.planner import DiskPlanner
+from pipeline.metadata import summarize
+from pipeline.utils import create_log_file, load_config, format_bytes
 
-def display_summary(input_folder, gpu_option, cpu_enabled, log_file):
+def display_summary(input_folder, gpu_option, cpu_enabled, log_file, catalog=None, planner=None):
     """
     Displays a summary of the current configuration and lists unprocessed folders and chunks.
 
@@ -12,7 +18,12 @@ def display_summary(input_folder, gpu_option, cpu_enabled, log_file):
         gpu_option (str): The GPU option used for processing.
         cpu_enabled (bool): Whether CPU processing is enabled.
         log_file (str): The path to the log file.
+        catalog (ImageCatalog): Image index, reused later by the processor. If it indexes metadata,
+            the capture times and GPS extent of every chunk are shown as well.
+        planner (DiskPlanner): Planner of the temporary folder, to report its free space.
     """
+    catalog = catalog or ImageCatalog()
+
     print("\n--- Summary of Execution ---")
     print(f"Input Folder: {input_folder}")
     print(f"GPU Option: {gpu_option}")
@@ -24,20 +35,25 @@ def display_summary(input_folder, gpu_option, cpu_enabled, log_file):
         folder_path = os.path.join(input_folder, folder_name)
         if os.path.isdir(folder_path) and "_unprocessed" in folder_name:
             print(f"  - {folder_path}")
-            photos_dir = os.path.join(folder_path, "photos")
-            if os.path.isdir(photos_dir):
-                for subfolder_name in sorted(os.listdir(photos_dir)):
-                    subfolder_path = os.path.join(photos_dir, subfolder_name)
-                    if os.path.isdir(subfolder_path):
-                        print(f"    - Chunk: {subfolder_name}")
-    
-    # Check free disk space before proceeding
-    try:
-        check_free_space(100, "/mnt/data/")
-        print("\nDo you want to proceed with these settings? (yes/no)")
-    except RuntimeError as e:
-        print(f"Error during free space check: {e}")
-        sys.exit(1)
+            for subfolder_name, index in catalog.flight(folder_path):
+                print(f"    - Chunk: {subfolder_name} ({index.count()} images, {format_bytes(index.size_bytes())})")
+                for channel in catalog.channel_suffixes:
+                    if index.count(channel):
+                        print(f"        {channel}: {index.count(channel)} images, {format_bytes(index.size_bytes(channel))}")
+                if catalog.metadata_enabled:
+                    paths = [path for entries in index.channels.values() for path, size in entries]
+                    summary = summarize(catalog.metadata(folder_path, paths).values())
+                    if summary["first"]:
+                        print(f"        Captured: {summary['first']} to {summary['last']}")
+                    if summary["bbox"]:
+                        print("        GPS extent: lat {:.6f} to {:.6f}, lon {:.6f} to {:.6f} ({} images)".format(
+                            summary["bbox"][0], summary["bbox"][2], summary["bbox"][1], summary["bbox"][3],
+                            summary["with_gps"]))
+
+    # Folders are admitted one by one once they fit into the temporary folder
+    if planner is not None:
+        print(f"\nFree space in {planner.tmp_folder}: {format_bytes(max(planner.free_bytes(), 0))} "
+              f"(keeping {format_bytes(planner.reserve_bytes)} in reserve)")
 
 def main():
     """
@@ -46,26 +62,32 @@ def main():
     Steps:
     1. Load configuration file.
     2. Display summary of settings.
-    3. Confirm with the user to proceed.
-    4. Initialize and process folders using MetashapeProcessor.
+    3. Confirm with the user to proceed (skipped with --yes or --watch).
+    4. Initialize and process folders using MetashapeProcessor, once or continuously with --watch.
     """
-    if len(sys.argv) != 2:
-        print("Usage: python3 main.py <config_file>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(usage="python3 main.py <config_file> [--yes] [--watch]")
+    parser.add_argument("config_file")
+    parser.add_argument("--yes", action="store_true", help="process without asking for confirmation")
+    parser.add_argument("--watch", action="store_true",
+                        help="run non-interactively and process new '_unprocessed' folders as they arrive")
+    args = parser.parse_args()
 
     try:
         # Load configuration from the specified YAML file
-        config = load_config(sys.argv[1])
+        config = load_config(args.config_file)
         input_folder = config["input_folder"]
         gpu_option = config["gpu_option"]
         cpu_enabled = config["cpu_enabled"]
         log_dir = config["log_dir"]
     except FileNotFoundError:
-        print(f"Config file {sys.argv[1]} not found.")
+        print(f"Config file {args.config_file} not found.")
         sys.exit(1)
     except KeyError as e:
         print(f"Missing required config key: {e}")
         sys.exit(1)
+    except ValueError as e:
+        print(f"Invalid config: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"Unexpected error loading config: {e}")
         sys.exit(1)
@@ -77,18 +99,28 @@ def main():
         print(f"Failed to create log file: {e}")
         sys.exit(1)
 
-    # Display summary and ask for confirmation
-    display_summary(input_folder, gpu_option, cpu_enabled, log_file)
+    # Display summary and ask for confirmation; the image index is shared with the processor
+    catalog = ImageCatalog(config.get("channel_suffixes"), config.get("metadata"), config["tmp_folder"])
+    planner = DiskPlanner(config["tmp_folder"], config.get("disk"))
+    display_summary(input_folder, gpu_option, cpu_enabled, log_file, catalog, planner)
 
-    user_input = input("Type 'yes' to proceed or 'no' to abort: ").strip().lower()
-    if user_input != 'yes':
-        print("Aborting the script.")
-        sys.exit(0)
+    if not (args.yes or args.watch):
+        print("\nDo you want to proceed with these settings? (yes/no)")
+        user_input = input("Type 'yes' to proceed or 'no' to abort: ").strip().lower()
+        if user_input != 'yes':
+            print("Aborting the script.")
+            sys.exit(0)
 
     # Initialize MetashapeProcessor and process the folders
     try:
-        processor = MetashapeProcessor(config, log_file)
-        processor.process_folders()
+        processor = MetashapeProcessor(config, log_file, catalog)
+        if args.watch:
+            watcher = FolderWatcher(processor, config)
+            # On SIGTERM from a scheduler, finish the batch of folders being processed, then exit
+            signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+            watcher.run()
+        else:
+            processor.process_folders()
     except Exception as e:
         print(f"Error during processing: {e}")
         sys.exit(1)
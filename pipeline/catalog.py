@@ -0,0 +1,249 @@
+import os
+import sqlite3
+import logging
+from pipeline.metadata import MetadataIndex
+from pipeline.utils import campaign_name
+
+# File name suffixes identifying each channel (DJI naming convention)
+DEFAULT_CHANNEL_SUFFIXES = {
+    "RGB": ".JPG",
+    "NIR": "MS_NIR.TIF",
+    "RE": "MS_RE.TIF",
+    "R": "MS_R.TIF",
+    "G": "MS_G.TIF",
+}
+
+class FolderIndex:
+    """
+    Images of a single directory, classified into channels.
+
+    Attributes:
+        path (str): Path of the directory.
+        mtime_ns (int): Modification time of the directory when it was scanned.
+        channels (dict): (image path, size in bytes) tuples per channel, sorted by path.
+        members (list): Photo subfolders the images of a regrouped chunk come from, or None.
+    """
+    def __init__(self, path, mtime_ns, channels, members=None):
+        """
+        Initializes the index of a scanned directory.
+
+        Args:
+            path (str): Path of the directory.
+            mtime_ns (int): Modification time of the directory when it was scanned.
+            channels (dict): (image path, size in bytes) tuples per channel.
+            members (list): Photo subfolders the images of a regrouped chunk come from.
+        """
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.channels = channels
+        self.members = members
+
+    def images(self, channel):
+        """
+        Lists the image paths of a channel.
+
+        Args:
+            channel (str): Name of the channel.
+
+        Returns:
+            list: Image paths of the channel.
+        """
+        return [path for path, size in self.channels.get(channel, [])]
+
+    def count(self, channel=None):
+        """
+        Counts the images of a channel, or of all channels.
+
+        Args:
+            channel (str): Name of the channel, or None for all channels.
+
+        Returns:
+            int: Number of images.
+        """
+        return sum(len(entries) for name, entries in self.channels.items() if channel in (None, name))
+
+    def size_bytes(self, channel=None):
+        """
+        Sums the file sizes of a channel, or of all channels.
+
+        Args:
+            channel (str): Name of the channel, or None for all channels.
+
+        Returns:
+            int: Total size in bytes.
+        """
+        return sum(size for name, entries in self.channels.items() if channel in (None, name)
+                   for path, size in entries)
+
+class ImageCatalog:
+    """
+    Shared index of the images of the campaign folders.
+
+    Each directory is listed with a single os.scandir pass and the result is cached until the
+    directory's modification time changes, so the summary and the processor reuse the same
+    listing instead of walking network mounts repeatedly. Image metadata is kept in a persistent
+    MetadataIndex per campaign folder, stored on the local temporary disk rather than in the
+    (network) campaign folder.
+
+    Attributes:
+        channel_suffixes (dict): File name suffix per channel.
+        metadata_enabled (bool): Whether the summary reads and shows image metadata; off unless configured.
+        metadata_workers (int): Number of threads reading image headers.
+        metadata_folder (str): Folder holding the indexes, or None to store each in its campaign folder.
+    """
+    def __init__(self, channel_suffixes=None, metadata=None, tmp_folder=None):
+        """
+        Initializes an empty catalog.
+
+        Args:
+            channel_suffixes (dict): File name suffix per channel. Defaults to DEFAULT_CHANNEL_SUFFIXES.
+            metadata (dict): 'metadata' section of the configuration with 'enabled', 'folder' and 'workers'.
+            tmp_folder (str): Temporary folder holding the indexes by default. Without it, metadata is
+                only indexed if enabled explicitly, and then in the campaign folders.
+        """
+        metadata = metadata or {}
+        self.channel_suffixes = channel_suffixes or DEFAULT_CHANNEL_SUFFIXES
+        self.metadata_folder = metadata.get("folder") or (os.path.join(tmp_folder, "metadata") if tmp_folder else None)
+        # Reading every header before the prompt is slow on network mounts, so the summary opts in
+        self.metadata_enabled = bool(metadata.get("enabled", False))
+        self.metadata_workers = int(metadata.get("workers", 8))
+        # Longest suffixes first, so e.g. 'MS_RE.TIF' is never taken for a shorter suffix
+        self._suffixes = sorted(self.channel_suffixes.items(), key=lambda item: len(item[1]), reverse=True)
+        self._indexes = {}
+        self._subfolders = {}
+
+    def classify(self, file_name):
+        """
+        Determines the channel of an image file.
+
+        Args:
+            file_name (str): Name of the file.
+
+        Returns:
+            str: Name of the channel, or None if the file belongs to no channel.
+        """
+        for channel, suffix in self._suffixes:
+            if file_name.endswith(suffix):
+                return channel
+        return None
+
+    def scan(self, folder):
+        """
+        Returns the channel index of a directory, scanning it only if it changed since the last scan.
+
+        Args:
+            folder (str): Path of the directory.
+
+        Returns:
+            FolderIndex: Images of the directory per channel.
+        """
+        mtime_ns = os.stat(folder).st_mtime_ns
+        index = self._indexes.get(folder)
+        if index is not None and index.mtime_ns == mtime_ns:
+            return index
+
+        channels = {channel: [] for channel in self.channel_suffixes}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                channel = self.classify(entry.name)
+                if channel is not None and entry.is_file():
+                    channels[channel].append((entry.path, entry.stat().st_size))
+
+        for entries in channels.values():
+            entries.sort()
+
+        index = FolderIndex(folder, mtime_ns, channels)
+        self._indexes[folder] = index
+        logging.debug(f"Scanned {folder}: {index.count()} images")
+        return index
+
+    def subfolders(self, folder):
+        """
+        Lists the subdirectories of a directory, cached until the directory changes.
+
+        Args:
+            folder (str): Path of the directory.
+
+        Returns:
+            list: (name, path) tuples of the subdirectories, sorted by name.
+        """
+        mtime_ns = os.stat(folder).st_mtime_ns
+        cached = self._subfolders.get(folder)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        with os.scandir(folder) as entries:
+            subfolders = sorted((entry.name, entry.path) for entry in entries if entry.is_dir())
+
+        self._subfolders[folder] = (mtime_ns, subfolders)
+        return subfolders
+
+    def captures(self, index, bands):
+        """
+        Groups the images of several bands by capture, for loading them as a multi-camera system.
+        A capture is identified by the file path without its channel suffix.
+
+        Args:
+            index (FolderIndex): Index of the directory.
+            bands (list): Channel names of the bands.
+
+        Returns:
+            tuple: Flat list of image paths (all bands of the first capture in band order, then the
+            next capture, ...) and the number of captures skipped because a band was missing.
+        """
+        captures = {}
+        for band in bands:
+            suffix = self.channel_suffixes[band]
+            for path in index.images(band):
+                captures.setdefault(path[:-len(suffix)], {})[band] = path
+
+        image_list = []
+        incomplete = 0
+        for key in sorted(captures):
+            if len(captures[key]) == len(bands):
+                image_list.extend(captures[key][band] for band in bands)
+            else:
+                incomplete += 1
+        return image_list, incomplete
+
+    def flight(self, folder_path):
+        """
+        Indexes the photo subfolders ('chunks') of an unprocessed flight folder.
+
+        Args:
+            folder_path (str): Path of the flight folder.
+
+        Returns:
+            list: (subfolder name, FolderIndex) tuples; empty if the folder has no 'photos' directory.
+        """
+        photos_dir = os.path.join(folder_path, "photos")
+        if not os.path.isdir(photos_dir):
+            return []
+        return [(name, self.scan(path)) for name, path in self.subfolders(photos_dir)]
+
+    def metadata(self, folder_path, paths):
+        """
+        Returns the metadata of images of a campaign folder from its persistent index, reading
+        only the headers of images not indexed yet. Used by the summary if metadata is enabled and
+        by the processor when pre-filtering or grouping needs it.
+
+        Args:
+            folder_path (str): Path of the campaign folder holding the index.
+            paths (list): Image paths inside the folder.
+
+        Returns:
+            dict: Metadata per image path; empty if the index has no local folder and metadata is
+            not enabled, or the index cannot be written, in which case users read headers themselves.
+        """
+        if not (self.metadata_folder or self.metadata_enabled):
+            return {}
+        try:
+            db_path = None
+            if self.metadata_folder:
+                # Keyed by the campaign name, so the index is reused after the folder is renamed
+                os.makedirs(self.metadata_folder, exist_ok=True)
+                db_path = os.path.join(self.metadata_folder, f"{campaign_name(folder_path)}.sqlite")
+            return MetadataIndex(folder_path, self.metadata_workers, db_path).update(paths)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not index image metadata of {folder_path}: {e}")
+            return {}
@@ -0,0 +1,310 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+
+class StageManifest:
+    """
+    Persistent record of the processing stages that finished for each chunk of a project.
+
+    The manifest is stored as JSON next to the Metashape project, so a re-run of the same
+    folder can reopen the project and skip every stage that already completed with the
+    same parameters.
+
+    Attributes:
+        manifest_path (str): Path to the JSON manifest file.
+        chunks (dict): Completed stages per chunk label, in the order they finished.
+        purged (dict): Purged products per chunk label, with the stage that built them.
+        overrides (dict): Parameters per chunk label and stage that replace the profile's after a
+            failure, e.g. a higher downscale after running out of memory.
+    """
+    def __init__(self, manifest_path):
+        """
+        Initializes the manifest and loads any previously recorded stages.
+
+        Args:
+            manifest_path (str): Path to the JSON manifest file.
+        """
+        self.manifest_path = manifest_path
+        self.chunks, self.purged, self.overrides = self._load()
+
+    def _load(self):
+        """
+        Loads the manifest from disk.
+
+        Returns:
+            tuple: Recorded stages, purged products and parameter overrides per chunk; empty if no
+            usable manifest exists.
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}, {}, {}
+
+        try:
+            with open(self.manifest_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable stage manifest {self.manifest_path}: {e}")
+            return {}, {}, {}
+
+        logging.info(f"Loaded stage manifest from {self.manifest_path}")
+        return data.get("chunks", {}), data.get("purged", {}), data.get("overrides", {})
+
+    def save(self):
+        """
+        Writes the manifest to disk atomically.
+        """
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"chunks": self.chunks, "purged": self.purged, "overrides": self.overrides}, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_complete(self, chunk_label, stage, params=None):
+        """
+        Checks whether a stage finished for a chunk with the given parameters.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            stage (str): Name of the stage.
+            params (dict): Parameters the stage would run with.
+
+        Returns:
+            bool: True if the stage is recorded with identical parameters.
+        """
+        entry = self.chunks.get(chunk_label, {}).get(stage)
+        return entry is not None and entry["params"] == _normalize(params)
+
+    def completed_stages(self, chunk_label):
+        """
+        Lists the stages recorded for a chunk.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+
+        Returns:
+            list: Stage names in the order they finished.
+        """
+        return list(self.chunks.get(chunk_label, {}))
+
+    def mark_complete(self, chunk_label, stage, params=None):
+        """
+        Records a finished stage and persists the manifest.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            stage (str): Name of the stage.
+            params (dict): Parameters the stage ran with.
+        """
+        self.chunks.setdefault(chunk_label, {})[stage] = {
+            "params": _normalize(params),
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def mark_purged(self, chunk_label, product, stage):
+        """
+        Records that a product was removed from a chunk and persists the manifest.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            product (str): Name of the product.
+            stage (str): Stage that built the product; invalidating it restores the product.
+        """
+        self.purged.setdefault(chunk_label, {})[product] = stage
+        self.save()
+
+    def purged_products(self, chunk_label):
+        """
+        Lists the products removed from a chunk.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+
+        Returns:
+            list: Names of the purged products.
+        """
+        return list(self.purged.get(chunk_label, {}))
+
+    def mark_override(self, chunk_label, stage, params):
+        """
+        Records parameters a stage of a chunk runs with instead of the profile's and persists the
+        manifest, so a resumed run does not repeat the failure they avoid.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            stage (str): Name of the stage.
+            params (dict): Parameters replacing those of the profile.
+        """
+        self.overrides.setdefault(chunk_label, {}).setdefault(stage, {}).update(params)
+        self.save()
+
+    def invalidate_from(self, chunk_label, stage):
+        """
+        Removes a stage and every stage recorded after it, since their results
+        depend on the stage being re-run. Products built by these stages are no
+        longer purged once they run again.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            stage (str): Name of the first stage to invalidate.
+        """
+        stages = self.chunks.get(chunk_label, {})
+        names = list(stages)
+        invalidated = names[names.index(stage):] if stage in stages else [stage]
+        purged = self.purged.get(chunk_label, {})
+        restored = [product for product, producer in purged.items() if producer in invalidated]
+        if stage not in stages and not restored:
+            return
+
+        for name in invalidated:
+            stages.pop(name, None)
+        for product in restored:
+            del purged[product]
+        # A chunk started over runs with the profile again
+        if not stages:
+            self.overrides.pop(chunk_label, None)
+        logging.info(f"Invalidated stages {invalidated} for chunk: {chunk_label}")
+        self.save()
+
+class ImageManifest:
+    """
+    Record of the images the chunks of a folder were built from, stored as JSON next to the
+    project, so images added to the folder after it was processed can be told apart.
+
+    Image paths are stored relative to the folder, since the folder is renamed once it is
+    processed, along with the path the folder had when its images were loaded.
+
+    Attributes:
+        manifest_path (str): Path to the JSON manifest file.
+        folder (str): Path of the folder when its images were last recorded.
+        chunks (dict): Relative paths of the known images per chunk label, including excluded photos.
+        members (dict): Photo subfolders of every regrouped chunk, per chunk label.
+    """
+    def __init__(self, manifest_path):
+        """
+        Initializes the manifest and loads any previously recorded images.
+
+        Args:
+            manifest_path (str): Path to the JSON manifest file.
+        """
+        self.manifest_path = manifest_path
+        self.folder = None
+        self.chunks = {}
+        self.members = {}
+
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r') as file:
+                    data = json.load(file)
+                self.folder, self.chunks = data.get("folder"), data.get("chunks", {})
+                self.members = data.get("members", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable image manifest {self.manifest_path}: {e}")
+
+    def record(self, folder_path, chunk_jobs):
+        """
+        Records the images of chunks and persists the manifest.
+
+        Args:
+            folder_path (str): Path of the folder holding the images.
+            chunk_jobs (list): ChunkJob of every processed chunk.
+        """
+        self.folder = folder_path
+        for job in chunk_jobs:
+            self.chunks[job.chunk_name] = sorted(os.path.relpath(path, folder_path)
+                                                 for path in list(job.image_list) + list(job.excluded))
+            if job.members:
+                self.members[job.chunk_name] = list(job.members)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({"folder": self.folder, "chunks": self.chunks, "members": self.members}, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def new_images(self, folder_path, job):
+        """
+        Lists the images of a chunk that are not recorded yet. Multispectral captures are new as a whole.
+
+        Args:
+            folder_path (str): Current path of the folder.
+            job (ChunkJob): The chunk with all its current images.
+
+        Returns:
+            list: Paths of the new images in the order of job.image_list.
+        """
+        known = set(self.chunks.get(job.chunk_name, []))
+        group_size = len(job.bands) if job.bands else 1
+        new_images = []
+        for index in range(0, len(job.image_list), group_size):
+            group = job.image_list[index:index + group_size]
+            if os.path.relpath(group[0], folder_path) not in known:
+                new_images.extend(group)
+        return new_images
+
+    def moved_paths(self, folder_path):
+        """
+        Maps the recorded images from the folder's recorded path to its current path.
+
+        Args:
+            folder_path (str): Current path of the folder.
+
+        Returns:
+            dict: Recorded image path -> current image path; empty if the folder did not move.
+        """
+        if not self.folder or os.path.normpath(self.folder) == os.path.normpath(folder_path):
+            return {}
+        return {os.path.join(self.folder, path): os.path.join(folder_path, path)
+                for paths in self.chunks.values() for path in paths}
+
+class SavePolicy:
+    """
+    Decides after which stages the project is saved.
+
+    Stages between two save points are only recorded in the stage manifest once the
+    project containing their results has been saved.
+
+    Attributes:
+        save_points (set): Stages followed by a save, or None to save after every stage.
+    """
+    DEFAULT_SAVE_POINTS = ["align_photos", "build_depth_maps", "build_model", "build_point_cloud",
+                           "build_orthomosaic"]
+
+    def __init__(self, config=None):
+        """
+        Initializes the policy from the optional 'save' section of the configuration.
+
+        Args:
+            config (dict): The 'save' configuration section.
+        """
+        config = config or {}
+        points = config.get("points", self.DEFAULT_SAVE_POINTS)
+        self.save_points = None if points == "all" else set(points)
+
+    def should_save(self, stage):
+        """
+        Checks whether the project is saved after a stage.
+
+        Args:
+            stage (str): Name of the stage.
+
+        Returns:
+            bool: True if the stage is a save point.
+        """
+        return self.save_points is None or stage in self.save_points
+
+def image_list_digest(image_list):
+    """
+    Computes a stable digest of an image list, used to detect changed chunk inputs.
+
+    Args:
+        image_list (list): List of image paths.
+
+    Returns:
+        str: Hex digest of the sorted image paths.
+    """
+    return hashlib.sha1("\n".join(sorted(image_list)).encode("utf-8")).hexdigest()
+
+def _normalize(params):
+    """
+    Normalizes parameters to their JSON representation so loaded and fresh values compare equal.
+    """
+    return json.loads(json.dumps(params or {}, sort_keys=True))
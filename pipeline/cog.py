@@ -0,0 +1,114 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import tiff
+
+try:
+    from osgeo import gdal
+except ImportError:  # Without GDAL rasters are written as Metashape's tiled GeoTIFF
+    gdal = None
+
+# Compressions of the COG driver; predictors do not apply to JPEG
+COMPRESSIONS = ["DEFLATE", "ZSTD", "JPEG", "LZW", "NONE"]
+
+def utm_crs(longitude, latitude):
+    """
+    Returns the WGS 84 / UTM zone a position lies in.
+
+    Args:
+        longitude (float): Longitude in degrees.
+        latitude (float): Latitude in degrees.
+
+    Returns:
+        str: Metashape coordinate system definition, e.g. 'EPSG::32632'.
+    """
+    zone = min(int((longitude + 180) // 6) + 1, 60)
+    return f"EPSG::{32600 + zone if latitude >= 0 else 32700 + zone}"
+
+def cog_options(params):
+    """
+    Builds the creation options of the GDAL COG driver from the export parameters.
+
+    Args:
+        params (dict): 'export_raster' parameters with 'compression', 'predictor', 'block_size' and 'jpeg_quality'.
+
+    Returns:
+        list: Creation options.
+    """
+    compression = params.get("compression", "DEFLATE")
+    options = [f"COMPRESS={compression}", f"BLOCKSIZE={params.get('block_size', 512)}", "BIGTIFF=IF_SAFER",
+               "OVERVIEWS=AUTO", "NUM_THREADS=ALL_CPUS"]
+    if compression == "JPEG":
+        options.append(f"QUALITY={params.get('jpeg_quality', 90)}")
+    elif params.get("predictor") and compression != "NONE":
+        options.append(f"PREDICTOR={params['predictor']}")
+    return options
+
+def write_cogs(sources, destinations, params, workers=1):
+    """
+    Rewrites GeoTIFFs as Cloud-Optimized GeoTIFFs, several files in parallel. GDAL releases the
+    interpreter lock while it writes, so threads suffice.
+
+    Args:
+        sources (list): Paths of the GeoTIFFs exported by Metashape.
+        destinations (list): Paths of the COGs, one per source.
+        params (dict): 'export_raster' parameters, see cog_options.
+        workers (int): Files written concurrently.
+
+    Raises:
+        RuntimeError: If GDAL is not installed or a file could not be written.
+    """
+    if gdal is None:
+        raise RuntimeError("GDAL is not installed; install it to write Cloud-Optimized GeoTIFFs")
+    options = cog_options(params)
+
+    def write(source, destination):
+        dataset = gdal.Translate(destination, source, format="COG", creationOptions=options)
+        if dataset is None:
+            raise RuntimeError(f"GDAL could not write {destination}: {gdal.GetLastErrorMsg()}")
+        # Closing the dataset flushes it to disk
+        dataset = None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Consuming the results raises the first error
+        list(executor.map(write, sources, destinations))
+    logging.info(f"Wrote {len(destinations)} Cloud-Optimized GeoTIFFs with {' '.join(options)}")
+
+def raster_files(path):
+    """
+    Returns the GeoTIFFs holding an exported raster: the file itself or, for a raster exported
+    in blocks, the COGs in its '<name>_blocks' folder.
+
+    Args:
+        path (str): Path of the raster as named by MetashapeChunkProcessor.raster_paths.
+
+    Returns:
+        list: Paths of the existing GeoTIFFs; empty if the raster was not exported.
+    """
+    if os.path.exists(path):
+        return [path]
+    blocks_folder = f"{os.path.splitext(path)[0]}_blocks"
+    if not os.path.isdir(blocks_folder):
+        return []
+    return [os.path.join(blocks_folder, name) for name in sorted(os.listdir(blocks_folder)) if name.endswith(".tif")]
+
+def check_cogs(paths):
+    """
+    Validates the layout of written COGs and logs every problem found.
+
+    Args:
+        paths (list): Paths of the COGs.
+
+    Returns:
+        bool: True if all files are valid COGs.
+    """
+    valid = True
+    for path in paths:
+        try:
+            problems = tiff.validate_cog(path)
+        except (OSError, ValueError) as e:
+            problems = [str(e)]
+        for problem in problems:
+            logging.warning(f"{os.path.basename(path)} is not a valid Cloud-Optimized GeoTIFF: {problem}")
+        valid = valid and not problems
+    return valid
@@ -0,0 +1,166 @@
+import math
+import logging
+from datetime import datetime
+from pipeline.catalog import FolderIndex
+from pipeline.prefilter import position_distance
+
+# Meters per degree of latitude, for the grid of the proximity search
+METERS_PER_DEGREE = 111320.0
+
+class FlightGrouper:
+    """
+    Regroups the photos of a flight folder into chunks by capture time and GPS position, instead
+    of taking every photo subfolder as a chunk.
+
+    Photos are ordered by capture time across all subfolders and split wherever the time between
+    two consecutive photos exceeds split_gap, which separates disjoint flights stored in one
+    subfolder. Segments flown within merge_gap of each other are merged again if any of their
+    positions lie within max_distance, which joins one flight spread over several subfolders
+    (e.g. across a battery change).
+
+    Attributes:
+        enabled (bool): Whether photos are regrouped at all.
+        split_gap (float): Seconds without photos that end a segment.
+        merge_gap (float): Maximum seconds between two segments that are merged.
+        max_distance (float): Maximum distance in meters between two merged segments.
+    """
+    def __init__(self, config=None):
+        """
+        Initializes the grouper from the optional 'grouping' section of the configuration.
+
+        Args:
+            config (dict): 'grouping' section of the configuration.
+        """
+        config = config or {}
+        self.enabled = bool(config.get("enabled", False))
+        self.split_gap = float(config.get("split_gap", 300))
+        self.merge_gap = float(config.get("merge_gap", 3600))
+        self.max_distance = float(config.get("max_distance", 50))
+
+    def group(self, flight, metadata):
+        """
+        Regroups the photo subfolders of a flight.
+
+        Args:
+            flight (list): (subfolder name, FolderIndex) tuples as returned by ImageCatalog.flight.
+            metadata (dict): Metadata per image path, with 'captured_at', 'latitude' and 'longitude'.
+
+        Returns:
+            list: (chunk name, FolderIndex) tuples, one per group, ordered by capture time. The
+            flight is returned unchanged if a photo has no capture time.
+        """
+        photos = []
+        for subfolder_name, index in flight:
+            for channel, entries in index.channels.items():
+                for path, size in entries:
+                    captured_at = (metadata.get(path) or {}).get("captured_at")
+                    if captured_at is None:
+                        logging.warning(f"Not regrouping {index.path}: {path} has no capture time")
+                        return flight
+                    photos.append((datetime.fromisoformat(captured_at), path, subfolder_name, channel, size))
+        if not photos:
+            return flight
+        photos.sort()
+
+        segments = [[photos[0]]]
+        for previous, photo in zip(photos, photos[1:]):
+            if (photo[0] - previous[0]).total_seconds() > self.split_gap:
+                segments.append([])
+            segments[-1].append(photo)
+
+        groups = self._merge(segments, metadata)
+        regrouped = self._name(groups, flight)
+        if [name for name, index in regrouped] != [name for name, index in flight]:
+            logging.info(f"Regrouped {len(flight)} photo subfolders into {len(regrouped)} chunks: "
+                         f"{[name for name, index in regrouped]}")
+        return regrouped
+
+    def _merge(self, segments, metadata):
+        """
+        Merges segments that are close in time and space, using a union-find over the segments.
+
+        Returns:
+            list: Groups as lists of photos, ordered by their first capture time.
+        """
+        parents = list(range(len(segments)))
+
+        def root(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        positions = [[metadata[photo[1]] for photo in segment if metadata[photo[1]].get("latitude") is not None]
+                     for segment in segments]
+        for first in range(len(segments)):
+            for second in range(first + 1, len(segments)):
+                gap = (segments[second][0][0] - segments[first][-1][0]).total_seconds()
+                if gap > self.merge_gap or root(first) == root(second):
+                    continue
+                if _near(positions[first], positions[second], self.max_distance):
+                    parents[root(second)] = root(first)
+
+        groups = {}
+        for index, segment in enumerate(segments):
+            groups.setdefault(root(index), []).extend(segment)
+        return [groups[key] for key in sorted(groups)]
+
+    def _name(self, groups, flight):
+        """
+        Builds a FolderIndex per group, named after the subfolders its photos come from: the
+        subfolder itself, or '<first>_to_<last>' for photos of several subfolders, which are kept
+        as the members of the index.
+        """
+        named = []
+        for photos in groups:
+            subfolders = sorted({photo[2] for photo in photos})
+            channels = {channel: [] for channel in flight[0][1].channels}
+            for captured_at, path, subfolder_name, channel, size in photos:
+                channels.setdefault(channel, []).append((path, size))
+            for entries in channels.values():
+                entries.sort()
+            # A short label that stays the same however many subfolders a flight spans
+            name = subfolders[0] if len(subfolders) == 1 else f"{subfolders[0]}_to_{subfolders[-1]}"
+            named.append((name, subfolders, channels))
+
+        counts = {}
+        for name, subfolders, channels in named:
+            counts[name] = counts.get(name, 0) + 1
+
+        regrouped = []
+        numbers = {}
+        indexes = dict(flight)
+        for name, subfolders, channels in named:
+            if counts[name] > 1:
+                numbers[name] = numbers.get(name, 0) + 1
+                name = f"{name}_flight{numbers[name]:02d}"
+            path = indexes[name].path if name in indexes else None
+            regrouped.append((name, FolderIndex(path, 0, channels, subfolders)))
+        return regrouped
+
+def _near(first, second, max_distance):
+    """
+    Checks whether any position of the first set lies within max_distance of the second set, by
+    bucketing the first set into a grid of max_distance cells.
+    """
+    if not first or not second:
+        return False
+
+    longitude_scale = max(math.cos(math.radians(first[0]["latitude"])), 0.01)
+    def cell(position):
+        return (math.floor(position["latitude"] * METERS_PER_DEGREE / max_distance),
+                math.floor(position["longitude"] * METERS_PER_DEGREE * longitude_scale / max_distance))
+
+    cells = {}
+    for position in first:
+        cells.setdefault(cell(position), []).append(position)
+
+    for position in second:
+        row, column = cell(position)
+        for neighbor in [(row + dy, column + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]:
+            for other in cells.get(neighbor, []):
+                # Horizontal distance only; altitudes differ between take-off points
+                if position_distance({"latitude": position["latitude"], "longitude": position["longitude"]},
+                                     {"latitude": other["latitude"], "longitude": other["longitude"]}) <= max_distance:
+                    return True
+    return False
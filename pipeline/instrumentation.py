@@ -0,0 +1,150 @@
+import os
+import csv
+import json
+import time
+import socket
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+REPORT_FIELDS = ["chunk", "stage", "started_at", "wall_seconds", "cpu_seconds", "process_peak_rss_mb",
+                 "disk_bytes_written", "image_count", "gpu_mask", "status"]
+
+class StageRecorder:
+    """
+    Records wall time, CPU time, memory and disk usage of every processing stage and writes
+    them as a machine-readable run report. Memory is the peak resident memory of the process so
+    far, not of the stage alone, as the operating system only reports the peak of the process.
+
+    Attributes:
+        workspace (str): Folder whose growth is counted as disk bytes written.
+        records (list): One dict per measured stage, with the keys in REPORT_FIELDS.
+    """
+    def __init__(self, workspace):
+        """
+        Initializes an empty recorder.
+
+        Args:
+            workspace (str): Folder whose growth is counted as disk bytes written, usually the temporary project folder.
+        """
+        self.workspace = workspace
+        self.records = []
+
+    @contextmanager
+    def measure(self, chunk_label, stage, image_count=0, gpu_mask=0, size=None):
+        """
+        Measures the stage executed inside the context.
+
+        Args:
+            chunk_label (str): Label of the chunk.
+            stage (str): Name of the stage.
+            image_count (int): Number of images in the chunk.
+            gpu_mask (int): GPU mask active while the stage runs.
+            size (callable): Returns the bytes used by the files the stage writes, e.g. the data of
+                the chunk's own project; its growth is recorded. Defaults to the size of the workspace.
+        """
+        size = size or (lambda: directory_size(self.workspace))
+        record = {
+            "chunk": chunk_label,
+            "stage": stage,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "image_count": image_count,
+            "gpu_mask": gpu_mask,
+            "status": "failed",
+        }
+        size_before = size()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+            record["status"] = "ok"
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 3)
+            record["process_peak_rss_mb"] = peak_rss_mb()
+            record["disk_bytes_written"] = max(size() - size_before, 0)
+            self.records.append(record)
+            logging.info(f"{stage} for chunk {chunk_label} took {record['wall_seconds']:.1f} s "
+                         f"(CPU {record['cpu_seconds']:.1f} s, process peak RSS so far {record['process_peak_rss_mb']} MB)")
+
+    def write_report(self, report_folder, name, metadata=None):
+        """
+        Writes the recorded stages as JSON (with totals per stage) and CSV.
+
+        Args:
+            report_folder (str): Folder the reports are written to.
+            name (str): Base name of the report files.
+            metadata (dict): Additional run information stored in the JSON report.
+
+        Returns:
+            tuple: Paths of the JSON and CSV reports.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                        "disk_bytes_written": 0})
+            total["count"] += 1
+            total["wall_seconds"] = round(total["wall_seconds"] + record["wall_seconds"], 3)
+            total["cpu_seconds"] = round(total["cpu_seconds"] + record["cpu_seconds"], 3)
+            total["disk_bytes_written"] += record["disk_bytes_written"]
+
+        report = {
+            "name": name,
+            "host": socket.gethostname(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            **(metadata or {}),
+            "stage_totals": totals,
+            "stages": self.records,
+        }
+
+        json_path = os.path.join(report_folder, f"{name}_run_report.json")
+        with open(json_path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+        csv_path = os.path.join(report_folder, f"{name}_run_report.csv")
+        with open(csv_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        logging.info(f"Wrote run report to {json_path}")
+        return json_path, csv_path
+
+def directory_size(folder):
+    """
+    Sums the sizes of all files below a folder.
+
+    Args:
+        folder (str): Path of the folder.
+
+    Returns:
+        int: Total size in bytes, 0 if the folder does not exist.
+    """
+    total = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += directory_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except FileNotFoundError:
+        pass
+    return total
+
+def peak_rss_mb():
+    """
+    Returns the peak resident memory of the current process since it started.
+
+    Returns:
+        float: Peak RSS in MB, or None if it cannot be determined on this platform.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
@@ -0,0 +1,273 @@
+import os
+import re
+import struct
+import sqlite3
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pipeline.tiff import TiffReader, IMAGE_WIDTH, IMAGE_LENGTH
+
+# Tags of the EXIF and GPS directories read by the pipeline
+XMP_TAG = 700
+EXIF_IFD = 34665
+GPS_IFD = 34853
+DATE_TIME_ORIGINAL = 36867
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+GPS_ALTITUDE_REF = 5
+GPS_ALTITUDE = 6
+
+EXIF_HEADER = b"Exif\0\0"
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\0"
+
+# Metadata fields returned by read_metadata, in the column order of the index
+METADATA_FIELDS = ["width", "height", "captured_at", "latitude", "longitude", "altitude", "relative_altitude"]
+
+# File name of the metadata index in a campaign folder
+INDEX_FILE = "metadata_index.sqlite"
+
+# JPEG start-of-frame markers carrying the image size (all SOFn except DHT, JPG and DAC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# DJI XMP properties, written as attributes or elements
+XMP_PROPERTY = re.compile(rb'drone-dji:(\w+)(?:="([^"]*)"|>([^<]*)<)')
+
+def read_metadata(path):
+    """
+    Reads size, capture time and position of a JPEG or TIFF image from its header, without
+    decoding pixel data.
+
+    Args:
+        path (str): Path of the image.
+
+    Returns:
+        dict: 'width', 'height', 'captured_at' (ISO string), 'latitude', 'longitude', 'altitude' (GPS,
+        meters above sea level) and 'relative_altitude' (meters above the take-off point); None
+        where the image does not provide a value.
+    """
+    metadata = dict.fromkeys(METADATA_FIELDS)
+    with open(path, 'rb') as file:
+        start = file.read(4)
+        if start[:2] == b"\xff\xd8":
+            tags, xmp = _read_jpeg(file, metadata)
+        elif start[:2] in (b"II", b"MM"):
+            reader = TiffReader(file)
+            tags = _read_exif(reader, reader.read_ifd(reader.first_ifd)[0])
+            metadata["width"] = tags.get(IMAGE_WIDTH)
+            metadata["height"] = tags.get(IMAGE_LENGTH)
+            xmp = tags.get(XMP_TAG, b"")
+            xmp = bytes(xmp) if isinstance(xmp, tuple) else xmp
+        else:
+            raise ValueError(f"Unsupported image format: {path}")
+
+    _apply_exif(metadata, tags)
+    _apply_xmp(metadata, xmp or b"")
+    return metadata
+
+class MetadataIndex:
+    """
+    Persistent index of the image metadata of a campaign folder, stored as SQLite in the folder.
+
+    Entries are keyed by the image path relative to the folder, its size and its modification
+    time, so repeated runs only read the headers of new or changed images and the index stays
+    valid when the folder is renamed. Headers are read by a pool of threads, as the work is
+    dominated by small reads from the (network) file system.
+
+    Attributes:
+        folder (str): Campaign folder; image paths are stored relative to it.
+        db_path (str): Path of the SQLite file.
+        workers (int): Number of threads reading file status and headers.
+    """
+    def __init__(self, folder, workers=8, db_path=None):
+        """
+        Initializes the index of a campaign folder.
+
+        Args:
+            folder (str): Campaign folder.
+            workers (int): Number of threads reading file status and headers.
+            db_path (str): Path of the SQLite file. Defaults to INDEX_FILE in the folder.
+        """
+        self.folder = folder
+        self.workers = workers
+        self.db_path = db_path or os.path.join(folder, INDEX_FILE)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, size INTEGER, "
+                           "mtime_ns INTEGER, width INTEGER, height INTEGER, captured_at TEXT, latitude REAL, "
+                           "longitude REAL, altitude REAL, relative_altitude REAL)")
+        return connection
+
+    def update(self, paths):
+        """
+        Returns the metadata of images, reading the headers of images that are new or changed
+        since they were indexed and storing the result.
+
+        Args:
+            paths (list): Image paths inside the folder.
+
+        Returns:
+            dict: Metadata as returned by read_metadata per image path; all values are None for
+            images whose header could not be read.
+        """
+        paths = list(paths)
+        if not paths:
+            return {}
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            stats = list(executor.map(os.stat, paths))
+
+        connection = self._connect()
+        try:
+            known = {row[0]: row[1:] for row in connection.execute("SELECT * FROM images")}
+            metadata = {}
+            stale = []
+            for path, stat in zip(paths, stats):
+                key = os.path.relpath(path, self.folder)
+                row = known.get(key)
+                if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+                    metadata[path] = dict(zip(METADATA_FIELDS, row[2:]))
+                else:
+                    stale.append((path, key, stat))
+
+            if stale:
+                with ThreadPoolExecutor(self.workers) as executor:
+                    read = list(executor.map(_read_or_empty, [path for path, key, stat in stale]))
+                rows = []
+                for (path, key, stat), values in zip(stale, read):
+                    metadata[path] = values
+                    rows.append((key, stat.st_size, stat.st_mtime_ns) + tuple(values[field] for field in METADATA_FIELDS))
+                with connection:
+                    connection.executemany(f"INSERT OR REPLACE INTO images VALUES ({', '.join('?' * len(rows[0]))})",
+                                           rows)
+                logging.info(f"Indexed metadata of {len(stale)} of {len(paths)} images in {self.folder}")
+        finally:
+            connection.close()
+        return metadata
+
+def summarize(metadata):
+    """
+    Summarizes the metadata of a set of images.
+
+    Args:
+        metadata (iterable): Metadata dicts as returned by read_metadata.
+
+    Returns:
+        dict: 'count', 'with_gps' (images with a position), 'first' and 'last' capture time (ISO
+        strings or None) and 'bbox' (min latitude, min longitude, max latitude, max longitude, or None).
+    """
+    metadata = list(metadata)
+    times = sorted(values["captured_at"] for values in metadata if values.get("captured_at"))
+    positions = [(values["latitude"], values["longitude"]) for values in metadata
+                 if values.get("latitude") is not None and values.get("longitude") is not None]
+    bbox = None
+    if positions:
+        latitudes, longitudes = zip(*positions)
+        bbox = (min(latitudes), min(longitudes), max(latitudes), max(longitudes))
+    return {
+        "count": len(metadata),
+        "with_gps": len(positions),
+        "first": times[0] if times else None,
+        "last": times[-1] if times else None,
+        "bbox": bbox,
+    }
+
+def _read_or_empty(path):
+    """
+    Reads the metadata of an image, or returns empty metadata if its header is unreadable.
+    """
+    try:
+        return read_metadata(path)
+    except (OSError, ValueError, struct.error) as e:
+        logging.warning(f"Could not read metadata of {path}: {e}")
+        return dict.fromkeys(METADATA_FIELDS)
+
+def _read_jpeg(file, metadata):
+    """
+    Walks the JPEG segments up to the start of the compressed data, collecting the EXIF tags,
+    the XMP packet and the image size.
+
+    Returns:
+        tuple: EXIF tags (including GPS and EXIF sub-directories) and the XMP packet.
+    """
+    tags = {}
+    xmp = b""
+    file.seek(2)
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF or marker[1] == 0xDA:
+            break
+        length = struct.unpack(">H", file.read(2))[0]
+        segment_start = file.tell()
+
+        if marker[1] == 0xE1:
+            header = file.read(len(XMP_HEADER))
+            if header.startswith(EXIF_HEADER):
+                reader = TiffReader(file, base=segment_start + len(EXIF_HEADER))
+                tags = _read_exif(reader, reader.read_ifd(reader.first_ifd)[0])
+            elif header == XMP_HEADER:
+                xmp = file.read(length - 2 - len(XMP_HEADER))
+        elif marker[1] in SOF_MARKERS:
+            precision, height, width = struct.unpack(">BHH", file.read(5))
+            metadata["width"], metadata["height"] = width, height
+
+        file.seek(segment_start + length - 2)
+    return tags, xmp
+
+def _read_exif(reader, tags):
+    """
+    Merges the EXIF and GPS sub-directories into the tags of the first image directory.
+    """
+    tags = dict(tags)
+    for pointer in (EXIF_IFD, GPS_IFD):
+        if pointer in tags:
+            try:
+                sub_tags = reader.read_ifd(tags[pointer])[0]
+            except (struct.error, ValueError) as e:
+                logging.debug(f"Skipping unreadable EXIF directory {pointer}: {e}")
+                continue
+            # GPS tags are numbered from 0 and would collide with image tags
+            tags.update({(pointer, tag): value for tag, value in sub_tags.items()})
+    return tags
+
+def _apply_exif(metadata, tags):
+    """
+    Fills capture time and GPS position from EXIF tags.
+    """
+    captured_at = tags.get((EXIF_IFD, DATE_TIME_ORIGINAL))
+    if captured_at:
+        try:
+            metadata["captured_at"] = datetime.strptime(captured_at.strip(), "%Y:%m:%d %H:%M:%S").isoformat()
+        except ValueError:
+            pass
+
+    latitude = tags.get((GPS_IFD, GPS_LATITUDE))
+    longitude = tags.get((GPS_IFD, GPS_LONGITUDE))
+    if latitude and longitude:
+        metadata["latitude"] = _degrees(latitude) * (-1 if tags.get((GPS_IFD, GPS_LATITUDE_REF)) == "S" else 1)
+        metadata["longitude"] = _degrees(longitude) * (-1 if tags.get((GPS_IFD, GPS_LONGITUDE_REF)) == "W" else 1)
+
+    altitude = tags.get((GPS_IFD, GPS_ALTITUDE))
+    if altitude is not None:
+        metadata["altitude"] = altitude * (-1 if tags.get((GPS_IFD, GPS_ALTITUDE_REF)) == 1 else 1)
+
+def _apply_xmp(metadata, xmp):
+    """
+    Fills the altitudes from DJI XMP properties, which are more precise than the EXIF GPS altitude.
+    """
+    properties = {name.decode(): (attribute or element).decode()
+                  for name, attribute, element in XMP_PROPERTY.findall(xmp)}
+    for key, name in (("relative_altitude", "RelativeAltitude"), ("altitude", "AbsoluteAltitude")):
+        try:
+            metadata[key] = float(properties[name])
+        except (KeyError, ValueError):
+            pass
+
+def _degrees(value):
+    """
+    Converts EXIF degrees, minutes and seconds to decimal degrees.
+    """
+    degrees, minutes, seconds = (tuple(value) + (0.0, 0.0))[:3]
+    return degrees + minutes / 60 + seconds / 3600
@@ -1,10 +1,45 @@
 import os
+import shutil
 import Metashape
 import time
 import logging
-from pipeline.utils import setup_logger, move_file, move_all_files, remove_lockfile
+from pipeline.utils import setup_logger, chunk_logging, flush_logging, move_all_files, remove_lockfile
+from pipeline.checkpoint import StageManifest, ImageManifest, SavePolicy, image_list_digest
+from pipeline.scheduler import ChunkScheduler, ChunkJob
+from pipeline.profiles import STANDARD_PROFILE, build_profiles, select_profile
+from pipeline.stages import (STAGES, DEFAULT_OUTPUTS, OUTPUT_STAGES, PRODUCERS, PRODUCT_DATA, RETENTION_POLICIES,
+                             DEFAULT_RETENTION, plan_stages, stage_inputs, release_points)
+from pipeline.catalog import ImageCatalog
+from pipeline.instrumentation import StageRecorder, directory_size
+from pipeline.planner import DiskPlanner
+from pipeline.tiling import tile_grid, write_vrt
+from pipeline import prefilter, cog
+from pipeline.grouping import FlightGrouper
+from pipeline.progress import ProgressTracker
+from pipeline.transfer import TransferEngine
+from pipeline.staging import ImageStager
+from pipeline.retry import RetryPolicy, StageFailure, classify, write_summary
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Image manifest stored next to the project, used to find images added after processing
+IMAGE_MANIFEST = "images.json"
+
+# Label suffix of chunks holding all bands of a multispectral rig
+MULTISPECTRAL_SUFFIX = "_MS"
+
+# Bands loaded together in multiplane mode; the first is the default master band
+DEFAULT_MULTISPECTRAL_BANDS = ["G", "R", "RE", "NIR"]
+
+# Chunk attribute holding the data of each product that can be purged
+PRODUCT_ATTRIBUTES = {
+    "depth_maps": "depth_maps",
+    "point_cloud": "point_cloud",
+    "model": "model",
+    "dem": "elevation",
+    "orthomosaic": "orthomosaic",
+}
+
 class MetashapeProject:
     """
     Handles the creation and management of a Metashape project.
@@ -12,43 +47,175 @@ class MetashapeProject:
     Attributes:
         project_path (str): Path to the Metashape project file.
         doc (Metashape.Document): The Metashape project document object.
+        save_policy (SavePolicy): Stages after which the project is saved.
+        save_timings (list): Duration in seconds of every save.
     """
-    def __init__(self, project_path):
+    def __init__(self, project_path, save_policy=None):
         """
-        Initializes a Metashape project and sets the project path.
+        Initializes a Metashape project and sets the project path. An existing project
+        at that path is reopened so interrupted runs can resume.
         
         Args:
             project_path (str): Path to the Metashape project file.
+            save_policy (SavePolicy): Save settings. Defaults to SavePolicy().
         """
         self.doc = Metashape.Document()
         self.project_path = project_path
+        self.save_policy = save_policy or SavePolicy()
+        self.save_timings = []
+
+        if os.path.exists(self.project_path):
+            # A crashed run leaves its lockfile behind, which would block opening
+            remove_lockfile(self.project_path)
+            self.doc.open(self.project_path)
+            logging.info(f"Reopened existing project: {self.project_path}")
 
     def save(self):
         """
-        Saves the current project and removes any lock files, ensuring the project is saved without interruption.
+        Saves the current project and removes any lock files. Document.save returns once the
+        project is written, so stages can be recorded as saved right after it.
+
+        Returns:
+            float: Seconds the save took.
         """
         remove_lockfile(self.project_path)
+        started = time.time()
         self.doc.save(self.project_path)
-        time.sleep(5)  # Wait to ensure the save completes properly
         remove_lockfile(self.project_path)
 
-    def add_chunk(self, chunk_name, image_list):
+        duration = time.time() - started
+        self.save_timings.append(duration)
+        logging.info(f"Saved project {self.project_path} in {duration:.2f} s")
+        return duration
+
+    def data_size(self):
+        """
+        Returns the size of the project's own data: the project file and its '.files' folder.
+
+        Returns:
+            int: Size in bytes.
+        """
+        size = directory_size(os.path.splitext(self.project_path)[0] + ".files")
+        if os.path.exists(self.project_path):
+            size += os.path.getsize(self.project_path)
+        return size
+
+    def add_chunk(self, chunk_name, image_list, bands=None, master_band=None):
         """
         Adds a chunk to the project and loads the provided images.
         
         Args:
             chunk_name (str): Name of the chunk to be added.
             image_list (list): List of image paths to be loaded into the chunk.
+            bands (list): Band names of a multispectral rig. If given, image_list holds one image per band
+                for every capture, in band order, and the images are loaded as a multi-camera system.
+            master_band (str): Band used for alignment and depth maps of a multispectral chunk.
 
         Returns:
             Metashape.Chunk: The newly created chunk with loaded images.
         """
         chunk = self.doc.addChunk()
         chunk.label = chunk_name
-        chunk.addPhotos(image_list, load_xmp_accuracy=True, load_rpc_txt=True)
+        self.add_photos(chunk, image_list, bands)
+        if bands and master_band in bands:
+            chunk.primary_channel = bands.index(master_band)
         logging.info(f"{len(chunk.cameras)} images loaded in chunk: {chunk_name}")
         return chunk
 
+    def add_photos(self, chunk, image_list, bands=None):
+        """
+        Loads images into a chunk.
+
+        Args:
+            chunk (Metashape.Chunk): The chunk.
+            image_list (list): List of image paths; for a multispectral rig one image per band for
+                every capture, in band order.
+            bands (list): Band names of a multispectral rig; its images are loaded as a multi-camera system.
+
+        Returns:
+            list: The cameras added to the chunk.
+        """
+        count = len(chunk.cameras)
+        if bands:
+            # One file group per capture, so the bands share a single pose per capture
+            filegroups = [len(bands)] * (len(image_list) // len(bands))
+            chunk.addPhotos(image_list, filegroups=filegroups, layout=Metashape.MultiplaneLayout,
+                            load_xmp_accuracy=True, load_rpc_txt=True)
+        else:
+            chunk.addPhotos(image_list, load_xmp_accuracy=True, load_rpc_txt=True)
+        return chunk.cameras[count:]
+
+    def add_tile(self, chunk, tile_name, offset_x, offset_y, width, height):
+        """
+        Adds a copy of an aligned chunk whose region is restricted to one tile of the chunk's region.
+
+        Args:
+            chunk (Metashape.Chunk): The aligned chunk.
+            tile_name (str): Name of the tile chunk.
+            offset_x (float): Offset of the tile center from the region center along the region's x axis.
+            offset_y (float): Offset of the tile center from the region center along the region's y axis.
+            width (float): Width of the tile, in chunk coordinates.
+            height (float): Height of the tile, in chunk coordinates.
+
+        Returns:
+            Metashape.Chunk: The tile chunk.
+        """
+        tile = chunk.copy()
+        tile.label = tile_name
+        region = tile.region
+        region.center = region.center + region.rot * Metashape.Vector([offset_x, offset_y, 0])
+        region.size = Metashape.Vector([width, height, region.size.z])
+        tile.region = region
+        logging.info(f"Added tile chunk: {tile_name}")
+        return tile
+
+    def find_chunk(self, chunk_name):
+        """
+        Looks up a chunk of the project by its label.
+
+        Args:
+            chunk_name (str): Name of the chunk.
+
+        Returns:
+            Metashape.Chunk: The chunk, or None if the project has no chunk with that label.
+        """
+        for chunk in self.doc.chunks:
+            if chunk.label == chunk_name:
+                return chunk
+        return None
+
+    def remove_chunk(self, chunk):
+        """
+        Removes a chunk from the project.
+
+        Args:
+            chunk (Metashape.Chunk): The chunk to remove.
+        """
+        logging.info(f"Removing chunk: {chunk.label}")
+        self.doc.remove([chunk])
+
+    def relink(self, paths):
+        """
+        Points the cameras of all chunks at other copies of their images, e.g. from staged local
+        copies back to the originals.
+
+        Args:
+            paths (dict): Current image path -> new image path. Cameras of other images are unchanged.
+
+        Returns:
+            int: Number of relinked images.
+        """
+        relinked = 0
+        for chunk in self.doc.chunks:
+            for camera in chunk.cameras:
+                # Each band of a multispectral camera has its own photo
+                for plane in getattr(camera, "planes", None) or [camera]:
+                    path = paths.get(plane.photo.path)
+                    if path is not None:
+                        plane.photo.path = path
+                        relinked += 1
+        return relinked
+
 class MetashapeChunkProcessor:
     """
     Processes a Metashape chunk, handling various stages of processing such as aligning photos,
@@ -56,106 +223,424 @@ class MetashapeChunkProcessor:
     
     Attributes:
         chunk (Metashape.Chunk): The chunk to be processed.
+        stage_params (dict): Parameters of each processing stage.
+        bands (list): Band names of a multispectral chunk, or None for a single-channel chunk.
+        output_tag (str): Tag added to the exported file names.
+        name (str): Name of the exported files, the chunk label unless the chunk is a tile of another chunk.
+        progress (callable): Progress callback of the running stage, taking its progress in percent, or None.
     """
-    def __init__(self, chunk):
+    def __init__(self, chunk, stage_params=None, bands=None, output_tag="", name=None):
         """
         Initializes the processor for a given chunk.
         
         Args:
             chunk (Metashape.Chunk): The chunk to be processed.
+            stage_params (dict): Parameters of each processing stage. Defaults to the standard profile.
+            bands (list): Band names of a multispectral chunk, exported as one orthomosaic per band.
+            output_tag (str): Tag added to the exported file names, e.g. '_preview'.
+            name (str): Name of the exported files. Defaults to the chunk label.
         """
         self.chunk = chunk
+        self.stage_params = stage_params or STANDARD_PROFILE
+        self.bands = bands
+        self.output_tag = output_tag
+        self.name = name or chunk.label
+        self.progress = None
+        # Cameras whose depth maps are rebuilt in an incremental update; None builds all
+        self.depth_map_cameras = None
+
+    def params(self, stage):
+        """
+        Returns the parameters a stage runs with.
+
+        Args:
+            stage (str): Name of the stage.
+
+        Returns:
+            dict: Parameters of the stage.
+        """
+        params = self.stage_params.get(stage, {})
+        if stage == "export_raster" and self.bands:
+            params = dict(params, bands=self.bands)
+        return params
+
+    def override(self, stage, **params):
+        """
+        Replaces parameters of a stage for this chunk only, e.g. a higher downscale after the
+        stage ran out of memory.
+
+        Args:
+            stage (str): Name of the stage.
+            **params: Parameters replacing those of the profile.
+        """
+        self.stage_params = dict(self.stage_params, **{stage: dict(self.stage_params.get(stage, {}), **params)})
+
+    def _progress(self, part=0, parts=1):
+        """
+        Returns the progress callback of one of several Metashape calls a stage consists of,
+        scaling the call's progress to its part of the stage.
+
+        Args:
+            part (int): Index of the call within the stage.
+            parts (int): Number of calls of the stage.
+
+        Returns:
+            callable: Callback for the progress argument of the call, or None.
+        """
+        progress = self.progress
+        if progress is None:
+            return None
+        return lambda value: progress((part + value / 100.0) * 100.0 / parts)
 
     def align_photos(self):
         """
         Aligns the photos in the chunk by matching tie points and aligning cameras.
         """
         logging.info(f"Aligning photos for chunk: {self.chunk.label}")
-        self.chunk.matchPhotos(downscale=1,reference_preselection=True,keypoint_limit=60000,tiepoint_limit=15000,filter_mask=False,guided_matching=True,mask_tiepoints=False)
-        self.chunk.alignCameras()
+        self.chunk.matchPhotos(progress=self._progress(0, 2), **self.params("align_photos"))
+        self.chunk.alignCameras(progress=self._progress(1, 2))
+
+    def align_cameras(self, cameras):
+        """
+        Aligns cameras added to an aligned chunk, keeping the alignment of all other cameras.
+        Existing matches are kept, so only pairs with a new camera are matched.
+
+        Args:
+            cameras (list): The new cameras.
+        """
+        logging.info(f"Aligning {len(cameras)} new cameras in chunk: {self.chunk.label}")
+        self.chunk.matchPhotos(reset_matches=False, progress=self._progress(0, 2), **self.params("align_photos"))
+        self.chunk.alignCameras(cameras=cameras, reset_alignment=False, progress=self._progress(1, 2))
+
+    def neighbors(self, cameras, count):
+        """
+        Extends cameras by the aligned cameras closest to each of them, whose depth maps the
+        cameras overlap.
+
+        Args:
+            cameras (list): Aligned cameras.
+            count (int): Number of neighbors per camera.
+
+        Returns:
+            list: The cameras followed by their neighbors, without duplicates.
+        """
+        aligned = [camera for camera in self.chunk.cameras if camera.center is not None]
+        selected = {camera.key: camera for camera in cameras}
+        for camera in cameras:
+            closest = sorted(aligned, key=lambda other: (other.center - camera.center).norm())
+            for other in closest[:count + 1]:
+                selected.setdefault(other.key, other)
+        return list(selected.values())
+
+    def changed_region(self, cameras, margin):
+        """
+        Computes the part of the chunk region below the given cameras, as used by add_tile.
+
+        Args:
+            cameras (list): Aligned cameras.
+            margin (float): Extent added around the camera positions, in chunk coordinates.
+
+        Returns:
+            tuple: (offset x, offset y, width, height) relative to the region center, clipped to the region.
+        """
+        region = self.chunk.region
+        rotation = region.rot.t()
+        points = [rotation * (camera.center - region.center) for camera in cameras]
+        half_x, half_y = region.size.x / 2, region.size.y / 2
+        min_x = max(min(point.x for point in points) - margin, -half_x)
+        max_x = min(max(point.x for point in points) + margin, half_x)
+        min_y = max(min(point.y for point in points) - margin, -half_y)
+        max_y = min(max(point.y for point in points) + margin, half_y)
+        return (min_x + max_x) / 2, (min_y + max_y) / 2, max(max_x - min_x, 0.0), max(max_y - min_y, 0.0)
 
     def build_depth_maps(self):
         """
         Builds depth maps for the chunk.
         """
         logging.info(f"Building Depth Maps for chunk: {self.chunk.label}")
-        self.chunk.buildDepthMaps(downscale=2, filter_mode=Metashape.MildFiltering)
+        params = self.params("build_depth_maps")
+        kwargs = {}
+        if self.depth_map_cameras is not None:
+            # Depth maps of the other cameras are kept
+            kwargs = {"cameras": [camera.key for camera in self.depth_map_cameras], "reuse_depth": True}
+        self.chunk.buildDepthMaps(downscale=params["downscale"], filter_mode=getattr(Metashape, params["filter_mode"]),
+                                  progress=self._progress(), **kwargs)
 
     def build_point_cloud(self):
         """
         Builds a point cloud from the depth maps.
         """
         logging.info(f"Building point cloud for chunk: {self.chunk.label}")
-        self.chunk.buildPointCloud()
+        self.chunk.buildPointCloud(progress=self._progress(), **self.params("build_point_cloud"))
 
     def build_model(self):
         """
         Builds a 3D model from the point cloud.
         """
         logging.info(f"Building model for chunk: {self.chunk.label}")
-        self.chunk.buildModel(source_data=Metashape.DepthMapsData)
+        self.chunk.buildModel(source_data=getattr(Metashape, self.params("build_model")["source_data"]),
+                              progress=self._progress())
 
     def smooth_model(self):
         """
         Applies smoothing to the 3D model.
         """
         logging.info(f"Smoothing model for chunk: {self.chunk.label}")
-        self.chunk.smoothModel(strength=6)
+        self.chunk.smoothModel(strength=self.params("smooth_model")["strength"], progress=self._progress())
+
+    def build_dem(self):
+        """
+        Builds a digital elevation model, e.g. from tie points as a coarse orthomosaic surface.
+        """
+        logging.info(f"Building DEM for chunk: {self.chunk.label}")
+        self.chunk.buildDem(source_data=getattr(Metashape, self.params("build_dem")["source_data"]),
+                            progress=self._progress())
 
     def build_orthomosaic(self):
         """
         Builds an orthomosaic from the 3D model.
         """
         logging.info(f"Building orthomosaic for chunk: {self.chunk.label}")
-        self.chunk.buildOrthomosaic(surface_data=Metashape.DataSource.ModelData)
+        surface_data = getattr(Metashape.DataSource, self.params("build_orthomosaic")["surface_data"])
+        self.chunk.buildOrthomosaic(surface_data=surface_data, progress=self._progress())
+
+    def raster_paths(self, export_folder, product="orthomosaic"):
+        """
+        Determines the paths of the exported rasters of a product. A multispectral orthomosaic is
+        exported as one file per band, named like single-channel chunks: <subfolder>_<band>_orthomosaic.tif.
+
+        Args:
+            export_folder (str): The folder the rasters are saved to.
+            product (str): 'orthomosaic' or 'dem'.
+
+        Returns:
+            dict: Band (None for a single raster) -> path of the raster.
+        """
+        if product == "orthomosaic" and self.bands:
+            prefix = self.name[:-len(MULTISPECTRAL_SUFFIX)]
+            return {band: os.path.join(export_folder, f"{prefix}_{band}{self.output_tag}_{product}.tif")
+                    for band in self.bands}
+        return {None: os.path.join(export_folder, f"{self.name}{self.output_tag}_{product}.tif")}
+
+    def export_paths(self, export_folder, stage):
+        """
+        Determines the paths of the files an export stage writes.
+
+        Args:
+            export_folder (str): The folder the files are saved to.
+            stage (str): 'export_raster', 'export_dem' or 'export_point_cloud'.
+
+        Returns:
+            list: Paths of the exported files, named as by raster_paths for rasters.
+        """
+        if stage == "export_point_cloud":
+            return [os.path.join(export_folder, f"{self.name}{self.output_tag}_point_cloud.laz")]
+        return list(self.raster_paths(export_folder, "dem" if stage == "export_dem" else "orthomosaic").values())
 
     def export_raster(self, export_folder):
         """
-        Exports the orthomosaic as a raster image to the specified folder.
+        Exports the orthomosaic as a raster image to the specified folder. A multispectral
+        chunk is exported as one single-band orthomosaic per band.
         
         Args:
             export_folder (str): The folder where the orthomosaic will be saved.
         """
-        ortho_path = os.path.join(export_folder, f"{self.chunk.label}_orthomosaic.tif")
+        paths = self.raster_paths(export_folder)
+        if not self.bands:
+            self._export_orthomosaic(paths[None], progress=self._progress())
+            return
+
+        for index, band in enumerate(self.bands):
+            self.chunk.raster_transform.formula = [f"B{index + 1}"]
+            self._export_orthomosaic(paths[band], raster_transform=Metashape.RasterTransformValue,
+                                     progress=self._progress(index, len(self.bands)))
+
+    def export_dem(self, export_folder):
+        """
+        Exports the DEM as a raster image to the specified folder.
+
+        Args:
+            export_folder (str): The folder where the DEM will be saved.
+        """
+        dem_path = self.raster_paths(export_folder, "dem")[None]
+        self._write_raster(dem_path, source_data=Metashape.ElevationData, progress=self._progress())
+
+        logging.info(f"Exported DEM to {dem_path}")
+
+    def export_point_cloud(self, export_folder):
+        """
+        Exports the point cloud as a LAZ file to the specified folder.
+
+        Args:
+            export_folder (str): The folder where the point cloud will be saved.
+        """
+        cloud_path = self.export_paths(export_folder, "export_point_cloud")[0]
+
+        self.chunk.exportPointCloud(path=cloud_path,
+                                    source_data=Metashape.PointCloudData,
+                                    format=Metashape.PointCloudFormatLAZ,
+                                    crs=self._export_crs(),
+                                    progress=self._progress())
+
+        logging.info(f"Exported point cloud to {cloud_path}")
+
+    def purge(self, product):
+        """
+        Removes the data of a product from the chunk; it is deleted from disk with the next save.
+
+        Args:
+            product (str): Name of the product, see PRODUCT_ATTRIBUTES.
+        """
+        data = getattr(self.chunk, PRODUCT_ATTRIBUTES[product], None)
+        if data is not None:
+            logging.info(f"Purging {product} from chunk: {self.chunk.label}")
+            self.chunk.remove([data])
+
+    def _raster_settings(self, overviews=True):
+        """
+        Builds the compression and projection settings of raster exports.
+
+        Args:
+            overviews (bool): Whether Metashape writes overviews; GDAL builds them for COGs.
+
+        Returns:
+            tuple: Metashape.ImageCompression and Metashape.OrthoProjection.
+        """
+        params = self.params("export_raster")
 
         compression = Metashape.ImageCompression()
-        compression.tiff_compression = Metashape.ImageCompression.TiffCompressionLZW
-        compression.jpeg_quality = 90
+        compression.tiff_compression = getattr(Metashape.ImageCompression, params["tiff_compression"])
+        compression.jpeg_quality = params["jpeg_quality"]
         compression.tiff_big = True
-        compression.tiff_overviews = True
+        compression.tiff_overviews = overviews
         compression.tiff_tiled = True
 
         out_projection = Metashape.OrthoProjection()
         out_projection.type = Metashape.OrthoProjection.Type.Planar
-        out_projection.crs = Metashape.CoordinateSystem("EPSG::4326")
+        out_projection.crs = self._export_crs()
+
+        return compression, out_projection
 
-        self.chunk.exportRaster(path=ortho_path,
-                                source_data=Metashape.OrthomosaicData,
-                                image_compression=compression,
-                                save_alpha=True,
-                                white_background=True,
-                                projection=out_projection)
+    def _export_crs(self):
+        """
+        Resolves the coordinate system of the exports: 'native' keeps the one of the chunk, 'utm'
+        picks the UTM zone of the chunk center, anything else is a Metashape definition such as
+        'EPSG::4326'. Exporting in the CRS of the chunk avoids reprojecting every pixel.
 
+        Returns:
+            Metashape.CoordinateSystem: Coordinate system of the exports.
+        """
+        crs = self.params("export_raster")["crs"]
+        if crs == "native":
+            return self.chunk.crs
+        if crs == "utm":
+            geographic = Metashape.CoordinateSystem("EPSG::4326")
+            center = geographic.project(self.chunk.transform.matrix.mulp(self.chunk.region.center))
+            return Metashape.CoordinateSystem(cog.utm_crs(center.x, center.y))
+        return Metashape.CoordinateSystem(crs)
+
+    def _export_orthomosaic(self, ortho_path, **kwargs):
+        """
+        Writes the orthomosaic of the chunk to a GeoTIFF.
+
+        Args:
+            ortho_path (str): Path of the exported file.
+            **kwargs: Additional arguments passed to exportRaster.
+        """
+        self._write_raster(ortho_path, source_data=Metashape.OrthomosaicData, save_alpha=True,
+                           white_background=True, **kwargs)
         logging.info(f"Exported orthomosaic to {ortho_path}")
 
+    def _write_raster(self, path, **kwargs):
+        """
+        Exports a raster of the chunk, as Metashape's tiled GeoTIFF or, with 'cog' set in the
+        export parameters, as a Cloud-Optimized GeoTIFF written by GDAL from a raw export.
+
+        With 'split_blocks' set, Metashape exports blocks of that many pixels, which are converted
+        in parallel into '<name>_blocks' and mosaicked by '<name>.vrt' instead of one large file.
+
+        Args:
+            path (str): Path of the exported file.
+            **kwargs: Additional arguments passed to exportRaster.
+        """
+        params = self.params("export_raster")
+        if params.get("cog") and cog.gdal is None:
+            logging.warning(f"GDAL is not installed; exporting {path} as a plain GeoTIFF instead of a COG")
+        if not params.get("cog") or cog.gdal is None:
+            compression, out_projection = self._raster_settings()
+            self.chunk.exportRaster(path=path, image_compression=compression, projection=out_projection, **kwargs)
+            return
+
+        root = os.path.splitext(path)[0]
+        raw_path = f"{root}.raw.tif"
+        if params.get("split_blocks"):
+            kwargs.update(split_in_blocks=True, block_width=params["split_blocks"],
+                          block_height=params["split_blocks"])
+        compression, out_projection = self._raster_settings(overviews=False)
+        self.chunk.exportRaster(path=raw_path, image_compression=compression, projection=out_projection, **kwargs)
+
+        if params.get("split_blocks"):
+            # Metashape appends '-<row>-<column>' to the names of the blocks
+            export_folder = os.path.dirname(path)
+            prefix = os.path.basename(root) + ".raw-"
+            sources = sorted(os.path.join(export_folder, name) for name in os.listdir(export_folder)
+                             if name.startswith(prefix) and name.endswith(".tif"))
+            blocks_folder = f"{root}_blocks"
+            os.makedirs(blocks_folder, exist_ok=True)
+            destinations = [os.path.join(blocks_folder, os.path.basename(source).replace(".raw-", "-"))
+                            for source in sources]
+        else:
+            sources, destinations = [raw_path], [path]
+
+        try:
+            cog.write_cogs(sources, destinations, params, params.get("workers", 4))
+        finally:
+            for source in sources:
+                if os.path.exists(source):
+                    os.remove(source)
+        if params.get("split_blocks") and destinations:
+            write_vrt(f"{root}.vrt", destinations)
+        if params.get("validate", True):
+            cog.check_cogs(destinations)
+
 class MetashapeProcessor:
     """
     Main processor for handling the execution of Metashape processing tasks.
     
     Attributes:
         input_folder (str): Folder containing the project data.
-        gpu_option (str): Specifies which GPU to use ('0', '1', or 'all').
+        gpu_option (str): Specifies which GPU to use ('0', '1', or 'all', or 'cpu' for CPU only).
         cpu_enabled (bool): Whether CPU processing is enabled.
         tmp_folder (str): Temporary folder for intermediate files.
         log_file (str): Path to the log file for recording processing information.
+        scheduler (ChunkScheduler): Distributes chunks over worker processes if configured.
+        catalog (ImageCatalog): Index of the images in the input folder.
+        save_policy (SavePolicy): After which stages projects are saved.
+        grouper (FlightGrouper): Regroups photos into chunks by capture time and position instead of by subfolder.
+        prefilter (PhotoFilter): Removes low, duplicate and blurry photos before they are added to a chunk.
+        progress (ProgressTracker): Publishes stage progress and ETAs in a status file.
+        planner (DiskPlanner): Admits folders and stages only when the temporary folder has room.
+        transfer (TransferEngine): Moves finished projects from the temporary folder to the input folder.
+        stager (ImageStager): Copies the images of a folder to the local disk before it is processed, optionally cached.
+        retry (RetryPolicy): Whether and how failed stages are retried, by failure class.
+        pipelining (dict): Whether the next folder is staged and the previous one moved while a folder is processed.
+        incremental (dict): Whether images added to processed folders are processed incrementally, and how.
+        multispectral (dict): Multispectral processing mode, bands and master band.
+        profiles (dict): Stage parameters of every quality profile.
+        config (dict): The configuration dictionary.
+        preview (dict): Whether and with which profile preview orthomosaics are built first.
+        outputs (list): Requested outputs ('orthomosaic', 'dem', 'point_cloud'); stages not needed for them are pruned.
+        tiling (dict): Whether and with which tile size in meters the dense stages run per tile.
+        retention (str): Which results are kept: 'ortho' (exports only), 'project' (project without depth maps) or 'full'.
     """
-    def __init__(self, config, log_file):
+    def __init__(self, config, log_file, catalog=None):
         """
         Initializes the processor with the given configuration and log file.
         
         Args:
             config (dict): Configuration dictionary containing input_folder, gpu_option, etc.
             log_file (str): Path to the log file.
+            catalog (ImageCatalog): Image index shared with the caller. A new one is created if omitted.
         """
         self.input_folder = config["input_folder"]
         self.gpu_option = config["gpu_option"]
@@ -164,45 +649,876 @@ class MetashapeProcessor:
         self.log_file = log_file
 
         # Set up logging
-        self.logger = setup_logger(self.log_file)
+        self.logger = setup_logger(self.log_file, (config.get("logging") or {}).get("progress_interval", 10))
 
         # Configure GPUs based on the user's choice
         if self.gpu_option == 'all':
             self.logger.info("Using both GPUs (0 and 1).")
             Metashape.app.gpu_mask = (1 << 0) | (1 << 1)  # Enable GPU 0 and GPU 1
-        elif self.gpu_option == '0':
-            os.environ["CUDA_VISIBLE_DEVICES"] = "0"
-            self.logger.info("Using GPU 0 only.")
-            Metashape.app.gpu_mask = 1 << 0  # Enable only GPU 0
-        elif self.gpu_option == '1':
-            os.environ["CUDA_VISIBLE_DEVICES"] = "1"
-            self.logger.info("Using GPU 1 only.")
-            Metashape.app.gpu_mask = 1 << 1  # Enable only GPU 1
+        elif str(self.gpu_option).isdigit():
+            os.environ["CUDA_VISIBLE_DEVICES"] = str(self.gpu_option)
+            self.logger.info(f"Using GPU {self.gpu_option} only.")
+            Metashape.app.gpu_mask = 1 << int(self.gpu_option)  # Enable only the selected GPU
+        elif self.gpu_option == 'cpu':
+            os.environ["CUDA_VISIBLE_DEVICES"] = ""
+            self.logger.info("Using no GPU, CPU only.")
+            Metashape.app.gpu_mask = 0
+            self.cpu_enabled = True
         else:
-            raise ValueError("Invalid GPU option. Use '0', '1', or 'all'.")
+            raise ValueError("Invalid GPU option. Use '0', '1', 'all' or 'cpu'.")
 
         # Optionally enable or disable CPU processing
         Metashape.app.cpu_enable = self.cpu_enabled
         self.logger.info(f"CPU enabled: {self.cpu_enabled}")
 
+        self.scheduler = ChunkScheduler(config, self.log_file)
+        self.catalog = catalog or ImageCatalog(config.get("channel_suffixes"), config.get("metadata"), self.tmp_folder)
+        self.save_policy = SavePolicy(config.get("save"))
+        self.transfer = TransferEngine(config.get("transfer"))
+        self.planner = DiskPlanner(self.tmp_folder, config.get("disk"))
+        self.progress = ProgressTracker(self.tmp_folder, config.get("progress"))
+        self.prefilter = prefilter.PhotoFilter(config.get("prefilter"))
+        self.grouper = FlightGrouper(config.get("grouping"))
+        self.stager = ImageStager(self.tmp_folder, config.get("staging"), self.planner)
+        self.retry = RetryPolicy(config.get("retry"))
+        self.pipelining = config.get("pipelining") or {}
+        self.incremental = config.get("incremental") or {}
+        self.multispectral = config.get("multispectral") or {}
+        self.profiles = build_profiles(config.get("profiles"))
+        self.config = config
+        self.preview = config.get("preview") or {}
+        self.outputs = config.get("outputs") or DEFAULT_OUTPUTS
+        self.retention = config.get("retention", DEFAULT_RETENTION)
+        self.tiling = config.get("tiling") or {}
+
     def process_folders(self):
         """
         Processes all folders in the input directory that contain unprocessed data.
         """
+        folder_paths = []
         for folder_name in sorted(os.listdir(self.input_folder)):
             folder_path = os.path.join(self.input_folder, folder_name)
             if os.path.isdir(folder_path) and "_unprocessed" in folder_name:
-                self.process_unprocessed_folder(folder_path)
-        
+                folder_paths.append(folder_path)
+
+        self.process_batch(folder_paths)
         # Force log flush
         logging.shutdown()
 
-    def process_unprocessed_folder(self, folder_path):
+    def process_batch(self, folder_paths):
+        """
+        Processes a batch of unprocessed folders: previews first, then the full pass with disk
+        admission, pipelining and staging as configured, then incremental updates of processed
+        folders. Used for a single run and for every batch of folders queued in watch mode.
+
+        Args:
+            folder_paths (list): Paths of the folders in processing order.
+
+        Returns:
+            list: Folders skipped because they did not fit into the temporary folder in time or could
+            not be prepared.
+        """
+        # Previews of all flights first, so operators can check them before the full pass finishes
+        if self.preview.get("enabled"):
+            for folder_path in folder_paths:
+                self.process_preview(folder_path)
+
+        # Folders that do not fit into the temporary folder wait until the others are done
+        if self.pipelining.get("enabled"):
+            deferred, skipped = self.process_pipelined(folder_paths)
+        else:
+            skipped = []
+            deferred = []
+            for folder_path in folder_paths:
+                if self.admit(folder_path):
+                    self.process_unprocessed_folder(folder_path)
+                else:
+                    deferred.append(folder_path)
+
+        for folder_path in deferred:
+            try:
+                self.planner.wait_for_space(folder_path, self.estimate_folder(folder_path))
+            except RuntimeError as e:
+                self.logger.error(f"Skipping folder {folder_path}: {str(e)}")
+                skipped.append(folder_path)
+                continue
+            self.process_unprocessed_folder(folder_path)
+
+        if self.incremental.get("enabled"):
+            for folder_name in sorted(os.listdir(self.input_folder)):
+                folder_path = os.path.join(self.input_folder, folder_name)
+                if os.path.isdir(folder_path) and "_processed" in folder_name and "_unprocessed" not in folder_name:
+                    self.update_processed_folder(folder_path)
+
+        self.stager.log_stats()
+        return skipped
+
+    def process_chunk(self, project, manifest, job, export_folder, recorder=None):
+        """
+        Runs all processing stages for one chunk, skipping stages the manifest records as
+        finished with the same parameters. Everything logged meanwhile, including the Metashape
+        console output, is also written to logs/<chunk>.log next to the export folder.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            job (ChunkJob): The chunk's name, images and profile.
+            export_folder (str): The folder where the orthomosaic will be saved.
+            recorder (StageRecorder): Collects stage measurements for the run report.
+        """
+        log_folder = os.path.join(os.path.dirname(os.path.normpath(export_folder)), "logs")
+        os.makedirs(log_folder, exist_ok=True)
+        with chunk_logging(os.path.join(log_folder, f"{job.chunk_name}.log")):
+            try:
+                self._process_chunk(project, manifest, job, export_folder, recorder)
+            finally:
+                if job.staged:
+                    self._unstage(project, job)
+
+    def _unstage(self, project, job):
+        """
+        Relinks the cameras of a chunk from the staged images to the originals and saves the
+        project, so it stays valid once the staged images are removed.
+        """
+        try:
+            relinked = project.relink({staged: path for path, staged in job.staged.items()})
+            project.save()
+            self.logger.info(f"Relinked {relinked} images of chunk {job.chunk_name} to the originals")
+        except Exception as e:
+            self.logger.error(f"Error relinking chunk {job.chunk_name} to the original images: {str(e)}")
+
+    def _process_chunk(self, project, manifest, job, export_folder, recorder=None):
+        """
+        Runs the stages of one chunk; see process_chunk.
+        """
+        recorder = recorder or StageRecorder(os.path.dirname(project.project_path))
+        chunk_name, image_list, bands = job.chunk_name, job.image_list, job.bands
+        master_band = self.multispectral.get("master_band", bands[0]) if bands else None
+        add_params = {"images": image_list_digest(image_list), "bands": bands, "master_band": master_band}
+        chunk = project.find_chunk(chunk_name)
+        # Stages that ran since the last save; recorded in the manifest once saved
+        pending = []
+
+        if chunk is None or not manifest.is_complete(chunk_name, "add_photos", add_params):
+            # Inputs changed or the chunk was never saved: start this chunk over
+            if chunk is not None:
+                project.remove_chunk(chunk)
+            manifest.invalidate_from(chunk_name, "add_photos")
+            # Staged images are read locally; the digest stays on the originals, so staging does not restart chunks
+            with recorder.measure(chunk_name, "add_photos", len(image_list), Metashape.app.gpu_mask,
+                                  project.data_size):
+                chunk = project.add_chunk(chunk_name, [job.staged.get(path, path) for path in image_list], bands,
+                                          master_band)
+            pending.append(("add_photos", add_params))
+        else:
+            self.logger.info(f"Resuming chunk {chunk_name} after stages: {manifest.completed_stages(chunk_name)}")
+            project.relink(job.staged)
+
+        self.logger.info(f"Processing chunk {chunk_name} with profile: {job.profile}")
+        processor = MetashapeChunkProcessor(chunk, self.profiles[job.profile], bands, job.output_tag)
+        self._apply_overrides(manifest, processor)
+
+        stages, pruned = plan_stages(processor.stage_params, self.outputs)
+        if pruned:
+            self.logger.info(f"Pruned stages not needed for outputs {self.outputs}: {pruned}")
+        self.progress.plan(job, stages)
+
+        if not self.tiling.get("enabled"):
+            try:
+                self._run_stages(project, manifest, recorder, job, processor, stages, export_folder, pending)
+            except StageFailure as e:
+                # Always leave the chunk saved, whatever the save points are
+                self._save(project, manifest, recorder, chunk_name, pending)
+                if not self._tile_fallback(manifest, chunk_name, stages, e):
+                    raise
+                self.logger.warning(f"Processing chunk {chunk_name} in tiles after {e.stage} ran out of memory")
+                for record in reversed(recorder.records):
+                    if record["chunk"] == chunk_name and record["stage"] == e.stage:
+                        record["retry"] = "tiles"
+                        break
+                aligned = stages.index("align_photos") + 1
+                self.process_tiles(project, manifest, recorder, job, processor, stages[aligned:], export_folder)
+                return
+            self._save(project, manifest, recorder, chunk_name, pending)
+            return
+
+        # Align the whole chunk once, then build the dense products tile by tile
+        aligned = stages.index("align_photos") + 1
+        self._run_stages(project, manifest, recorder, job, processor, stages[:aligned], export_folder, pending)
+        self._save(project, manifest, recorder, chunk_name, pending)
+        self.process_tiles(project, manifest, recorder, job, processor, stages[aligned:], export_folder)
+
+    def _run_stages(self, project, manifest, recorder, job, processor, stages, export_folder, pending, share=1.0):
+        """
+        Runs the planned stages of a chunk in order, skipping stages whose inputs could not be built
+        and purging intermediate products as the retention policy allows.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            recorder (StageRecorder): Collects stage measurements.
+            job (ChunkJob): The chunk's name, images and profile.
+            processor (MetashapeChunkProcessor): Processor of the chunk.
+            stages (list): Stages to run in execution order.
+            export_folder (str): The folder where exported files are saved.
+            pending (list): (stage, params) tuples of stages not saved yet.
+            share (float): Share of the job's disk space estimate a stage of this chunk needs, e.g. per tile.
+        """
+        chunk = processor.chunk
+        chunk_name = chunk.label
+        self._restore_purged(manifest, processor, stages)
+        # Intermediate products removed from the project once the last stage using them finished
+        releases = release_points(processor.stage_params, stages, RETENTION_POLICIES[self.retention])
+
+        # Products that could not be built, e.g. because the chunk has no transform after alignment
+        missing = set()
+        skipped = []
+        for stage in stages:
+            spec = STAGES[stage]
+            has_transform = chunk.transform.scale and chunk.transform.rotation and chunk.transform.translation
+
+            if spec.get("georeferenced") and not has_transform:
+                self.logger.warning(f"Skipping {stage} for chunk {chunk_name}: chunk has no transform")
+                missing.update(spec["outputs"])
+                skipped.append(stage)
+                continue
+            if missing.intersection(stage_inputs(stage, processor.stage_params)):
+                self.logger.warning(f"Skipping {stage} for chunk {chunk_name}: inputs were not built")
+                missing.update(spec["outputs"])
+                skipped.append(stage)
+                continue
+
+            if not manifest.is_complete(chunk_name, stage, processor.params(stage)):
+                # Pause here rather than running out of space in the middle of the stage
+                required = int(self.planner.estimate_stage(job, stage) * share)
+                self.planner.wait_for_space(f"{stage} of chunk {chunk_name}", required)
+
+            args = (export_folder,) if spec.get("export") else ()
+            self._run_stage(project, manifest, recorder, processor, pending, stage, *args)
+            for product in releases.get(stage, []):
+                if product not in manifest.purged_products(chunk_name):
+                    processor.purge(product)
+                    manifest.mark_purged(chunk_name, product, PRODUCERS[product])
+
+        # Every planned stage builds a requested output, so a skipped stage fails the chunk
+        if skipped:
+            raise StageFailure(f"Chunk {chunk_name} has no transform after alignment; could not run {skipped}",
+                               skipped[0], "data")
+
+    def process_tiles(self, project, manifest, recorder, job, processor, stages, export_folder):
+        """
+        Splits the region of an aligned chunk into overlapping tiles, runs the dense stages on a copy
+        of the chunk per tile, so memory is bounded by the tile size, and mosaics the exported tiles
+        into one virtual raster per product. Tile exports are kept in '<chunk>_tiles' in the export folder.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            recorder (StageRecorder): Collects stage measurements.
+            job (ChunkJob): The chunk's name, images and profile.
+            processor (MetashapeChunkProcessor): Processor of the aligned chunk.
+            stages (list): Stages to run per tile, in execution order.
+            export_folder (str): The folder where the mosaics are saved.
+
+        Raises:
+            StageFailure: If the chunk has no transform, so it cannot be split into tiles.
+            RuntimeError: If any tile failed; the other tiles are finished and mosaicked first.
+        """
+        chunk = processor.chunk
+        chunk_name = chunk.label
+        if not (chunk.transform.scale and chunk.transform.rotation and chunk.transform.translation):
+            raise StageFailure(f"Chunk {chunk_name} has no transform after alignment; could not run {stages}",
+                               stages[0] if stages else None, "data")
+
+        # Tile size and overlap are configured in meters; the region is in chunk coordinates
+        tile_size = float(self.tiling.get("tile_size", 500))
+        overlap = float(self.tiling.get("overlap", 20))
+        region = chunk.region
+        grid = tile_grid(region.size.x, region.size.y, tile_size / chunk.transform.scale, overlap / chunk.transform.scale)
+        self.logger.info(f"Processing chunk {chunk_name} in {len(grid)} tiles of {tile_size} m")
+
+        # Tiles depend on the alignment they were copied from
+        tile_params = {"aligned_at": manifest.chunks[chunk_name]["align_photos"]["completed_at"],
+                       "tile_size": tile_size, "overlap": overlap, "tiles": len(grid)}
+        # Tiles left over from a previous run with a finer grid
+        for tile in list(project.doc.chunks):
+            suffix = tile.label[len(f"{chunk_name}_tile"):]
+            if tile.label.startswith(f"{chunk_name}_tile") and suffix.isdigit() and int(suffix) >= len(grid):
+                project.remove_chunk(tile)
+
+        tile_folder = os.path.join(export_folder, f"{chunk_name}{job.output_tag}_tiles")
+        os.makedirs(tile_folder, exist_ok=True)
+        self.progress.split(chunk_name, [f"{chunk_name}_tile{index:02d}" for index in range(len(grid))])
+
+        tile_processors = []
+        failed = []
+        for index, (offset_x, offset_y, width, height) in enumerate(grid):
+            tile_name = f"{chunk_name}_tile{index:02d}"
+            params = dict(tile_params, tile=index)
+            tile = project.find_chunk(tile_name)
+            pending = []
+
+            if tile is None or not manifest.is_complete(tile_name, "create_tile", params):
+                if tile is not None:
+                    project.remove_chunk(tile)
+                manifest.invalidate_from(tile_name, "create_tile")
+                tile = project.add_tile(chunk, tile_name, offset_x, offset_y, width, height)
+                pending.append(("create_tile", params))
+
+            tile_processor = MetashapeChunkProcessor(tile, processor.stage_params, processor.bands,
+                                                     f"{job.output_tag}_tile{index:02d}", name=chunk_name)
+            self._apply_overrides(manifest, tile_processor)
+            try:
+                self._run_stages(project, manifest, recorder, job, tile_processor, stages, tile_folder, pending,
+                                 share=1 / len(grid))
+                tile_processors.append(tile_processor)
+            except Exception as e:
+                self.logger.error(f"Error processing tile {tile_name}: {str(e)}")
+                failed.append(tile_name)
+            finally:
+                self._save(project, manifest, recorder, tile_name, pending)
+
+        self.mosaic_tiles(processor, tile_processors, stages, tile_folder, export_folder)
+        if failed:
+            raise RuntimeError(f"Tiles {failed} of chunk {chunk_name} failed")
+
+    def mosaic_tiles(self, processor, tile_processors, stages, tile_folder, export_folder):
+        """
+        Writes a virtual raster per exported raster product, mosaicking the tiles.
+
+        Args:
+            processor (MetashapeChunkProcessor): Processor of the tiled chunk.
+            tile_processors (list): MetashapeChunkProcessor of every finished tile.
+            stages (list): Stages that ran per tile.
+            tile_folder (str): Folder holding the exported tiles.
+            export_folder (str): Folder the mosaics are written to, named like untiled exports but ending in '.vrt'.
+        """
+        for product, stage in (("orthomosaic", "export_raster"), ("dem", "export_dem")):
+            if stage not in stages:
+                continue
+            for key, path in processor.raster_paths(export_folder, product).items():
+                tile_paths = [tile_path for tile in tile_processors
+                              for tile_path in cog.raster_files(tile.raster_paths(tile_folder, product)[key])]
+                if tile_paths:
+                    write_vrt(os.path.splitext(path)[0] + ".vrt", tile_paths)
+
+    def _restore_purged(self, manifest, processor, stages):
+        """
+        Invalidates the stages that built purged products still needed by a stage that has to run,
+        so the products are built again, e.g. after a parameter change on resume.
+
+        Args:
+            manifest (StageManifest): Record of finished stages, including purged products.
+            processor (MetashapeChunkProcessor): Processor of the chunk.
+            stages (list): Stages to run in execution order.
+        """
+        chunk_name = processor.chunk.label
+
+        # Rebuilding a product may need another purged product, so repeat until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            purged = manifest.purged_products(chunk_name)
+            for stage in stages:
+                if manifest.is_complete(chunk_name, stage, processor.params(stage)):
+                    continue
+                for product in stage_inputs(stage, processor.stage_params):
+                    data = PRODUCT_DATA.get(product, product)
+                    if data in purged:
+                        self.logger.info(f"Rebuilding purged {data} of chunk {chunk_name} for {stage}")
+                        manifest.invalidate_from(chunk_name, PRODUCERS[data])
+                        changed = True
+                        break
+                if changed:
+                    break
+
+    def _run_stage(self, project, manifest, recorder, processor, pending, stage, *args):
+        """
+        Runs a single chunk stage unless it already finished with the same parameters,
+        then saves the project if the stage is a save point.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            recorder (StageRecorder): Collects stage measurements.
+            processor (MetashapeChunkProcessor): Processor of the chunk.
+            pending (list): (stage, params) tuples of stages not saved yet.
+            stage (str): Name of the MetashapeChunkProcessor method to run.
+            *args: Additional arguments passed to the stage.
+        """
+        chunk_name = processor.chunk.label
+        params = processor.params(stage)
+
+        if manifest.is_complete(chunk_name, stage, params):
+            self.logger.info(f"Skipping {stage} for chunk {chunk_name}: already completed")
+            self.progress.complete(chunk_name, stage)
+            return
+
+        # Anything recorded after this stage was built on its previous result
+        manifest.invalidate_from(chunk_name, stage)
+        # Only the files of this chunk are measured: other chunks may write to the same folders meanwhile
+        if STAGES[stage].get("export"):
+            size = lambda: sum(os.path.getsize(path) for output in processor.export_paths(args[0], stage)
+                               for path in cog.raster_files(output))
+        else:
+            size = project.data_size
+        # Retries may fall back to the CPU for the rest of the stage
+        gpu_mask, cpu_enable = Metashape.app.gpu_mask, Metashape.app.cpu_enable
+        attempt = 1
+        try:
+            with self.progress.track(chunk_name, stage) as progress:
+                processor.progress = progress
+                while True:
+                    try:
+                        with recorder.measure(chunk_name, stage, len(processor.chunk.cameras), Metashape.app.gpu_mask,
+                                              size):
+                            getattr(processor, stage)(*args)
+                        break
+                    except Exception as e:
+                        kind = classify(e)
+                        action = self.retry.next_action(kind, attempt, processor.params(stage),
+                                                        bool(Metashape.app.gpu_mask))
+                        retry = self._prepare_retry(manifest, processor, stage, action)
+                        # The failed attempt was recorded last
+                        recorder.records[-1].update(attempt=attempt, failure=kind, error=str(e), retry=retry)
+                        if action is None:
+                            raise StageFailure(f"{stage} failed with a {kind} error in attempt {attempt}: {e}",
+                                               stage, kind, attempt) from e
+                        self.logger.warning(f"{stage} of chunk {chunk_name} failed with a {kind} error, "
+                                            f"retrying with {retry}: {e}")
+                        attempt += 1
+                        # The throughput is learned from the successful attempt only
+                        self.progress.restart()
+        finally:
+            processor.progress = None
+            Metashape.app.gpu_mask, Metashape.app.cpu_enable = gpu_mask, cpu_enable
+        # Retries may have changed the parameters
+        params = processor.params(stage)
+        pending.append((stage, params))
+
+        if project.save_policy.should_save(stage):
+            self._save(project, manifest, recorder, chunk_name, pending)
+
+    def _prepare_retry(self, manifest, processor, stage, action):
+        """
+        Applies the action chosen by the retry policy to the next attempt of a failed stage. A higher
+        downscale is recorded in the manifest and kept by resumed runs; CPU-only processing lasts for
+        the stage.
+
+        Args:
+            manifest (StageManifest): Record of finished stages and parameter overrides.
+            processor (MetashapeChunkProcessor): Processor of the chunk.
+            stage (str): Name of the failed stage.
+            action (tuple): Action returned by RetryPolicy.next_action, or None.
+
+        Returns:
+            str: Description of the next attempt, or None if the stage is not retried.
+        """
+        if action is None:
+            return None
+        name, value = action
+        if name == "downscale":
+            processor.override(stage, downscale=value)
+            manifest.mark_override(processor.chunk.label, stage, {"downscale": value})
+            return f"downscale {value}"
+        if name == "cpu":
+            Metashape.app.gpu_mask = 0
+            Metashape.app.cpu_enable = True
+            return "CPU only"
+        # Transient errors, e.g. of a network mount, often clear after a while
+        time.sleep(self.retry.delay)
+        return "same settings"
+
+    def _apply_overrides(self, manifest, processor):
+        """
+        Applies the parameter overrides recorded for a chunk after earlier failures.
+
+        Args:
+            manifest (StageManifest): Record of finished stages and parameter overrides.
+            processor (MetashapeChunkProcessor): Processor of the chunk.
+        """
+        for stage, params in manifest.overrides.get(processor.chunk.label, {}).items():
+            self.logger.info(f"Running {stage} of chunk {processor.chunk.label} with {params} after an earlier failure")
+            processor.override(stage, **params)
+
+    def _tile_fallback(self, manifest, chunk_name, stages, failure):
+        """
+        Checks whether an untiled chunk whose dense stage ran out of memory can be processed in tiles.
+
+        Args:
+            manifest (StageManifest): Record of finished stages.
+            chunk_name (str): Name of the chunk.
+            stages (list): Stages of the chunk in execution order.
+            failure (StageFailure): The failure of the chunk.
+
+        Returns:
+            bool: True if the chunk is aligned and the failed stage runs per tile.
+        """
+        if failure.kind != "oom" or not (self.retry.enabled and self.retry.tile_fallback):
+            return False
+        if "align_photos" not in stages or failure.stage not in stages[stages.index("align_photos") + 1:]:
+            return False
+        return manifest.chunks.get(chunk_name, {}).get("align_photos") is not None
+
+    def _save(self, project, manifest, recorder, chunk_name, pending):
+        """
+        Saves the project and records the stages that ran since the last save.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            recorder (StageRecorder): Collects stage measurements.
+            chunk_name (str): Name of the chunk.
+            pending (list): (stage, params) tuples of stages not saved yet; emptied.
+        """
+        if not pending:
+            return
+
+        with recorder.measure(chunk_name, "save", gpu_mask=Metashape.app.gpu_mask, size=project.data_size):
+            project.save()
+        for stage, params in pending:
+            manifest.mark_complete(chunk_name, stage, params)
+        pending.clear()
+
+    def process_chunks_sequentially(self, tmp_project_folder, chunk_jobs, export_folder, recorder):
+        """
+        Processes chunks one after another in a single shared project.
+
+        Args:
+            tmp_project_folder (str): Folder holding the project.
+            chunk_jobs (list): ChunkJob of every chunk.
+            export_folder (str): The folder where the orthomosaics will be saved.
+            recorder (StageRecorder): Collects stage measurements for the run report.
+
+        Returns:
+            dict: Error message per failed chunk.
+        """
+        # Define the path for the project file; an existing project is resumed
+        project_path = os.path.join(tmp_project_folder, "project.psx")
+        project = MetashapeProject(project_path, self.save_policy)
+        project.save()
+
+        # Stages finished by a previous run of this folder are recorded next to the project
+        manifest = StageManifest(os.path.join(tmp_project_folder, "stages.json"))
+
+        errors = {}
+        for job in chunk_jobs:
+            try:
+                self.logger.info(f"Adding photos to chunk: {job.chunk_name}")
+                self.process_chunk(project, manifest, job, export_folder, recorder)
+            except Exception as e:
+                self.logger.error(f"Error processing chunk {job.chunk_name}: {str(e)}")
+                errors[job.chunk_name] = str(e)
+
+        self.logger.info(f"{len(project.save_timings)} project saves took {sum(project.save_timings):.2f} s in total")
+        return errors
+
+    def collect_chunk_jobs(self, folder_path):
+        """
+        Collects the chunks of a flight from its "photos" subfolders: one chunk per subfolder and
+        channel, or, in multiplane mode, a single chunk holding all multispectral bands. With
+        grouping enabled, photos are regrouped by capture time and position first, so a flight
+        spread over several subfolders becomes one chunk and disjoint flights in one subfolder
+        become separate chunks.
+
+        Args:
+            folder_path (str): Path to the flight folder.
+
+        Returns:
+            list: ChunkJob of every chunk, with the profile selected for its folder and channel.
+        """
+        folder_name = os.path.basename(os.path.normpath(folder_path))
+        bands = []
+        if self.multispectral.get("mode") == "multiplane":
+            bands = self.multispectral.get("bands", DEFAULT_MULTISPECTRAL_BANDS)
+
+        flight = self.catalog.flight(folder_path)
+        if self.prefilter.enabled or self.grouper.enabled:
+            # One parallel, incremental header pass for the whole flight instead of one read per photo
+            paths = [path for subfolder_name, index in flight for entries in index.channels.values()
+                     for path, size in entries]
+            metadata = self.catalog.metadata(folder_path, paths)
+            self.prefilter.metadata = metadata
+            if self.grouper.enabled:
+                flight = self.grouper.group(flight, metadata)
+
+        chunk_jobs = []
+        for subfolder_name, index in flight:
+            sizes = {path: size for entries in index.channels.values() for path, size in entries}
+            for channel in self.catalog.channel_suffixes:
+                if channel in bands:
+                    continue
+                image_list, excluded = self.prefilter.filter(index.images(channel))
+                if image_list:
+                    profile = select_profile(self.config, folder_name, channel)
+                    chunk_jobs.append(ChunkJob(f"{subfolder_name}_{channel}", image_list, profile=profile,
+                                               input_bytes=sum(sizes[path] for path in image_list), excluded=excluded,
+                                               members=index.members))
+
+            if bands:
+                image_list, incomplete = self.catalog.captures(index, bands)
+                if incomplete:
+                    self.logger.warning(f"Skipping {incomplete} captures in {subfolder_name} without all bands {bands}")
+                image_list, excluded = self.prefilter.filter(image_list, len(bands))
+                if image_list:
+                    profile = select_profile(self.config, folder_name, MULTISPECTRAL_SUFFIX.lstrip("_"))
+                    chunk_jobs.append(ChunkJob(f"{subfolder_name}{MULTISPECTRAL_SUFFIX}", image_list, bands, profile,
+                                               input_bytes=sum(sizes[path] for path in image_list), excluded=excluded,
+                                               members=index.members))
+
+        return chunk_jobs
+
+    def estimate_folder(self, folder_path, chunk_jobs=None):
+        """
+        Estimates the temporary disk space still needed to process a folder, taking into account
+        what an interrupted run already left in the temporary folder.
+
+        Args:
+            folder_path (str): Path to the folder.
+            chunk_jobs (list): ChunkJob of every chunk; collected from the folder if not given.
+
+        Returns:
+            int: Estimated bytes.
+        """
+        chunk_jobs = self.collect_chunk_jobs(folder_path) if chunk_jobs is None else chunk_jobs
+        required = sum(self.planner.estimate_job(job, plan_stages(self.profiles[job.profile], self.outputs)[0])
+                       for job in chunk_jobs)
+
+        tmp_project_folder = os.path.join(self.tmp_folder, os.path.basename(os.path.normpath(folder_path)))
+        if os.path.isdir(tmp_project_folder):
+            # The preview project and staged images are not part of what the estimate covers
+            excluded = {os.path.normpath(os.path.join(tmp_project_folder, "preview")),
+                        os.path.normpath(self.stager.folder)}
+            with os.scandir(tmp_project_folder) as entries:
+                for entry in entries:
+                    if os.path.normpath(entry.path) in excluded:
+                        continue
+                    required -= directory_size(entry.path) if entry.is_dir() else entry.stat().st_size
+        return max(required, 0)
+
+    def admit(self, folder_path):
+        """
+        Checks whether a folder fits into the temporary folder now.
+
+        Args:
+            folder_path (str): Path to the folder.
+
+        Returns:
+            bool: True if the folder can be processed now.
+        """
+        return self.planner.admit(folder_path, self.estimate_folder(folder_path))
+
+    def process_preview(self, folder_path):
+        """
+        Produces coarse preview orthomosaics of a folder and exports them immediately into the
+        folder's export directory, named '<chunk>_preview_orthomosaic.tif'. The preview project is
+        built separately from the full-resolution project inside the temporary folder and deleted
+        once its exports are written.
+
+        Args:
+            folder_path (str): Path to the folder to be previewed.
+        """
+        self.logger.info(f"Building preview for folder: {folder_path}")
+
+        base_dir = os.path.basename(os.path.normpath(folder_path))
+        preview_folder = os.path.join(self.tmp_folder, base_dir, "preview")
+        os.makedirs(preview_folder, exist_ok=True)
+        export_folder = os.path.join(folder_path, "export")
+        os.makedirs(export_folder, exist_ok=True)
+
+        project = MetashapeProject(os.path.join(preview_folder, "preview.psx"), self.save_policy)
+        manifest = StageManifest(os.path.join(preview_folder, "stages.json"))
+        recorder = StageRecorder(preview_folder)
+
+        chunk_jobs = self.collect_chunk_jobs(folder_path)
+        for job in chunk_jobs:
+            job.profile = self.preview.get("profile", "preview")
+            job.output_tag = "_preview"
+        # With a cache budget, the full pass reuses the images staged for the preview
+        self.stager.stage(folder_path, chunk_jobs)
+        self.progress.start_folder(folder_path, [(job, plan_stages(self.profiles[job.profile], self.outputs)[0])
+                                                 for job in chunk_jobs])
+
+        for job in chunk_jobs:
+            try:
+                self.process_chunk(project, manifest, job, export_folder, recorder)
+            except Exception as e:
+                self.logger.error(f"Error building preview of chunk {job.chunk_name}: {str(e)}")
+        self.progress.close()
+
+        try:
+            recorder.write_report(export_folder, f"{base_dir}_preview", {"folder": folder_path})
+        except Exception as e:
+            self.logger.error(f"Error writing preview run report: {str(e)}")
+        self.stager.release(folder_path)
+        # Only the exports are kept; the project would otherwise be transferred with the full run
+        shutil.rmtree(preview_folder, ignore_errors=True)
+
+    def missing_outputs(self, tmp_project_folder, export_folder, chunk_jobs, errors):
+        """
+        Determines the requested outputs of every chunk that are missing: those whose export stage
+        is not recorded as complete or whose exported files do not exist.
+
+        Args:
+            tmp_project_folder (str): Folder holding the projects and their stage manifests.
+            export_folder (str): Folder with the exported results.
+            chunk_jobs (list): ChunkJob of every chunk.
+            errors (dict): Error message per failed chunk.
+
+        Returns:
+            dict: Missing outputs per chunk name, for failed chunks and chunks missing any output.
+        """
+        jobs = {job.chunk_name: job for job in chunk_jobs}
+        missing = {}
+        for chunk_name in list(jobs) + [name for name in errors if name not in jobs]:
+            # Scheduler workers keep a manifest per chunk, sequential runs one per folder
+            manifest_path = os.path.join(tmp_project_folder, f"{chunk_name}_stages.json")
+            if not os.path.exists(manifest_path):
+                manifest_path = os.path.join(tmp_project_folder, "stages.json")
+            completed = StageManifest(manifest_path).completed_stages(chunk_name)
+            job = jobs.get(chunk_name)
+            names = MetashapeChunkProcessor(None, bands=job.bands if job else None,
+                                            output_tag=job.output_tag if job else "", name=chunk_name)
+            outputs = []
+            for output in self.outputs:
+                stage = OUTPUT_STAGES[output]
+                # Tiled chunks are exported as a virtual raster mosaicking the tiles
+                exported = all(cog.raster_files(path) or os.path.exists(os.path.splitext(path)[0] + ".vrt")
+                               for path in names.export_paths(export_folder, stage))
+                if stage not in completed or not exported:
+                    outputs.append(output)
+            if outputs or chunk_name in errors:
+                missing[chunk_name] = outputs
+        return missing
+
+    def apply_retention(self, tmp_project_folder, export_folder, errors):
+        """
+        Deletes the projects from the temporary folder before the transfer if only the exports
+        are retained. Projects of folders with failed chunks are kept so the folder can be resumed.
+
+        Args:
+            tmp_project_folder (str): Folder holding the projects and the export folder.
+            export_folder (str): Folder with the exported results, always kept.
+            errors (dict): Error message per failed chunk.
+        """
+        if self.retention != "ortho":
+            return
+        if errors:
+            self.logger.warning(f"Keeping projects in {tmp_project_folder}: chunks {sorted(errors)} failed")
+            return
+
+        for name in os.listdir(tmp_project_folder):
+            path = os.path.join(tmp_project_folder, name)
+            if os.path.samefile(path, export_folder):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            self.logger.info(f"Removed {path} (retention: {self.retention})")
+
+    def prepare_folder(self, folder_path, reserved_bytes=0):
+        """
+        Collects the chunks of a folder and stages its images to the local disk if staging is enabled.
+
+        Args:
+            folder_path (str): Path to the folder.
+            reserved_bytes (int): Temporary space needed by folders processed meanwhile.
+
+        Returns:
+            list: ChunkJob of every chunk.
+        """
+        chunk_jobs = self.collect_chunk_jobs(folder_path)
+        if self.stager.enabled:
+            self.stager.stage(folder_path, chunk_jobs, reserved_bytes + self.estimate_folder(folder_path, chunk_jobs))
+        return chunk_jobs
+
+    def process_pipelined(self, folder_paths):
+        """
+        Processes folders while overlapping their I/O: the next folder is collected and staged in
+        a background thread while the current one is processed, and the results of the previous
+        folder are moved to the input folder in another. Each queue holds a single folder, so at
+        most three folders use the temporary folder at a time.
+
+        Args:
+            folder_paths (list): Paths of the folders in processing order.
+
+        Returns:
+            tuple: Folders deferred because they did not fit into the temporary folder, and folders
+            that could not be prepared.
+        """
+        deferred = []
+        skipped = []
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch") as prefetcher, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="finish") as finisher:
+            prefetched = prefetcher.submit(self.prepare_folder, folder_paths[0]) if folder_paths else None
+            finishing = None
+            for index, folder_path in enumerate(folder_paths):
+                try:
+                    chunk_jobs = prefetched.result()
+                    required = self.estimate_folder(folder_path, chunk_jobs)
+                    admitted = self.planner.admit(folder_path, required)
+                except Exception as e:
+                    self.logger.error(f"Error preparing folder {folder_path}: {str(e)}")
+                    chunk_jobs, required, admitted = None, 0, False
+                    skipped.append(folder_path)
+                if chunk_jobs is not None and not admitted:
+                    self.stager.release(folder_path)
+                    deferred.append(folder_path)
+
+                # The next folder is staged next to the space this one still needs
+                prefetched = None
+                if index + 1 < len(folder_paths):
+                    prefetched = prefetcher.submit(self.prepare_folder, folder_paths[index + 1],
+                                                   required if admitted else 0)
+                if not admitted:
+                    continue
+
+                errors = self.run_folder(folder_path, chunk_jobs)
+                # Wait for the previous transfer, so only one folder waits to be moved
+                if finishing is not None:
+                    finishing.result()
+                finishing = finisher.submit(self.finish_folder, folder_path, errors)
+
+            if finishing is not None:
+                finishing.result()
+        return deferred, skipped
+
+    def process_unprocessed_folder(self, folder_path, chunk_jobs=None):
         """
         Processes an unprocessed folder, including image loading, model generation, and exporting results.
         
         Args:
             folder_path (str): Path to the folder to be processed.
+            chunk_jobs (list): ChunkJob of every chunk, if already prepared.
+        """
+        if chunk_jobs is None:
+            chunk_jobs = self.prepare_folder(folder_path)
+        errors = self.run_folder(folder_path, chunk_jobs)
+        self.finish_folder(folder_path, errors)
+
+    def run_folder(self, folder_path, chunk_jobs):
+        """
+        Processes the chunks of a folder in the temporary folder and writes the run report.
+
+        Args:
+            folder_path (str): Path to the folder to be processed.
+            chunk_jobs (list): ChunkJob of every chunk.
+
+        Returns:
+            dict: Error message per failed chunk.
+        """
+        # Everything logged for this folder is also written to logs/<folder>.log, which is moved
+        # with the project; the run log stays where it is
+        base_dir = os.path.basename(os.path.normpath(folder_path))
+        log_folder = os.path.join(self.tmp_folder, base_dir, "logs")
+        os.makedirs(log_folder, exist_ok=True)
+        with chunk_logging(os.path.join(log_folder, f"{base_dir}.log")):
+            return self._run_folder(folder_path, chunk_jobs)
+
+    def _run_folder(self, folder_path, chunk_jobs):
+        """
+        Processes the chunks of a folder; see run_folder.
         """
         self.logger.info(f"Processing folder: {folder_path}")
         
@@ -215,70 +1531,291 @@ class MetashapeProcessor:
         export_folder = os.path.join(tmp_project_folder, "export")
         os.makedirs(export_folder, exist_ok=True)
 
-        # Define the path for the project file
-        project_path = os.path.join(tmp_project_folder, "project.psx")
-        project = MetashapeProject(project_path)
-        project.save()
+        self.logger.info("Processing RGB and multispectral images by their specific naming convention")
+        self.progress.start_folder(folder_path, [(job, plan_stages(self.profiles[job.profile], self.outputs)[0])
+                                                 for job in chunk_jobs])
+
+        recorder = StageRecorder(tmp_project_folder)
+        if self.scheduler.enabled:
+            # Each worker owns a project per chunk, so chunks never share a document
+            errors = self.scheduler.run(tmp_project_folder, chunk_jobs, export_folder, recorder)
+        else:
+            errors = self.process_chunks_sequentially(tmp_project_folder, chunk_jobs, export_folder, recorder)
+        self.progress.close()
+
+        # The run report is placed next to the exported orthomosaics
+        try:
+            recorder.write_report(export_folder, base_dir, {
+                "folder": folder_path,
+                "metashape_version": Metashape.app.version,
+                "gpu_option": self.gpu_option,
+                "chunks": {job.chunk_name: job.profile for job in chunk_jobs},
+                "excluded_photos": {job.chunk_name: len(job.excluded) for job in chunk_jobs},
+            })
+            if self.prefilter.enabled:
+                prefilter.write_report(os.path.join(export_folder, f"{base_dir}_prefilter_report.csv"), chunk_jobs)
+        except Exception as e:
+            self.logger.error(f"Error writing run report: {str(e)}")
 
-        # Locate the "photos" directory within the "_unprocessed" folder
-        photos_dir = os.path.join(folder_path, "photos")
-        if os.path.isdir(photos_dir):
-            for subfolder_name in sorted(os.listdir(photos_dir)):
-                subfolder_path = os.path.join(photos_dir, subfolder_name)
-                if os.path.isdir(subfolder_path):
-                    self.logger.info("Processing RGB and multispectral images by their specific naming convention")
-                    image_dict = {
-                        "RGB": [os.path.join(subfolder_path, file_name) for file_name in os.listdir(subfolder_path) if file_name.endswith(".JPG")],
-                        "NIR": [os.path.join(subfolder_path, file_name) for file_name in os.listdir(subfolder_path) if file_name.endswith("MS_NIR.TIF")],
-                        "RE": [os.path.join(subfolder_path, file_name) for file_name in os.listdir(subfolder_path) if file_name.endswith("MS_RE.TIF")],
-                        "R": [os.path.join(subfolder_path, file_name) for file_name in os.listdir(subfolder_path) if file_name.endswith("MS_R.TIF")],
-                        "G": [os.path.join(subfolder_path, file_name) for file_name in os.listdir(subfolder_path) if file_name.endswith("MS_G.TIF")],
-                    }
-
-                    for channel, image_list in image_dict.items():
-                        try:
-                            if not image_list:
-                                continue
-                            
-                            self.logger.info(f"Adding {channel} photos to chunk: {subfolder_name}_{channel}")
-                            chunk_name = f"{subfolder_name}_{channel}"
-                            chunk = project.add_chunk(chunk_name, image_list)
-                            processor = MetashapeChunkProcessor(chunk)
-
-                            processor.align_photos()
-                            project.save()
-
-                            processor.build_depth_maps()
-                            project.save()
-
-                            processor.build_model()
-                            project.save()
-
-                            has_transform = chunk.transform.scale and chunk.transform.rotation and chunk.transform.translation
-
-                            if has_transform:
-                                processor.build_point_cloud()
-                                project.save()
-
-                                processor.smooth_model()
-                                project.save()
-
-                                processor.build_orthomosaic()
-                                project.save()
-
-                            processor.export_raster(export_folder)
-                            project.save()
-                        except Exception as e:
-                            self.logger.error(f"Error processing chunk {subfolder_name}_{channel}: {str(e)}")
-                            pass
+        try:
+            missing = self.missing_outputs(tmp_project_folder, export_folder, chunk_jobs, errors)
+            # A chunk that finished without its exports, e.g. because they were removed, failed as well
+            for chunk_name, outputs in missing.items():
+                errors.setdefault(chunk_name, f"Outputs were not exported: {', '.join(outputs)}")
+            summary = write_summary(os.path.join(export_folder, f"{base_dir}_failures.json"), folder_path,
+                                    recorder.records, errors, missing)
+            for chunk_name, failure in (summary or {}).get("failed_chunks", {}).items():
+                self.logger.error(f"Chunk {chunk_name} has no {', '.join(failure['missing_outputs'])}: "
+                                  f"{failure['failure']} error in {failure['stage'] or 'processing'}")
+        except Exception as e:
+            self.logger.error(f"Error writing failure summary: {str(e)}")
 
         try:
-            move_all_files(tmp_project_folder, folder_path)
-            move_file(self.log_file, folder_path)
+            self.planner.learn(recorder.records, chunk_jobs)
+        except Exception as e:
+            self.logger.error(f"Error updating disk history: {str(e)}")
+
+        try:
+            # Failed chunks are not recorded, so an update processes them completely
+            ImageManifest(os.path.join(tmp_project_folder, IMAGE_MANIFEST)).record(
+                folder_path, [job for job in chunk_jobs if job.chunk_name not in errors])
+        except Exception as e:
+            self.logger.error(f"Error writing image manifest: {str(e)}")
+
+        self.apply_retention(tmp_project_folder, export_folder, errors)
+        return errors
+
+    def finish_folder(self, folder_path, errors=None):
+        """
+        Moves the results of a processed folder from the temporary folder into the folder, renames
+        it to '_processed' and removes its staged images. The results of a folder with failed chunks
+        stay in the temporary folder, so the next run resumes them.
+
+        Args:
+            folder_path (str): Path to the processed folder.
+            errors (dict): Error message per failed chunk.
+        """
+        tmp_project_folder = os.path.join(self.tmp_folder, os.path.basename(os.path.normpath(folder_path)))
+        if errors:
+            self.logger.error(f"Not renaming folder {folder_path}: chunks {sorted(errors)} failed; "
+                              f"results are kept in {tmp_project_folder}")
+            self.stager.release(folder_path)
+            return
+        try:
+            # The folder and chunk logs are moved with the project, so they must be complete
+            flush_logging()
+            move_all_files(tmp_project_folder, folder_path, self.transfer)
 
             processed_folder = folder_path.replace("_unprocessed", "_processed")
             os.rename(folder_path, processed_folder)
             self.logger.info(f"Renamed folder to: {processed_folder}")
         except Exception as e:
             self.logger.error(f"Error handling files or renaming folder: {str(e)}")
-            pass
+        finally:
+            self.stager.release(folder_path)
+
+    def update_processed_folder(self, folder_path):
+        """
+        Processes images added to a processed folder since it was processed, in place. New images
+        are aligned into their existing chunk, depth maps are rebuilt only for the new cameras and
+        their neighbors, and only the region below the new cameras is rebuilt and exported; the
+        result is mosaicked over the previous export. Chunks that are new or were never aligned
+        are processed completely. With staging enabled, the images are read from staged copies.
+
+        Args:
+            folder_path (str): Path to the processed folder.
+
+        Returns:
+            int: Number of updated chunks.
+        """
+        image_manifest = ImageManifest(os.path.join(folder_path, IMAGE_MANIFEST))
+        if not image_manifest.chunks:
+            self.logger.debug(f"Not updating {folder_path}: it has no image manifest")
+            return 0
+
+        chunk_jobs = self.collect_chunk_jobs(folder_path)
+        updates = []
+        for job in chunk_jobs:
+            new_images = image_manifest.new_images(folder_path, job)
+            if new_images:
+                updates.append((job, new_images))
+        if not updates:
+            return 0
+        self.logger.info(f"Updating folder {folder_path} with {sum(len(images) for job, images in updates)} new "
+                         f"images in chunks {[job.chunk_name for job, images in updates]}")
+
+        export_folder = os.path.join(folder_path, "export")
+        os.makedirs(export_folder, exist_ok=True)
+        recorder = StageRecorder(folder_path)
+        self.progress.start_folder(folder_path, [])
+        # The project still refers to the images by the folder's name before it was processed
+        moved_paths = image_manifest.moved_paths(folder_path)
+        # Copies cached while the folder was unprocessed are reused; only the new images are copied
+        if self.stager.enabled:
+            try:
+                self.stager.stage(folder_path, [job for job, new_images in updates])
+            except Exception as e:
+                self.logger.error(f"Error staging images of {folder_path}: {str(e)}")
+
+        updated = []
+        for job, new_images in updates:
+            # Chunks processed by parallel workers have a project of their own
+            project_path = os.path.join(folder_path, f"{job.chunk_name}.psx")
+            if os.path.exists(project_path):
+                manifest_path = project_path.replace(".psx", "_stages.json")
+            else:
+                project_path = os.path.join(folder_path, "project.psx")
+                manifest_path = os.path.join(folder_path, "stages.json")
+            if not os.path.exists(project_path):
+                self.logger.warning(f"Not updating chunk {job.chunk_name}: {folder_path} has no project "
+                                    f"(retention: {self.retention})")
+                continue
+
+            try:
+                project = MetashapeProject(project_path, self.save_policy)
+                project.relink(moved_paths)
+                project.relink(job.staged)
+                self.update_chunk(project, StageManifest(manifest_path), job, new_images, export_folder, recorder)
+                updated.append(job)
+            except Exception as e:
+                self.logger.error(f"Error updating chunk {job.chunk_name}: {str(e)}")
+        self.stager.release(folder_path)
+        self.progress.close()
+
+        try:
+            image_manifest.record(folder_path, updated)
+            recorder.write_report(export_folder, f"{os.path.basename(os.path.normpath(folder_path))}_update",
+                                  {"folder": folder_path, "new_images": {job.chunk_name: len(images)
+                                                                         for job, images in updates}})
+        except Exception as e:
+            self.logger.error(f"Error writing update report: {str(e)}")
+        return len(updated)
+
+    def update_chunk(self, project, manifest, job, new_images, export_folder, recorder=None):
+        """
+        Adds new images to a processed chunk and rebuilds the region they cover. Logged like process_chunk.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk.
+            manifest (StageManifest): Record of finished stages.
+            job (ChunkJob): The chunk with all its current images.
+            new_images (list): Images of the chunk that are not in the project yet.
+            export_folder (str): The folder holding the exports of the chunk.
+            recorder (StageRecorder): Collects stage measurements for the run report.
+        """
+        log_folder = os.path.join(os.path.dirname(os.path.normpath(export_folder)), "logs")
+        os.makedirs(log_folder, exist_ok=True)
+        with chunk_logging(os.path.join(log_folder, f"{job.chunk_name}.log")):
+            try:
+                self._update_chunk(project, manifest, job, new_images, export_folder, recorder)
+            finally:
+                if job.staged:
+                    self._unstage(project, job)
+
+    def _update_chunk(self, project, manifest, job, new_images, export_folder, recorder=None):
+        """
+        Updates one chunk; see update_chunk.
+        """
+        recorder = recorder or StageRecorder(os.path.dirname(project.project_path))
+        chunk_name, bands = job.chunk_name, job.bands
+        chunk = project.find_chunk(chunk_name)
+        processor = MetashapeChunkProcessor(chunk, self.profiles[job.profile], bands, job.output_tag) if chunk else None
+        if chunk is None or not manifest.is_complete(chunk_name, "align_photos", processor.params("align_photos")):
+            self.logger.info(f"Chunk {chunk_name} has no alignment to extend; processing it completely")
+            self._process_chunk(project, manifest, job, export_folder, recorder)
+            return
+
+        stages = plan_stages(processor.stage_params, self.outputs)[0]
+        self.progress.plan(job, stages)
+        master_band = self.multispectral.get("master_band", bands[0]) if bands else None
+        gpu_mask = Metashape.app.gpu_mask
+
+        with recorder.measure(chunk_name, "add_photos", len(new_images), gpu_mask, project.data_size):
+            cameras = project.add_photos(chunk, [job.staged.get(path, path) for path in new_images], bands)
+        with recorder.measure(chunk_name, "align_photos", len(cameras), gpu_mask, project.data_size), \
+                self.progress.track(chunk_name, "align_photos") as progress:
+            processor.progress = progress
+            processor.align_cameras(cameras)
+        aligned = [camera for camera in cameras if camera.center is not None]
+        self.logger.info(f"Aligned {len(aligned)} of {len(cameras)} new cameras in chunk {chunk_name}")
+
+        # The chunk now holds all current images; later stages stay recorded, the region is rebuilt below
+        pending = [("add_photos", {"images": image_list_digest(job.image_list), "bands": bands,
+                                   "master_band": master_band}),
+                   ("align_photos", processor.params("align_photos"))]
+        dense = stages[stages.index("align_photos") + 1:]
+        if not aligned or not dense:
+            self._save(project, manifest, recorder, chunk_name, pending)
+            return
+
+        if "build_depth_maps" in dense:
+            processor.depth_map_cameras = processor.neighbors(aligned, int(self.incremental.get("neighbors", 8)))
+            self.logger.info(f"Building depth maps of {len(processor.depth_map_cameras)} cameras in chunk {chunk_name}")
+            with recorder.measure(chunk_name, "build_depth_maps", len(processor.depth_map_cameras), gpu_mask,
+                                  project.data_size), \
+                    self.progress.track(chunk_name, "build_depth_maps") as progress:
+                processor.progress = progress
+                processor.build_depth_maps()
+            pending.append(("build_depth_maps", processor.params("build_depth_maps")))
+            dense = dense[dense.index("build_depth_maps") + 1:]
+        processor.progress = None
+        self._save(project, manifest, recorder, chunk_name, pending)
+
+        # The changed region is rebuilt in a copy of the chunk and exported on its own
+        margin = float(self.incremental.get("margin", 50)) / (chunk.transform.scale or 1.0)
+        offset_x, offset_y, width, height = processor.changed_region(aligned, margin)
+        index = 1 + sum(1 for other in project.doc.chunks if other.label.startswith(f"{chunk_name}_update"))
+        update_name = f"{chunk_name}_update{index:02d}"
+        update = project.add_tile(chunk, update_name, offset_x, offset_y, width, height)
+        pending = [("create_tile", {"images": image_list_digest(job.image_list),
+                                    "region": [offset_x, offset_y, width, height]})]
+        self.progress.split(chunk_name, [update_name])
+
+        update_folder = os.path.join(export_folder, f"{chunk_name}{job.output_tag}_updates")
+        os.makedirs(update_folder, exist_ok=True)
+        update_processor = MetashapeChunkProcessor(update, processor.stage_params, bands,
+                                                   f"{job.output_tag}_update{index:02d}", name=chunk_name)
+        try:
+            self._run_stages(project, manifest, recorder, job, update_processor, dense, update_folder, pending)
+        finally:
+            self._save(project, manifest, recorder, update_name, pending)
+        self.mosaic_updates(project, processor, dense, export_folder)
+
+    def mosaic_updates(self, project, processor, stages, export_folder):
+        """
+        Writes a virtual raster per exported raster product that lays the exports of all updates
+        of a chunk over its original export, or over its tiles if it was tiled.
+
+        Args:
+            project (MetashapeProject): The project holding the chunk and its updates.
+            processor (MetashapeChunkProcessor): Processor of the updated chunk.
+            stages (list): Stages that ran for the latest update.
+            export_folder (str): Folder holding the exports of the chunk.
+        """
+        chunk_name = processor.chunk.label
+
+        def parts(kind):
+            """
+            Processors of the tiles or updates of the chunk, in the order they were made.
+            """
+            prefix = f"{chunk_name}_{kind}"
+            labels = sorted(chunk.label for chunk in project.doc.chunks
+                            if chunk.label.startswith(prefix) and chunk.label[len(prefix):].isdigit())
+            return [MetashapeChunkProcessor(project.find_chunk(label), processor.stage_params, processor.bands,
+                                            f"{processor.output_tag}_{label[len(chunk_name) + 1:]}", name=chunk_name)
+                    for label in labels]
+
+        tile_folder = os.path.join(export_folder, f"{chunk_name}{processor.output_tag}_tiles")
+        update_folder = os.path.join(export_folder, f"{chunk_name}{processor.output_tag}_updates")
+        for product, stage in (("orthomosaic", "export_raster"), ("dem", "export_dem")):
+            if stage not in stages:
+                continue
+            for key, path in processor.raster_paths(export_folder, product).items():
+                layers = cog.raster_files(path)
+                if not layers:
+                    layers = [layer for tile in parts("tile")
+                              for layer in cog.raster_files(tile.raster_paths(tile_folder, product)[key])]
+                layers += [layer for update in parts("update")
+                           for layer in cog.raster_files(update.raster_paths(update_folder, product)[key])]
+                if layers:
+                    write_vrt(os.path.splitext(path)[0] + ".vrt", layers)
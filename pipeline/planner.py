@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import shutil
+import logging
+from pipeline.utils import format_bytes
+
+# Bytes written to the temporary folder per byte of input images, per stage. These conservative
+# starting values are replaced by the ratios measured in previous runs.
+DEFAULT_STAGE_RATIOS = {
+    "add_photos": 0.01,
+    "align_photos": 0.05,
+    "build_depth_maps": 2.0,
+    "build_model": 0.5,
+    "build_point_cloud": 1.0,
+    "smooth_model": 0.1,
+    "build_dem": 0.2,
+    "build_orthomosaic": 1.0,
+    "export_raster": 0.5,
+    "export_dem": 0.1,
+    "export_point_cloud": 0.3,
+}
+
+# Weight of the latest run in the learned ratios
+LEARNING_RATE = 0.5
+
+class DiskPlanner:
+    """
+    Estimates the temporary disk space of folders and stages and keeps processing within the
+    free space of the temporary folder.
+
+    Folders are only admitted when their estimate fits, and before every stage the free space is
+    checked again; if the stage does not fit, processing pauses until space is freed and the chunk
+    is stopped before the stage starts if it never is, so it can be resumed later.
+
+    Attributes:
+        tmp_folder (str): Temporary folder whose free space is planned.
+        reserve_bytes (int): Space that is always left free.
+        poll_interval (float): Seconds between free space checks while paused.
+        max_wait (float): Seconds to pause for space before giving up on a stage.
+        history_file (str): JSON file with the ratios learned from previous runs.
+        ratios (dict): Bytes written per input byte, per '<profile>/<stage>'.
+    """
+    def __init__(self, tmp_folder, config=None):
+        """
+        Initializes the planner from the optional 'disk' section of the configuration.
+
+        Args:
+            tmp_folder (str): Temporary folder whose free space is planned.
+            config (dict): 'disk' section with 'reserve_gb', 'poll_interval', 'max_wait' and 'history_file'.
+        """
+        config = config or {}
+        self.tmp_folder = tmp_folder
+        self.reserve_bytes = int(float(config.get("reserve_gb", 100)) * 1024 ** 3)
+        self.poll_interval = float(config.get("poll_interval", 60))
+        self.max_wait = float(config.get("max_wait", 3600))
+        self.history_file = config.get("history_file", os.path.join(tmp_folder, "disk_history.json"))
+        self.ratios = {}
+
+        if os.path.exists(self.history_file):
+            try:
+                with open(self.history_file, 'r') as file:
+                    self.ratios = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable disk history {self.history_file}: {e}")
+
+    def ratio(self, profile, stage):
+        """
+        Returns the bytes written per input byte by a stage, as learned for the profile.
+
+        Args:
+            profile (str): Name of the quality profile.
+            stage (str): Name of the stage.
+
+        Returns:
+            float: Bytes written to the temporary folder per byte of input images.
+        """
+        return self.ratios.get(f"{profile}/{stage}", DEFAULT_STAGE_RATIOS.get(stage, 0.0))
+
+    def estimate_stage(self, job, stage):
+        """
+        Estimates the temporary space a stage of a chunk needs.
+
+        Args:
+            job (ChunkJob): The chunk.
+            stage (str): Name of the stage.
+
+        Returns:
+            int: Estimated bytes.
+        """
+        return int(job.input_bytes * self.ratio(job.profile, stage))
+
+    def estimate_job(self, job, stages):
+        """
+        Estimates the temporary space a chunk needs once all its stages ran.
+
+        Args:
+            job (ChunkJob): The chunk.
+            stages (list): Stages the chunk runs.
+
+        Returns:
+            int: Estimated bytes.
+        """
+        return sum(self.estimate_stage(job, stage) for stage in ["add_photos"] + list(stages))
+
+    def free_bytes(self):
+        """
+        Returns the free space of the temporary folder minus the reserve.
+
+        Returns:
+            int: Usable bytes, negative if the reserve is already used.
+        """
+        # Before the first run the temporary folder may not exist yet; it will be created on the
+        # file system of its nearest existing parent
+        path = os.path.abspath(self.tmp_folder)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return shutil.disk_usage(path).free - self.reserve_bytes
+
+    def admit(self, name, required_bytes):
+        """
+        Checks whether work of the given size fits into the temporary folder now.
+
+        Args:
+            name (str): Folder or chunk, for logging.
+            required_bytes (int): Estimated temporary space.
+
+        Returns:
+            bool: True if the work fits.
+        """
+        free = self.free_bytes()
+        if required_bytes <= free:
+            logging.info(f"Admitting {name}: needs about {format_bytes(required_bytes)}, "
+                         f"{format_bytes(free)} free in {self.tmp_folder}")
+            return True
+
+        logging.warning(f"Deferring {name}: needs about {format_bytes(required_bytes)}, "
+                        f"only {format_bytes(max(free, 0))} free in {self.tmp_folder}")
+        return False
+
+    def wait_for_space(self, name, required_bytes):
+        """
+        Pauses until work of the given size fits into the temporary folder.
+
+        Args:
+            name (str): Folder, chunk or stage, for logging.
+            required_bytes (int): Estimated temporary space.
+
+        Raises:
+            RuntimeError: If the space is not freed within max_wait seconds.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while self.free_bytes() < required_bytes:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Not enough space in {self.tmp_folder} for {name}: "
+                                   f"needs about {format_bytes(required_bytes)}")
+            logging.warning(f"Pausing {name} until {format_bytes(required_bytes)} are free in {self.tmp_folder}")
+            time.sleep(self.poll_interval)
+
+    def learn(self, records, chunk_jobs):
+        """
+        Updates the learned ratios from the stage measurements of a finished folder and persists them.
+
+        Args:
+            records (list): Stage records of a StageRecorder.
+            chunk_jobs (list): ChunkJob of every measured chunk.
+        """
+        jobs = {job.chunk_name: job for job in chunk_jobs}
+        for record in records:
+            job = jobs.get(record["chunk"])
+            if job is None or not job.input_bytes or record["status"] != "ok" or record["stage"] == "save":
+                continue
+            key = f"{job.profile}/{record['stage']}"
+            measured = record["disk_bytes_written"] / job.input_bytes
+            previous = self.ratios.get(key)
+            self.ratios[key] = measured if previous is None else (1 - LEARNING_RATE) * previous + LEARNING_RATE * measured
+
+        tmp_path = f"{self.history_file}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.ratios, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.history_file)
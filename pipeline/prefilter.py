@@ -0,0 +1,232 @@
+import csv
+import math
+import logging
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pipeline.metadata import read_metadata
+
+try:
+    import cv2
+except ImportError:  # Sharpness scoring is skipped without OpenCV
+    cv2 = None
+
+# Mean earth radius in meters, for distances between GPS positions
+EARTH_RADIUS = 6371000.0
+
+REPORT_FIELDS = ["chunk", "path", "reason", "value"]
+
+class PhotoFilter:
+    """
+    Removes photos that only inflate alignment cost before they are added to a chunk: take-off and
+    landing shots below a minimum altitude, near-duplicate frames taken while hovering, and blurry
+    photos.
+
+    Photos are judged from the GPS position and altitude in their EXIF/XMP header. Multispectral
+    captures are kept or excluded as a whole, judged by their first band. Sharpness is scored on a
+    downsampled grayscale image in a process pool if OpenCV is available.
+
+    Attributes:
+        enabled (bool): Whether photos are filtered at all.
+        min_altitude (float): Minimum height above the take-off point in meters, or None.
+        duplicate_distance (float): Photos closer than this many meters to the previous kept photo are dropped, or None.
+        sharpness (dict): 'enabled', 'min_ratio' (of the chunk's median score), 'reduction' and 'workers'.
+        metadata (dict): Metadata per image path; shared with other users of the image headers.
+    """
+    def __init__(self, config=None, metadata=None):
+        """
+        Initializes the filter from the optional 'prefilter' section of the configuration.
+
+        Args:
+            config (dict): 'prefilter' section of the configuration.
+            metadata (dict): Cache of image metadata by path, filled on demand.
+        """
+        config = config or {}
+        self.enabled = bool(config.get("enabled", False))
+        self.min_altitude = config.get("min_altitude")
+        self.duplicate_distance = config.get("duplicate_distance")
+        self.sharpness = config.get("sharpness") or {}
+        self.metadata = metadata if metadata is not None else {}
+        self._scores = {}
+
+    def read(self, path):
+        """
+        Returns the metadata of an image, reading its header on first use.
+
+        Args:
+            path (str): Path of the image.
+
+        Returns:
+            dict: Metadata as returned by read_metadata; empty if the header is unreadable.
+        """
+        if path not in self.metadata:
+            try:
+                self.metadata[path] = read_metadata(path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read metadata of {path}: {e}")
+                self.metadata[path] = {}
+        return self.metadata[path]
+
+    def filter(self, image_list, group_size=1):
+        """
+        Filters the images of a chunk.
+
+        Args:
+            image_list (list): Image paths of the chunk; for a multispectral chunk all bands of the
+                first capture, then all bands of the next capture, ...
+            group_size (int): Number of images per capture.
+
+        Returns:
+            tuple: Kept image paths in their original order, and a dict of excluded image path ->
+            (reason, value) for the first image of every excluded capture.
+        """
+        if not self.enabled:
+            return image_list, {}
+
+        groups = [image_list[index:index + group_size] for index in range(0, len(image_list), group_size)]
+        excluded = {}
+        candidates = [group[0] for group in groups]
+
+        if self.min_altitude is not None:
+            candidates = self._filter_altitude(candidates, excluded)
+        if self.duplicate_distance is not None:
+            candidates = self._filter_duplicates(candidates, excluded)
+        if self.sharpness.get("enabled"):
+            candidates = self._filter_sharpness(candidates, excluded)
+
+        kept = set(candidates)
+        kept_images = [path for group in groups if group[0] in kept for path in group]
+        if excluded:
+            logging.info(f"Pre-filter kept {len(kept)} of {len(groups)} captures")
+        return kept_images, excluded
+
+    def _filter_altitude(self, paths, excluded):
+        """
+        Drops photos below the minimum height above the take-off point. Without a relative altitude
+        in the XMP header, the height is taken above the lowest GPS altitude of the chunk.
+        """
+        altitudes = [self.read(path).get("altitude") for path in paths]
+        ground = min((altitude for altitude in altitudes if altitude is not None), default=None)
+
+        kept = []
+        for path, altitude in zip(paths, altitudes):
+            height = self.read(path).get("relative_altitude")
+            if height is None and altitude is not None:
+                height = altitude - ground
+            if height is not None and height < self.min_altitude:
+                excluded[path] = ("below_min_altitude", round(height, 2))
+            else:
+                kept.append(path)
+        return kept
+
+    def _filter_duplicates(self, paths, excluded):
+        """
+        Drops photos taken within the duplicate distance of the previous kept photo, in capture order.
+        """
+        ordered = sorted(paths, key=lambda path: (self.read(path).get("captured_at") or "", path))
+        kept = []
+        previous = None
+        for path in ordered:
+            metadata = self.read(path)
+            if metadata.get("latitude") is None:
+                kept.append(path)
+                continue
+            if previous is not None:
+                distance = position_distance(previous, metadata)
+                if distance < self.duplicate_distance:
+                    excluded[path] = ("duplicate_position", round(distance, 2))
+                    continue
+            kept.append(path)
+            previous = metadata
+
+        kept = set(kept)
+        return [path for path in paths if path in kept]
+
+    def _filter_sharpness(self, paths, excluded):
+        """
+        Drops photos whose sharpness is below a ratio of the chunk's median sharpness.
+        """
+        if cv2 is None:
+            logging.warning("OpenCV is not installed; skipping the sharpness filter")
+            return paths
+
+        reduction = int(self.sharpness.get("reduction", 8))
+        missing = [path for path in paths if path not in self._scores]
+        if missing:
+            # Spawned workers, so they never inherit the state of a loaded Metashape module
+            with ProcessPoolExecutor(max_workers=self.sharpness.get("workers"),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                for path, score in zip(missing, executor.map(sharpness_score, missing, [reduction] * len(missing),
+                                                             chunksize=16)):
+                    self._scores[path] = score
+
+        scores = [self._scores[path] for path in paths if self._scores[path] is not None]
+        if not scores:
+            return paths
+        threshold = statistics.median(scores) * float(self.sharpness.get("min_ratio", 0.5))
+
+        kept = []
+        for path in paths:
+            score = self._scores[path]
+            if score is not None and score < threshold:
+                excluded[path] = ("blurry", round(score, 2))
+            else:
+                kept.append(path)
+        return kept
+
+def position_distance(first, second):
+    """
+    Computes the distance between two photo positions, using an equirectangular approximation
+    that is exact enough for the few meters between consecutive photos.
+
+    Args:
+        first (dict): Metadata with 'latitude', 'longitude' and optionally 'altitude'.
+        second (dict): Metadata with 'latitude', 'longitude' and optionally 'altitude'.
+
+    Returns:
+        float: Distance in meters.
+    """
+    latitude = math.radians((first["latitude"] + second["latitude"]) / 2)
+    dx = math.radians(second["longitude"] - first["longitude"]) * math.cos(latitude) * EARTH_RADIUS
+    dy = math.radians(second["latitude"] - first["latitude"]) * EARTH_RADIUS
+    dz = (second.get("altitude") or 0.0) - (first.get("altitude") or 0.0)
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+def sharpness_score(path, reduction=8):
+    """
+    Scores the sharpness of an image as the variance of the Laplacian of a downsampled grayscale
+    version. JPEGs are downsampled while decoding, which keeps scoring cheap.
+
+    Args:
+        path (str): Path of the image.
+        reduction (int): Downsampling factor, 2, 4 or 8.
+
+    Returns:
+        float: Sharpness score, higher is sharper; None if the image cannot be decoded.
+    """
+    flags = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4}.get(
+        reduction, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    image = cv2.imread(path, flags)
+    if image is None:
+        return None
+    return float(cv2.Laplacian(image, cv2.CV_64F).var())
+
+def write_report(report_path, chunk_jobs):
+    """
+    Writes the photos excluded by the pre-filter as CSV.
+
+    Args:
+        report_path (str): Path of the CSV file.
+        chunk_jobs (list): ChunkJob of every chunk, with its excluded photos.
+
+    Returns:
+        int: Number of excluded photos.
+    """
+    rows = [{"chunk": job.chunk_name, "path": path, "reason": reason, "value": value}
+            for job in chunk_jobs for path, (reason, value) in sorted(job.excluded.items())]
+    with open(report_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    logging.info(f"Wrote pre-filter report with {len(rows)} excluded photos to {report_path}")
+    return len(rows)
@@ -0,0 +1,165 @@
+import copy
+import fnmatch
+from pipeline.cog import COMPRESSIONS
+
+# Parameters of each chunk processing stage in the standard profile. Enum values are stored by
+# name so they can be recorded in the stage manifest and compared on resume.
+STANDARD_PROFILE = {
+    "align_photos": {
+        "downscale": 1,
+        "reference_preselection": True,
+        "keypoint_limit": 60000,
+        "tiepoint_limit": 15000,
+        "filter_mask": False,
+        "guided_matching": True,
+        "mask_tiepoints": False,
+    },
+    "build_depth_maps": {"downscale": 2, "filter_mode": "MildFiltering"},
+    "build_point_cloud": {},
+    "build_model": {"source_data": "DepthMapsData"},
+    "smooth_model": {"strength": 6},
+    "build_dem": {"source_data": "PointCloudData"},
+    "build_orthomosaic": {"surface_data": "ModelData"},
+    "export_raster": {"tiff_compression": "TiffCompressionLZW", "jpeg_quality": 90, "crs": "EPSG::4326"},
+}
+
+# Built-in profiles, given as overrides of the standard profile
+BUILTIN_PROFILES = {
+    # Coarse alignment and an orthomosaic on a DEM from tie points, without depth maps or a model
+    "preview": {
+        "align_photos": {"downscale": 4, "keypoint_limit": 20000, "tiepoint_limit": 4000, "guided_matching": False},
+        "build_depth_maps": {"downscale": 8},
+        "smooth_model": {"strength": 3},
+        "build_dem": {"source_data": "TiePointsData"},
+        "build_orthomosaic": {"surface_data": "ElevationData"},
+    },
+    "standard": {},
+    "high": {
+        "align_photos": {"keypoint_limit": 80000, "tiepoint_limit": 20000},
+        "build_depth_maps": {"downscale": 1},
+    },
+}
+
+DEFAULT_PROFILE = "standard"
+
+# Allowed type (or values) of every profile parameter
+PROFILE_SCHEMA = {
+    "align_photos": {
+        "downscale": int,
+        "reference_preselection": bool,
+        "keypoint_limit": int,
+        "tiepoint_limit": int,
+        "filter_mask": bool,
+        "guided_matching": bool,
+        "mask_tiepoints": bool,
+    },
+    "build_depth_maps": {
+        "downscale": int,
+        "filter_mode": ["NoFiltering", "MildFiltering", "ModerateFiltering", "AggressiveFiltering"],
+    },
+    "build_point_cloud": {},
+    "build_model": {"source_data": ["DepthMapsData", "PointCloudData", "TiePointsData"]},
+    "smooth_model": {"strength": (int, float)},
+    "build_dem": {"source_data": ["PointCloudData", "TiePointsData", "ModelData"]},
+    "build_orthomosaic": {"surface_data": ["ModelData", "ElevationData"]},
+    "export_raster": {
+        "tiff_compression": ["TiffCompressionNone", "TiffCompressionLZW", "TiffCompressionJPEG",
+                             "TiffCompressionPackbits", "TiffCompressionDeflate"],
+        "jpeg_quality": int,
+        # An EPSG definition, 'native' for the CRS of the chunk or 'utm' for its UTM zone
+        "crs": str,
+        # Cloud-Optimized GeoTIFF export through GDAL
+        "cog": bool,
+        "compression": COMPRESSIONS,
+        "predictor": [1, 2, 3],
+        "block_size": int,
+        "split_blocks": int,
+        "workers": int,
+        "validate": bool,
+    },
+}
+
+def build_profiles(overrides=None):
+    """
+    Builds the stage parameters of every profile from the built-in profiles and the
+    'profiles' section of the configuration. Every profile is based on the standard
+    profile, so a profile only needs to list the parameters it changes.
+
+    Args:
+        overrides (dict): Profile name -> stage -> parameter overrides from the configuration.
+
+    Returns:
+        dict: Profile name -> complete stage parameters.
+    """
+    profiles = {}
+    for name in set(BUILTIN_PROFILES) | set(overrides or {}):
+        params = copy.deepcopy(STANDARD_PROFILE)
+        for layer in (BUILTIN_PROFILES.get(name, {}), (overrides or {}).get(name) or {}):
+            for stage, stage_params in layer.items():
+                params[stage].update(stage_params)
+        profiles[name] = params
+    return profiles
+
+def select_profile(config, folder_name, channel):
+    """
+    Selects the profile of a chunk. A channel entry in 'channel_profiles' wins over a matching
+    glob pattern in 'folder_profiles', which wins over the default 'profile'.
+
+    Args:
+        config (dict): Configuration dictionary.
+        folder_name (str): Name of the flight folder.
+        channel (str): Channel of the chunk, e.g. 'RGB' or 'MS'.
+
+    Returns:
+        str: Name of the profile.
+    """
+    channel_profiles = config.get("channel_profiles") or {}
+    if channel in channel_profiles:
+        return channel_profiles[channel]
+
+    for pattern, profile in (config.get("folder_profiles") or {}).items():
+        if fnmatch.fnmatch(folder_name, pattern):
+            return profile
+
+    return config.get("profile", DEFAULT_PROFILE)
+
+def validate_profiles(config):
+    """
+    Validates the profile settings of a configuration against PROFILE_SCHEMA.
+
+    Args:
+        config (dict): Configuration dictionary.
+
+    Raises:
+        ValueError: If a profile has an unknown stage or parameter, a value of the wrong type,
+            or a profile is selected that does not exist.
+    """
+    overrides = config.get("profiles") or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("'profiles' must be a mapping of profile names to stage parameters.")
+
+    for name, profile in overrides.items():
+        for stage, stage_params in (profile or {}).items():
+            if stage not in PROFILE_SCHEMA:
+                raise ValueError(f"Unknown stage '{stage}' in profile '{name}'.")
+            for param, value in (stage_params or {}).items():
+                allowed = PROFILE_SCHEMA[stage].get(param)
+                if allowed is None:
+                    raise ValueError(f"Unknown parameter '{stage}.{param}' in profile '{name}'.")
+                if isinstance(allowed, list):
+                    if value not in allowed:
+                        raise ValueError(f"Invalid value {value!r} for '{stage}.{param}' in profile '{name}'. "
+                                         f"Use one of {allowed}.")
+                # bool is a subclass of int, so it is rejected explicitly where a number is expected
+                elif not isinstance(value, allowed) or (isinstance(value, bool) and allowed is not bool):
+                    raise ValueError(f"Invalid value {value!r} for '{stage}.{param}' in profile '{name}'.")
+
+    known = set(BUILTIN_PROFILES) | set(overrides)
+    selected = [config.get("profile", DEFAULT_PROFILE)]
+    selected += list((config.get("folder_profiles") or {}).values())
+    selected += list((config.get("channel_profiles") or {}).values())
+    if (config.get("preview") or {}).get("enabled"):
+        selected.append(config["preview"].get("profile", "preview"))
+    for profile in selected:
+        if profile not in known:
+            raise ValueError(f"Unknown profile '{profile}'. Available profiles: {sorted(known)}.")
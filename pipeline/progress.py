@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# Seconds per image of every stage, until measured in a previous run
+DEFAULT_SECONDS_PER_IMAGE = {
+    "align_photos": 0.5,
+    "build_depth_maps": 2.0,
+    "build_point_cloud": 1.0,
+    "build_model": 0.5,
+    "smooth_model": 0.05,
+    "build_dem": 0.1,
+    "build_orthomosaic": 0.5,
+    "export_raster": 0.2,
+    "export_dem": 0.05,
+    "export_point_cloud": 0.1,
+}
+
+# Weight of the latest run in the learned throughput
+LEARNING_RATE = 0.5
+
+class ProgressTracker:
+    """
+    Follows the progress of the stages through Metashape's progress callbacks and publishes
+    it, with an estimated time to completion of the stage and of the whole folder, in a JSON
+    status file that dashboards or the operator can poll.
+
+    Remaining time is estimated from the progress of the running stage and, for stages still to
+    run, from the seconds per image measured in previous runs. The status file is rewritten at
+    most every 'interval' seconds and when a stage starts or ends. Worker processes write their
+    own status file, named with their process ID, and remove it when they finish a chunk. The
+    throughput learned meanwhile is kept in memory and merged into the shared history file under
+    a file lock when a folder or, in worker processes, a chunk is finished.
+
+    Attributes:
+        interval (float): Minimum seconds between two status file updates.
+        status_file (str): JSON file with the current status.
+        history_file (str): JSON file with the seconds per image learned from previous runs.
+        worker (bool): Whether the tracker runs in a worker process.
+        rates (dict): Seconds per image, per '<profile>/<stage>'.
+        folder (str): Folder being processed.
+        chunks (dict): Per chunk the 'profile', 'images', 'share' of the images a stage processes,
+            'remaining' and 'done' stages and whether it 'failed'.
+        current (dict): Running stage: 'chunk', 'stage', 'started' (monotonic time) and 'progress' in percent.
+    """
+    def __init__(self, tmp_folder, config=None):
+        """
+        Initializes the tracker from the optional 'progress' section of the configuration.
+
+        Args:
+            tmp_folder (str): Temporary folder holding the status and history files by default.
+            config (dict): 'progress' section with 'interval', 'status_file' and 'history_file'.
+        """
+        config = config or {}
+        self.interval = float(config.get("interval", 5))
+        self.status_file = config.get("status_file", os.path.join(tmp_folder, "status.json"))
+        self.worker = multiprocessing.parent_process() is not None
+        if self.worker:
+            root, extension = os.path.splitext(self.status_file)
+            self.status_file = f"{root}_{os.getpid()}{extension}"
+        self.history_file = config.get("history_file", os.path.join(tmp_folder, "progress_history.json"))
+        self.rates = {}
+        self.folder = None
+        self.chunks = {}
+        self.current = None
+        self._last_write = 0.0
+        # (key, seconds per image) measured since the history was last saved
+        self._learned = []
+        self.rates = self.read_history()
+
+    def read_history(self):
+        """
+        Reads the seconds per image learned so far.
+
+        Returns:
+            dict: Seconds per image, per '<profile>/<stage>'; empty if there is no readable history.
+        """
+        if not os.path.exists(self.history_file):
+            return {}
+        try:
+            with open(self.history_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable progress history {self.history_file}: {e}")
+            return {}
+
+    def rate(self, profile, stage):
+        """
+        Returns the seconds per image of a stage, as learned for the profile.
+
+        Args:
+            profile (str): Name of the quality profile.
+            stage (str): Name of the stage.
+
+        Returns:
+            float: Seconds per image.
+        """
+        return self.rates.get(f"{profile}/{stage}", DEFAULT_SECONDS_PER_IMAGE.get(stage, 0.0))
+
+    def start_folder(self, folder_path, planned):
+        """
+        Starts tracking a folder.
+
+        Args:
+            folder_path (str): Path of the folder.
+            planned (list): (ChunkJob, stages) tuples of every chunk of the folder.
+        """
+        self.folder = folder_path
+        self.chunks = {}
+        self.current = None
+        # Worker processes may have learned since the history was read
+        self.rates.update(self.read_history())
+        for job, stages in planned:
+            self.plan(job, stages)
+        self.write(force=True)
+
+    def plan(self, job, stages):
+        """
+        Registers the stages a chunk runs, unless the chunk is known already.
+
+        Args:
+            job (ChunkJob): The chunk.
+            stages (list): Stages in execution order.
+        """
+        if job.chunk_name not in self.chunks:
+            self.chunks[job.chunk_name] = {"profile": job.profile, "images": len(job.image_list), "share": 1.0,
+                                           "remaining": list(stages), "done": [], "failed": False}
+
+    def split(self, chunk_name, tile_names):
+        """
+        Moves the remaining stages of a chunk to its tiles, each processing a share of the images.
+
+        Args:
+            chunk_name (str): Name of the tiled chunk.
+            tile_names (list): Names of the tile chunks.
+        """
+        chunk = self.chunks.get(chunk_name)
+        if chunk is None or not tile_names:
+            return
+        for tile_name in tile_names:
+            self.chunks.setdefault(tile_name, dict(chunk, share=chunk["share"] / len(tile_names),
+                                                   remaining=list(chunk["remaining"]), done=[]))
+        chunk["remaining"] = []
+
+    @contextmanager
+    def track(self, chunk_name, stage):
+        """
+        Tracks the stage executed inside the context.
+
+        Args:
+            chunk_name (str): Name of the chunk.
+            stage (str): Name of the stage.
+
+        Yields:
+            callable: Progress callback taking the progress of the stage in percent.
+        """
+        self.current = {"chunk": chunk_name, "stage": stage, "started": time.monotonic(), "progress": 0.0}
+        self.write(force=True)
+        try:
+            yield self.update
+        except Exception:
+            if chunk_name in self.chunks:
+                self.chunks[chunk_name].update(remaining=[], failed=True)
+            raise
+        else:
+            self.complete(chunk_name, stage, time.monotonic() - self.current["started"])
+        finally:
+            self.current = None
+            self.write(force=True)
+
+    def restart(self):
+        """
+        Restarts the timing and progress of the running stage, e.g. before it is retried, so only
+        the successful attempt is learned.
+        """
+        if self.current is not None:
+            self.current.update(started=time.monotonic(), progress=0.0)
+            self.write(force=True)
+
+    def update(self, progress):
+        """
+        Progress callback of the running stage; rewrites the status file if it is due.
+
+        Args:
+            progress (float): Progress of the stage in percent.
+        """
+        if self.current is not None:
+            self.current["progress"] = min(max(float(progress), 0.0), 100.0)
+            self.write()
+
+    def complete(self, chunk_name, stage, seconds=None):
+        """
+        Marks a stage as done and learns its throughput if it ran.
+
+        Args:
+            chunk_name (str): Name of the chunk.
+            stage (str): Name of the stage.
+            seconds (float): Wall time of the stage, or None if it was skipped.
+        """
+        chunk = self.chunks.get(chunk_name)
+        if chunk is None or stage not in chunk["remaining"]:
+            return
+        chunk["remaining"].remove(stage)
+        chunk["done"].append(stage)
+
+        images = chunk["images"] * chunk["share"]
+        if seconds is None or not images:
+            return
+        key = f"{chunk['profile']}/{stage}"
+        measured = seconds / images
+        self._learned.append((key, measured))
+        learn(self.rates, key, measured)
+
+    def save_history(self):
+        """
+        Merges the throughput learned since the last save into the history file.
+        """
+        if not self._learned:
+            return
+        try:
+            with history_lock(self.history_file):
+                # Worker processes learn concurrently, so start from the rates they saved meanwhile
+                rates = self.read_history()
+                for key, measured in self._learned:
+                    learn(rates, key, measured)
+                tmp_path = f"{self.history_file}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as file:
+                    json.dump(rates, file, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.history_file)
+            self.rates.update(rates)
+            self._learned = []
+        except OSError as e:
+            logging.warning(f"Could not update progress history {self.history_file}: {e}")
+
+    def close(self):
+        """
+        Saves the learned throughput and, in a worker process, removes its status file, which is
+        written again once the worker starts its next chunk.
+        """
+        self.save_history()
+        if self.worker:
+            try:
+                os.remove(self.status_file)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Could not remove status file {self.status_file}: {e}")
+
+    def estimate(self, chunk_name, stage):
+        """
+        Estimates the wall time of a stage of a chunk from the learned throughput.
+
+        Args:
+            chunk_name (str): Name of the chunk.
+            stage (str): Name of the stage.
+
+        Returns:
+            float: Estimated seconds.
+        """
+        chunk = self.chunks[chunk_name]
+        return chunk["images"] * chunk["share"] * self.rate(chunk["profile"], stage)
+
+    def stage_eta(self):
+        """
+        Estimates the remaining seconds of the running stage, from its progress so far or, early
+        in the stage, from the learned throughput.
+
+        Returns:
+            float: Remaining seconds, or None if no stage is running.
+        """
+        if self.current is None:
+            return None
+        elapsed = time.monotonic() - self.current["started"]
+        progress = self.current["progress"]
+        if progress >= 1.0:
+            return elapsed * (100.0 - progress) / progress
+        if self.current["chunk"] in self.chunks:
+            return max(self.estimate(self.current["chunk"], self.current["stage"]) - elapsed, 0.0)
+        return None
+
+    def eta(self):
+        """
+        Estimates the remaining seconds of the folder: the running stage plus all stages still to run.
+
+        Returns:
+            float: Remaining seconds.
+        """
+        remaining = self.stage_eta() or 0.0
+        for chunk_name, chunk in self.chunks.items():
+            for stage in chunk["remaining"]:
+                if self.current is None or (chunk_name, stage) != (self.current["chunk"], self.current["stage"]):
+                    remaining += self.estimate(chunk_name, stage)
+        return remaining
+
+    def status(self):
+        """
+        Builds the status published in the status file.
+
+        Returns:
+            dict: Folder, running chunk and stage with progress and ETA, overall ETA and the state of every chunk.
+        """
+        eta = self.eta()
+        stage_eta = self.stage_eta()
+        return {
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "folder": self.folder,
+            "chunk": self.current["chunk"] if self.current else None,
+            "stage": self.current["stage"] if self.current else None,
+            "stage_progress": round(self.current["progress"], 1) if self.current else None,
+            "stage_eta_seconds": round(stage_eta) if stage_eta is not None else None,
+            "eta_seconds": round(eta),
+            "eta_at": (datetime.now() + timedelta(seconds=eta)).isoformat(timespec="seconds"),
+            "chunks": {name: {"done": chunk["done"], "remaining": chunk["remaining"], "failed": chunk["failed"]}
+                       for name, chunk in self.chunks.items()},
+        }
+
+    def write(self, force=False):
+        """
+        Rewrites the status file atomically, at most every 'interval' seconds unless forced.
+
+        Args:
+            force (bool): Write even if the last update is recent.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        try:
+            tmp_path = f"{self.status_file}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(self.status(), file, indent=2)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            logging.warning(f"Could not write status file {self.status_file}: {e}")
+
+def learn(rates, key, measured):
+    """
+    Blends a measured throughput into the learned seconds per image.
+
+    Args:
+        rates (dict): Seconds per image, per '<profile>/<stage>'; updated in place.
+        key (str): '<profile>/<stage>' that was measured.
+        measured (float): Measured seconds per image.
+    """
+    previous = rates.get(key)
+    rates[key] = measured if previous is None else (1 - LEARNING_RATE) * previous + LEARNING_RATE * measured
+
+@contextmanager
+def history_lock(path):
+    """
+    Holds an exclusive lock on '<path>.lock' inside the context, so processes updating the same
+    file do not overwrite each other's changes. Without fcntl (on Windows) no lock is taken.
+
+    Args:
+        path (str): Path of the file to update.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
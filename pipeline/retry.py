@@ -0,0 +1,169 @@
+import os
+import json
+from datetime import datetime
+
+# Message fragments of Metashape, driver and OS errors per failure class, checked in this order,
+# so a CUDA allocation failure counts as out of memory rather than as a GPU error
+FAILURE_PATTERNS = [
+    ("oom", ["bad allocation", "bad_alloc", "out of memory", "not enough memory", "memory allocation",
+             "cl_mem_object_allocation_failure", "cannot allocate"]),
+    ("gpu", ["cuda", "opencl", "gpu", "kernel failed", "device lost", "device removed"]),
+    ("io", ["can't open", "cannot open", "can't read", "can't write", "no such file", "input/output error",
+            "i/o error", "no space left", "stale file handle", "permission denied", "connection", "timed out"]),
+]
+
+# Retries per failure class; data errors fail the same way again
+DEFAULT_ATTEMPTS = {"oom": 2, "gpu": 1, "io": 2, "data": 0}
+
+def classify(error):
+    """
+    Classifies a stage failure by its exception type and message.
+
+    Args:
+        error (Exception): The exception a stage raised.
+
+    Returns:
+        str: 'oom' (out of memory), 'gpu' (GPU or driver error), 'io' (file or network error)
+        or 'data' (anything else, e.g. too few matches to align).
+    """
+    if isinstance(error, MemoryError):
+        return "oom"
+    message = str(error).lower()
+    for kind, fragments in FAILURE_PATTERNS:
+        if any(fragment in message for fragment in fragments):
+            return kind
+    if isinstance(error, OSError):
+        return "io"
+    return "data"
+
+class StageFailure(RuntimeError):
+    """
+    Raised when a stage failed and was not (or no longer) retried.
+
+    Attributes:
+        stage (str): Name of the stage.
+        kind (str): Failure class, see classify.
+        attempts (int): Number of attempts made.
+    """
+    def __init__(self, message, stage=None, kind="data", attempts=1):
+        # Only the message is passed to the base class, so the exception pickles across worker processes
+        super().__init__(message)
+        self.stage = stage
+        self.kind = kind
+        self.attempts = attempts
+
+class RetryPolicy:
+    """
+    Decides whether and how a failed stage is retried, by failure class.
+
+    I/O errors are retried after a delay with the same settings. Out-of-memory errors are
+    retried with the downscale of the stage doubled up to 'max_downscale', then on the CPU
+    only, which has more memory than a GPU. GPU errors are retried on the CPU only. Data errors
+    are not retried. Chunks whose dense stages still run out of memory are processed in tiles
+    if 'tile_fallback' is set.
+
+    Attributes:
+        enabled (bool): Whether failed stages are retried at all.
+        attempts (dict): Retries per failure class.
+        delay (float): Seconds to wait before a retry with the same settings.
+        max_downscale (int): Highest downscale an out-of-memory retry may use.
+        cpu_fallback (bool): Whether stages failing on the GPU are retried on the CPU only.
+        tile_fallback (bool): Whether untiled chunks running out of memory are processed in tiles.
+    """
+    def __init__(self, config=None):
+        """
+        Initializes the policy from the optional 'retry' section of the configuration.
+
+        Args:
+            config (dict): 'retry' section with 'enabled', 'attempts', 'delay', 'max_downscale',
+                'cpu_fallback' and 'tile_fallback'.
+        """
+        config = config or {}
+        self.enabled = bool(config.get("enabled", False))
+        self.attempts = dict(DEFAULT_ATTEMPTS, **(config.get("attempts") or {}))
+        self.delay = float(config.get("delay", 10))
+        self.max_downscale = int(config.get("max_downscale", 8))
+        self.cpu_fallback = bool(config.get("cpu_fallback", True))
+        self.tile_fallback = bool(config.get("tile_fallback", True))
+
+    def next_action(self, kind, attempt, params, on_gpu):
+        """
+        Chooses how the next attempt of a failed stage runs.
+
+        Args:
+            kind (str): Failure class of the last attempt.
+            attempt (int): Number of the failed attempt, starting at 1.
+            params (dict): Parameters the stage ran with.
+            on_gpu (bool): Whether the stage ran with GPUs enabled.
+
+        Returns:
+            tuple: ('retry', None) to run the stage again, ('downscale', value) to run it with a higher
+            downscale, ('cpu', None) to run it on the CPU only, or None to give up.
+        """
+        if not self.enabled or attempt > self.attempts.get(kind, 0):
+            return None
+        if kind == "oom":
+            downscale = params.get("downscale")
+            if downscale and downscale * 2 <= self.max_downscale:
+                return ("downscale", downscale * 2)
+            if on_gpu and self.cpu_fallback:
+                return ("cpu", None)
+            return None
+        if kind == "gpu" and on_gpu and self.cpu_fallback:
+            return ("cpu", None)
+        return ("retry", None)
+
+def write_summary(path, folder_path, records, errors, missing_outputs):
+    """
+    Writes the failures of a folder as JSON: the chunks that failed with the outputs they are
+    missing, and every failed stage attempt with the retry that followed. An existing summary is
+    removed if nothing failed.
+
+    Args:
+        path (str): Path of the summary.
+        folder_path (str): Path of the processed folder.
+        records (list): Stage measurements of the run; failed attempts carry 'failure' and 'error'.
+        errors (dict): Error message per failed chunk.
+        missing_outputs (dict): Requested outputs each failed chunk is missing.
+
+    Returns:
+        dict: The summary, or None if nothing failed.
+    """
+    attempts = []
+    for index, record in enumerate(records):
+        if "failure" not in record:
+            continue
+        # A later successful run of the same stage, or tiles of a chunk that did not fail, recovered
+        recovered = any(later["chunk"] == record["chunk"] and later["stage"] == record["stage"]
+                        and later["status"] == "ok" for later in records[index + 1:])
+        recovered = recovered or (record.get("retry") == "tiles" and record["chunk"] not in errors)
+        attempts.append({key: record.get(key) for key in ("chunk", "stage", "started_at", "attempt", "failure",
+                                                           "error", "retry", "gpu_mask")})
+        attempts[-1]["recovered"] = recovered
+
+    if not attempts and not errors:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    chunks = {}
+    for chunk_name, error in errors.items():
+        # Failures of tiles and updates are recorded under their own chunk labels
+        failed = [attempt for attempt in attempts if attempt["chunk"] == chunk_name
+                  or attempt["chunk"].startswith((f"{chunk_name}_tile", f"{chunk_name}_update"))]
+        chunks[chunk_name] = {"error": error,
+                              "failure": failed[-1]["failure"] if failed else classify(RuntimeError(error)),
+                              "stage": failed[-1]["stage"] if failed else None,
+                              "missing_outputs": list(missing_outputs.get(chunk_name, []))}
+
+    summary = {
+        "folder": folder_path,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "failed_chunks": chunks,
+        "attempts": attempts,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(summary, file, indent=2)
+    os.replace(tmp_path, path)
+    return summary
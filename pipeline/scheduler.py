@@ -0,0 +1,188 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pipeline.profiles import DEFAULT_PROFILE
+
+# Processor of the current worker process, created once by the pool initializer
+_worker_processor = None
+
+class ChunkJob:
+    """
+    A chunk waiting to be processed.
+
+    Attributes:
+        chunk_name (str): Name of the chunk.
+        image_list (list): List of image paths of the chunk.
+        bands (list): Band names if the chunk holds all bands of a multispectral rig, otherwise None.
+        profile (str): Name of the quality profile the chunk is processed with.
+        output_tag (str): Tag added to the exported file names, e.g. '_preview'.
+        input_bytes (int): Total size of the images, used to estimate the temporary disk space.
+        excluded (dict): Photos removed by the pre-filter, image path -> (reason, value).
+        staged (dict): Local copy of every staged image, image path -> staged path.
+        members (list): Photo subfolders the images come from, if the chunk was regrouped.
+    """
+    def __init__(self, chunk_name, image_list, bands=None, profile=DEFAULT_PROFILE, output_tag="", input_bytes=0,
+                 excluded=None, staged=None, members=None):
+        """
+        Initializes a chunk job.
+
+        Args:
+            chunk_name (str): Name of the chunk.
+            image_list (list): List of image paths of the chunk.
+            bands (list): Band names if the chunk holds all bands of a multispectral rig.
+            profile (str): Name of the quality profile.
+            output_tag (str): Tag added to the exported file names.
+            input_bytes (int): Total size of the images.
+            excluded (dict): Photos removed by the pre-filter.
+            staged (dict): Local copies of the images.
+            members (list): Photo subfolders the images come from.
+        """
+        self.chunk_name = chunk_name
+        self.image_list = image_list
+        self.bands = bands
+        self.profile = profile
+        self.output_tag = output_tag
+        self.input_bytes = input_bytes
+        self.excluded = excluded or {}
+        self.staged = staged or {}
+        self.members = members
+
+class ChunkScheduler:
+    """
+    Runs independent chunks in a pool of worker processes, each pinned to its own GPU
+    or running CPU-only.
+
+    Every chunk gets its own project document and stage manifest inside the temporary
+    project folder, so workers never share a project file or its lockfile.
+
+    Workers receive whole chunks, so a CPU-only worker also runs the stages that are much faster
+    on a GPU (matching, depth maps). CPU-only slots are therefore off by default and only pay off
+    when chunks queue up behind busy GPUs.
+
+    Attributes:
+        config (dict): Configuration dictionary passed on to the workers.
+        log_file (str): Path to the log file the workers write to.
+        gpu_devices (list): GPU indices, one worker slot per GPU.
+        cpu_workers (int): Number of additional CPU-only worker slots, each running whole chunks; 0 by default.
+        max_workers (int): Maximum number of chunks processed at the same time.
+    """
+    def __init__(self, config, log_file):
+        """
+        Initializes the scheduler from the optional 'parallel' section of the configuration.
+
+        Args:
+            config (dict): Configuration dictionary.
+            log_file (str): Path to the log file.
+        """
+        parallel = config.get("parallel") or {}
+        self.config = config
+        self.log_file = log_file
+        self.gpu_devices = [str(device) for device in parallel.get("gpu_devices", [])]
+        self.cpu_workers = int(parallel.get("cpu_workers", 0))
+        self.max_workers = min(int(parallel.get("max_workers", 1)), len(self.worker_slots()))
+
+    @property
+    def enabled(self):
+        """
+        bool: Whether chunks are distributed over more than one worker.
+        """
+        return self.max_workers > 1
+
+    def worker_slots(self):
+        """
+        Lists the device assignment of each worker slot.
+
+        Returns:
+            list: GPU options ('0', '1', ...) for GPU workers followed by 'cpu' for CPU-only workers.
+        """
+        return self.gpu_devices + ["cpu"] * self.cpu_workers
+
+    def run(self, tmp_project_folder, chunk_jobs, export_folder, recorder):
+        """
+        Processes chunks in parallel, one project document per chunk.
+
+        Args:
+            tmp_project_folder (str): Folder holding the per-chunk projects.
+            chunk_jobs (list): ChunkJob of every chunk.
+            export_folder (str): The folder where the orthomosaics will be saved.
+            recorder (StageRecorder): Receives the stage measurements of all workers.
+
+        Returns:
+            dict: Error message per failed chunk name.
+        """
+        # Spawned workers start with a fresh Metashape instance and device environment
+        context = multiprocessing.get_context("spawn")
+        slots = context.Queue()
+        for slot in self.worker_slots()[:self.max_workers]:
+            slots.put(slot)
+
+        logging.info(f"Processing {len(chunk_jobs)} chunks with {self.max_workers} workers")
+        errors = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.config, self.log_file, slots)) as executor:
+            futures = {}
+            for job in chunk_jobs:
+                project_path = os.path.join(tmp_project_folder, f"{job.chunk_name}.psx")
+                future = executor.submit(run_chunk_job, project_path, job, export_folder)
+                futures[future] = job.chunk_name
+
+            for future in as_completed(futures):
+                chunk_name = futures[future]
+                try:
+                    recorder.records.extend(future.result())
+                    logging.info(f"Finished chunk: {chunk_name}")
+                except Exception as e:
+                    logging.error(f"Error processing chunk {chunk_name}: {str(e)}")
+                    errors[chunk_name] = str(e)
+                    # Measurements of the stages that ran, including the failed attempts
+                    recorder.records.extend(getattr(e, "records", []))
+
+        return errors
+
+def _init_worker(config, log_file, slots):
+    """
+    Initializes a worker process with the next free device slot.
+
+    Args:
+        config (dict): Configuration dictionary.
+        log_file (str): Path to the log file.
+        slots (multiprocessing.Queue): Queue of unassigned device slots.
+    """
+    global _worker_processor
+    # Imported here to avoid a circular import with the processor module
+    from pipeline.metashape_processor import MetashapeProcessor
+
+    worker_config = dict(config, gpu_option=slots.get())
+    _worker_processor = MetashapeProcessor(worker_config, log_file)
+
+def run_chunk_job(project_path, job, export_folder):
+    """
+    Processes a single chunk in its own project inside a worker process.
+
+    Args:
+        project_path (str): Path to the chunk's own project file.
+        job (ChunkJob): The chunk to process.
+        export_folder (str): The folder where the orthomosaic will be saved.
+
+    Returns:
+        list: Stage measurements of the chunk.
+    """
+    from pipeline.metashape_processor import MetashapeProject
+    from pipeline.checkpoint import StageManifest
+    from pipeline.instrumentation import StageRecorder
+
+    project = MetashapeProject(project_path, _worker_processor.save_policy)
+    manifest = StageManifest(project_path.replace(".psx", "_stages.json"))
+    recorder = StageRecorder(os.path.dirname(project_path))
+    try:
+        _worker_processor.process_chunk(project, manifest, job, export_folder, recorder)
+    except Exception as e:
+        # Attributes of an exception are pickled with it, so the parent still gets the measurements
+        e.records = recorder.records
+        raise
+    finally:
+        _worker_processor.progress.close()
+    logging.info(f"{len(project.save_timings)} saves of {project_path} took {sum(project.save_timings):.2f} s in total")
+    return recorder.records
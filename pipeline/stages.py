@@ -0,0 +1,143 @@
+# Processing stages of a chunk in execution order. Each stage lists the products it consumes
+# and produces; 'georeferenced' stages need an aligned chunk with a transform and 'export'
+# stages write files into the export folder.
+STAGES = {
+    "align_photos": {"inputs": ["photos"], "outputs": ["tie_points"]},
+    "build_depth_maps": {"inputs": ["tie_points"], "outputs": ["depth_maps"]},
+    "build_model": {"inputs": ["depth_maps"], "outputs": ["model"]},
+    "build_point_cloud": {"inputs": ["depth_maps"], "outputs": ["point_cloud"], "georeferenced": True},
+    "smooth_model": {"inputs": ["model"], "outputs": ["smoothed_model"], "georeferenced": True},
+    "build_dem": {"inputs": ["point_cloud"], "outputs": ["dem"], "georeferenced": True},
+    "build_orthomosaic": {"inputs": ["smoothed_model"], "outputs": ["orthomosaic"], "georeferenced": True},
+    "export_raster": {"inputs": ["orthomosaic"], "outputs": ["orthomosaic_file"], "export": True},
+    "export_dem": {"inputs": ["dem"], "outputs": ["dem_file"], "export": True},
+    "export_point_cloud": {"inputs": ["point_cloud"], "outputs": ["point_cloud_file"], "export": True},
+}
+
+# Products consumed by stages whose data source is chosen in the profile
+SOURCE_PRODUCTS = {
+    "DepthMapsData": "depth_maps",
+    "PointCloudData": "point_cloud",
+    "TiePointsData": "tie_points",
+    "ModelData": "smoothed_model",
+    "ElevationData": "dem",
+}
+
+# Outputs that can be requested in the 'outputs' config option, and the stage writing each
+OUTPUT_STAGES = {
+    "orthomosaic": "export_raster",
+    "dem": "export_dem",
+    "point_cloud": "export_point_cloud",
+}
+
+DEFAULT_OUTPUTS = ["orthomosaic"]
+
+# Stage producing each product
+PRODUCERS = {product: stage for stage, spec in STAGES.items() for product in spec["outputs"]}
+
+# Products stored in the same data object of the chunk as another product
+PRODUCT_DATA = {"smoothed_model": "model"}
+
+# Intermediate products removed from the project once no later stage needs them, per
+# 'retention' option. Tie points are always kept, since they hold the alignment.
+RETENTION_POLICIES = {
+    "full": [],
+    "project": ["depth_maps"],
+    "ortho": ["depth_maps", "point_cloud", "model", "dem", "orthomosaic"],
+}
+
+DEFAULT_RETENTION = "full"
+
+def stage_inputs(stage, stage_params):
+    """
+    Determines the products a stage consumes with the given profile.
+
+    Args:
+        stage (str): Name of the stage.
+        stage_params (dict): Parameters of each processing stage.
+
+    Returns:
+        list: Names of the consumed products.
+    """
+    params = stage_params.get(stage, {})
+    if stage in ("build_model", "build_dem"):
+        return [SOURCE_PRODUCTS[params["source_data"]]]
+    if stage == "build_orthomosaic":
+        return [SOURCE_PRODUCTS[params["surface_data"]]]
+    return STAGES[stage]["inputs"]
+
+def plan_stages(stage_params, outputs=None):
+    """
+    Selects the stages needed for the requested outputs by walking the stage graph backwards
+    from the export stages.
+
+    Args:
+        stage_params (dict): Parameters of each processing stage.
+        outputs (list): Requested outputs, see OUTPUT_STAGES. Defaults to DEFAULT_OUTPUTS.
+
+    Returns:
+        tuple: Stages to run in execution order, and the pruned stages.
+    """
+    required = set()
+    queue = [OUTPUT_STAGES[output] for output in outputs or DEFAULT_OUTPUTS]
+    while queue:
+        stage = queue.pop()
+        if stage in required:
+            continue
+        required.add(stage)
+        queue.extend(PRODUCERS[product] for product in stage_inputs(stage, stage_params) if product in PRODUCERS)
+
+    planned = [stage for stage in STAGES if stage in required]
+    pruned = [stage for stage in STAGES if stage not in required]
+    return planned, pruned
+
+def release_points(stage_params, planned, products):
+    """
+    Determines after which stage each product is no longer needed by the planned stages.
+
+    Args:
+        stage_params (dict): Parameters of each processing stage.
+        planned (list): Stages to run in execution order.
+        products (list): Products that may be released, see RETENTION_POLICIES.
+
+    Returns:
+        dict: Stage -> products that can be removed once the stage finished.
+    """
+    last_use = {}
+    for stage in planned:
+        for product in stage_inputs(stage, stage_params):
+            last_use[PRODUCT_DATA.get(product, product)] = stage
+
+    releases = {}
+    for product in products:
+        if product in last_use:
+            releases.setdefault(last_use[product], []).append(product)
+    return releases
+
+def validate_outputs(config):
+    """
+    Validates the 'outputs' option of a configuration.
+
+    Args:
+        config (dict): Configuration dictionary.
+
+    Raises:
+        ValueError: If an unknown output is requested.
+    """
+    for output in config.get("outputs") or []:
+        if output not in OUTPUT_STAGES:
+            raise ValueError(f"Unknown output '{output}'. Use any of {sorted(OUTPUT_STAGES)}.")
+
+def validate_retention(config):
+    """
+    Validates the 'retention' option of a configuration.
+
+    Args:
+        config (dict): Configuration dictionary.
+
+    Raises:
+        ValueError: If the retention policy is unknown.
+    """
+    retention = config.get("retention", DEFAULT_RETENTION)
+    if retention not in RETENTION_POLICIES:
+        raise ValueError(f"Unknown retention policy '{retention}'. Use one of {sorted(RETENTION_POLICIES)}.")
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pipeline.transfer import TransferEngine, same_filesystem
+from pipeline.instrumentation import directory_size
+from pipeline.utils import format_bytes, campaign_name
+
+INDEX_FILE = "cache_index.json"
+
+class ImageStager:
+    """
+    Copies the images of a folder from the network mount to the local temporary disk before the
+    folder is processed, so Metashape reads them locally in every stage and for every channel.
+    With pipelining, the next folder is staged while the current one is processed.
+
+    Staged images live in '<folder>/<campaign>/<path below the flight folder>', where the campaign
+    is the flight folder's name without its '_unprocessed' or '_processed' suffix, so the copies
+    are still found after the folder is renamed, e.g. by an incremental update. A folder is
+    only staged if its images fit into the free space of the temporary folder next to the space
+    reserved for processing; otherwise its images are read from the network as before.
+
+    Without a size budget the copies of a folder are removed once the folder is finished. With
+    'max_gb' set, the staging folder is kept as a cache across folders, passes and runs: copies
+    whose source is unchanged are reused, and the least recently used copies of released folders
+    are evicted to stay within the budget. Hits, misses and the bytes not read again from the
+    network are logged.
+
+    Attributes:
+        enabled (bool): Whether images are staged at all.
+        folder (str): Folder holding the staged images.
+        workers (int): Number of images copied concurrently.
+        max_bytes (int): Size budget of the cache, or 0 to remove the copies of finished folders.
+        planner (DiskPlanner): Checks the free space before a folder is staged.
+        engine (TransferEngine): Copies the images, comparing sizes only.
+        index_file (str): JSON file with the source size, mtime and last use of every copy.
+        entries (dict): Index entries per staged path relative to the staging folder.
+        stats (dict): 'hits', 'misses', 'bytes_saved', 'bytes_copied' and 'evicted' since start.
+    """
+    def __init__(self, tmp_folder, config=None, planner=None):
+        """
+        Initializes the stager from the optional 'staging' section of the configuration.
+
+        Args:
+            tmp_folder (str): Temporary folder holding the staging folder by default.
+            config (dict): 'staging' section with 'enabled', 'folder', 'workers' and 'max_gb'.
+            planner (DiskPlanner): Checks the free space before a folder is staged; staged unchecked if None.
+        """
+        config = config or {}
+        self.enabled = bool(config.get("enabled", False))
+        self.folder = config.get("folder", os.path.join(tmp_folder, "staging"))
+        self.workers = int(config.get("workers", 8))
+        self.max_bytes = int(float(config.get("max_gb", 0)) * 1024 ** 3)
+        self.planner = planner
+        self.engine = TransferEngine({"workers": self.workers, "checksum": "none"})
+        self.index_file = os.path.join(self.folder, INDEX_FILE)
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "bytes_copied": 0, "evicted": 0}
+        # Folders being staged or processed; their copies are never evicted
+        self._pinned = set()
+        # Staging runs in the prefetch thread while the finisher releases folders
+        self._lock = threading.Lock()
+
+        if self.enabled and os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable staging cache index {self.index_file}: {e}")
+
+    def path(self, folder_path, image_path=None):
+        """
+        Returns the staging folder of a flight folder, or the staged path of one of its images.
+
+        Args:
+            folder_path (str): Path of the flight folder.
+            image_path (str): Path of an image below the flight folder.
+
+        Returns:
+            str: Local path.
+        """
+        target = os.path.join(self.folder, campaign_name(folder_path))
+        if image_path is None:
+            return target
+        return os.path.join(target, os.path.relpath(image_path, folder_path))
+
+    def required_bytes(self, folder_path, chunk_jobs):
+        """
+        Estimates the local space still needed to stage the images of a folder.
+
+        Args:
+            folder_path (str): Path of the flight folder.
+            chunk_jobs (list): ChunkJob of every chunk of the folder.
+
+        Returns:
+            int: Bytes not staged yet; 0 if staging is disabled.
+        """
+        if not self.enabled:
+            return 0
+        required = sum(job.input_bytes for job in chunk_jobs)
+        target = self.path(folder_path)
+        if os.path.isdir(target):
+            required -= directory_size(target)
+        return max(required, 0)
+
+    def cached_bytes(self):
+        """
+        Returns the size of all copies in the cache.
+
+        Returns:
+            int: Bytes.
+        """
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def stage(self, folder_path, chunk_jobs, reserved_bytes=0):
+        """
+        Copies the images of a folder to the staging folder, reusing unchanged copies, and records
+        the staged path of every image in job.staged. Images that could not be copied or do not
+        fit into the cache budget keep their network path. The folder stays pinned in the cache
+        until it is released.
+
+        Args:
+            folder_path (str): Path of the flight folder.
+            chunk_jobs (list): ChunkJob of every chunk of the folder.
+            reserved_bytes (int): Temporary space that must stay free for processing.
+
+        Returns:
+            int: Number of staged images.
+        """
+        if not self.enabled or not chunk_jobs:
+            return 0
+        os.makedirs(self.folder, exist_ok=True)
+        if same_filesystem(folder_path, self.folder):
+            logging.info(f"Not staging {folder_path}: it is on the same filesystem as {self.folder}")
+            return 0
+
+        with self._lock:
+            target = self.path(folder_path)
+            self._pinned.add(target)
+            # Channels of one capture and passes over one folder share their copies
+            image_paths = list(dict.fromkeys(path for job in chunk_jobs for path in job.image_list))
+            hits, misses = self._lookup(folder_path, image_paths)
+            uncached = len(misses)
+
+            required = sum(size for image_path, size in misses)
+            if self.max_bytes:
+                self._evict(required)
+                # Images beyond the budget are read from the network
+                budget = self.max_bytes - self.cached_bytes()
+                fitting = []
+                for image_path, size in misses:
+                    if size > budget:
+                        break
+                    fitting.append((image_path, size))
+                    budget -= size
+                if len(fitting) < len(misses):
+                    logging.warning(f"Staging cache budget of {format_bytes(self.max_bytes)} exceeded: "
+                                    f"{len(misses) - len(fitting)} images of {folder_path} are read from the network")
+                misses = fitting
+                required = sum(size for image_path, size in misses)
+
+        if required and self.planner is not None and not self.planner.admit(f"staging of {folder_path}",
+                                                                            required + reserved_bytes):
+            logging.warning(f"Reading the uncached images of {folder_path} from the network")
+            misses = []
+
+        started = time.perf_counter()
+        staged = {image_path: self.path(folder_path, image_path) for image_path, size in hits}
+        copied = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for image_path, size in misses:
+                staged_path = self.path(folder_path, image_path)
+                os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+                futures[executor.submit(self._copy, image_path, staged_path)] = image_path
+            for future in as_completed(futures):
+                try:
+                    copied += future.result()
+                    staged[futures[future]] = self.path(folder_path, futures[future])
+                except Exception as e:
+                    logging.warning(f"Could not stage {futures[future]}: {e}")
+
+        with self._lock:
+            now = time.time()
+            for image_path, size in hits + misses:
+                key = os.path.relpath(self.path(folder_path, image_path), self.folder)
+                if image_path in staged:
+                    stat = os.stat(image_path)
+                    self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "used": now}
+            hit_bytes = sum(size for image_path, size in hits)
+            self.stats["hits"] += len(hits)
+            self.stats["misses"] += uncached
+            self.stats["bytes_saved"] += hit_bytes
+            self.stats["bytes_copied"] += copied
+            self._write_index()
+
+        for job in chunk_jobs:
+            job.staged = {path: staged[path] for path in job.image_list if path in staged}
+
+        seconds = time.perf_counter() - started
+        logging.info(f"Staged {len(staged)} of {len(image_paths)} images of {folder_path} in {seconds:.1f} s: "
+                     f"{len(hits)} cache hits ({format_bytes(hit_bytes)} saved), "
+                     f"{uncached} misses ({format_bytes(copied)} copied)")
+        return len(staged)
+
+    def _lookup(self, folder_path, image_paths):
+        """
+        Splits images into cache hits, whose copy matches the size and mtime of the source, and misses.
+
+        Returns:
+            tuple: Lists of (image path, size) of the hits and of the misses.
+        """
+        hits, misses = [], []
+        for image_path in image_paths:
+            stat = os.stat(image_path)
+            staged_path = self.path(folder_path, image_path)
+            entry = self.entries.get(os.path.relpath(staged_path, self.folder))
+            if (entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                    and os.path.exists(staged_path)):
+                hits.append((image_path, stat.st_size))
+            else:
+                misses.append((image_path, stat.st_size))
+        return hits, misses
+
+    def _copy(self, image_path, staged_path):
+        """
+        Copies an image over a stale copy, which copy_file would otherwise accept by its size.
+        """
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+        return self.engine.copy_file(image_path, staged_path)
+
+    def _evict(self, required_bytes):
+        """
+        Removes the least recently used copies of unpinned folders until the required bytes fit
+        into the budget.
+        """
+        excess = self.cached_bytes() + required_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = 0
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            if evicted >= excess:
+                break
+            staged_path = os.path.join(self.folder, key)
+            if any(staged_path.startswith(pinned + os.sep) for pinned in self._pinned):
+                continue
+            try:
+                os.remove(staged_path)
+            except FileNotFoundError:
+                pass
+            del self.entries[key]
+            evicted += entry["size"]
+            self.stats["evicted"] += 1
+        _remove_empty_folders(self.folder)
+        logging.info(f"Evicted {format_bytes(evicted)} of least recently used images from the staging cache")
+
+    def _write_index(self):
+        """
+        Rewrites the cache index atomically.
+        """
+        try:
+            tmp_path = f"{self.index_file}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(self.entries, file)
+            os.replace(tmp_path, self.index_file)
+        except OSError as e:
+            logging.warning(f"Could not update staging cache index {self.index_file}: {e}")
+
+    def release(self, folder_path):
+        """
+        Unpins the staged images of a folder. Without a cache budget they are removed; otherwise
+        they stay cached until evicted.
+
+        Args:
+            folder_path (str): Path of the flight folder.
+        """
+        with self._lock:
+            target = self.path(folder_path)
+            self._pinned.discard(target)
+            if self.max_bytes or not os.path.isdir(target):
+                return
+            shutil.rmtree(target, ignore_errors=True)
+            prefix = os.path.relpath(target, self.folder) + os.sep
+            self.entries = {key: entry for key, entry in self.entries.items() if not key.startswith(prefix)}
+            self._write_index()
+            logging.info(f"Removed staged images {target}")
+
+    def log_stats(self):
+        """
+        Logs the cache hits, misses and bytes saved since the start.
+        """
+        if not self.enabled:
+            return
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = 100.0 * self.stats["hits"] / lookups if lookups else 0.0
+        logging.info(f"Staging cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.1f}% hits), "
+                     f"{format_bytes(self.stats['bytes_saved'])} saved, {format_bytes(self.stats['bytes_copied'])} "
+                     f"copied, {self.stats['evicted']} evicted, {format_bytes(self.cached_bytes())} cached")
+
+def _remove_empty_folders(folder):
+    """
+    Removes the empty subfolders of a folder, deepest first.
+    """
+    for root, dirs, file_names in os.walk(folder, topdown=False):
+        if root != folder and not os.listdir(root):
+            os.rmdir(root)
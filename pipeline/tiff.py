@@ -0,0 +1,230 @@
+import struct
+
+# TIFF field types: struct format and size of a single value
+FIELD_TYPES = {
+    1: ("B", 1),    # BYTE
+    2: ("s", 1),    # ASCII
+    3: ("H", 2),    # SHORT
+    4: ("I", 4),    # LONG
+    5: ("II", 8),   # RATIONAL
+    6: ("b", 1),    # SBYTE
+    7: ("B", 1),    # UNDEFINED
+    8: ("h", 2),    # SSHORT
+    9: ("i", 4),    # SLONG
+    10: ("ii", 8),  # SRATIONAL
+    11: ("f", 4),   # FLOAT
+    12: ("d", 8),   # DOUBLE
+    16: ("Q", 8),   # LONG8 (BigTIFF)
+    17: ("q", 8),   # SLONG8 (BigTIFF)
+    18: ("Q", 8),   # IFD8 (BigTIFF)
+}
+
+# Tags used by the pipeline
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+EXTRA_SAMPLES = 338
+SAMPLE_FORMAT = 339
+MODEL_PIXEL_SCALE = 33550
+MODEL_TIEPOINT = 33922
+GEO_KEY_DIRECTORY = 34735
+GDAL_NODATA = 42113
+
+class TiffReader:
+    """
+    Reads the image file directories (IFDs) of a TIFF or BigTIFF file without reading pixel data.
+
+    The reader also parses TIFF structures embedded in other files, such as the EXIF block of a
+    JPEG, whose offsets are relative to the start of the embedded header.
+
+    Attributes:
+        file (file): Binary file object positioned anywhere.
+        base (int): Position of the TIFF header in the file.
+        byte_order (str): struct byte order of the file, '<' or '>'.
+        big (bool): Whether the file is a BigTIFF.
+        first_ifd (int): Offset of the first IFD.
+    """
+    def __init__(self, file, base=0):
+        """
+        Initializes the reader and parses the TIFF header.
+
+        Args:
+            file (file): Binary file object.
+            base (int): Position of the TIFF header in the file.
+
+        Raises:
+            ValueError: If the file has no valid TIFF header.
+        """
+        self.file = file
+        self.base = base
+
+        header = self._read(0, 16)
+        if header[:2] == b"II":
+            self.byte_order = "<"
+        elif header[:2] == b"MM":
+            self.byte_order = ">"
+        else:
+            raise ValueError("Not a TIFF file")
+
+        version = struct.unpack(self.byte_order + "H", header[2:4])[0]
+        if version == 42:
+            self.big = False
+            self.first_ifd = struct.unpack(self.byte_order + "I", header[4:8])[0]
+        elif version == 43:
+            self.big = True
+            self.first_ifd = struct.unpack(self.byte_order + "Q", header[8:16])[0]
+        else:
+            raise ValueError(f"Unknown TIFF version {version}")
+
+    def _read(self, offset, size):
+        self.file.seek(self.base + offset)
+        return self.file.read(size)
+
+    def read_ifd(self, offset):
+        """
+        Reads the entries of one IFD.
+
+        Args:
+            offset (int): Offset of the IFD.
+
+        Returns:
+            tuple: Dict of tag -> value (a tuple of values, a string for ASCII fields, a single
+            value if the field holds one number) and the offset of the next IFD (0 at the end).
+        """
+        count_format, entry_size, pointer_format = ("Q", 20, "Q") if self.big else ("H", 12, "I")
+        count_size = struct.calcsize(count_format)
+        count = struct.unpack(self.byte_order + count_format, self._read(offset, count_size))[0]
+        data = self._read(offset + count_size, count * entry_size + struct.calcsize(pointer_format))
+
+        tags = {}
+        value_size = 8 if self.big else 4
+        for index in range(count):
+            entry = data[index * entry_size:(index + 1) * entry_size]
+            tag, field_type = struct.unpack(self.byte_order + "HH", entry[:4])
+            value_count = struct.unpack(self.byte_order + count_format.replace("H", "I"), entry[4:4 + value_size])[0]
+            if field_type not in FIELD_TYPES:
+                continue
+
+            value_format, size = FIELD_TYPES[field_type]
+            total = size * value_count
+            if total <= value_size:
+                raw = entry[4 + value_size:4 + value_size + total]
+            else:
+                pointer = struct.unpack(self.byte_order + pointer_format, entry[4 + value_size:])[0]
+                raw = self._read(pointer, total)
+            tags[tag] = self._decode(raw, field_type, value_count)
+
+        next_ifd = struct.unpack(self.byte_order + pointer_format, data[count * entry_size:])[0]
+        return tags, next_ifd
+
+    def _decode(self, raw, field_type, value_count):
+        """
+        Decodes the raw bytes of a field.
+        """
+        value_format, size = FIELD_TYPES[field_type]
+        if field_type == 2:
+            return raw.split(b"\0", 1)[0].decode("latin-1")
+        if field_type == 7:
+            return raw
+
+        values = struct.unpack(self.byte_order + value_format * value_count, raw[:size * value_count])
+        if field_type in (5, 10):
+            values = tuple(numerator / denominator if denominator else 0.0
+                           for numerator, denominator in zip(values[::2], values[1::2]))
+        return values[0] if value_count == 1 else values
+
+    def ifds(self):
+        """
+        Reads the main IFD chain, i.e. the full-resolution image followed by its overviews.
+
+        Returns:
+            list: (offset, tags) tuples in file order of the chain.
+        """
+        ifds = []
+        offset = self.first_ifd
+        seen = set()
+        while offset and offset not in seen:
+            seen.add(offset)
+            tags, next_offset = self.read_ifd(offset)
+            ifds.append((offset, tags))
+            offset = next_offset
+        return ifds
+
+def read_tags(path):
+    """
+    Reads the tags of the first image of a TIFF file.
+
+    Args:
+        path (str): Path of the TIFF file.
+
+    Returns:
+        dict: Tag -> value of the first IFD.
+    """
+    with open(path, 'rb') as file:
+        reader = TiffReader(file)
+        return reader.read_ifd(reader.first_ifd)[0]
+
+def geotransform(tags):
+    """
+    Derives the affine geotransform of a GeoTIFF from its model tie point and pixel scale.
+
+    Args:
+        tags (dict): Tags of the GeoTIFF image.
+
+    Returns:
+        tuple: GDAL geotransform (origin x, pixel width, 0, origin y, 0, -pixel height).
+
+    Raises:
+        ValueError: If the image is not georeferenced by tie point and pixel scale.
+    """
+    if MODEL_TIEPOINT not in tags or MODEL_PIXEL_SCALE not in tags:
+        raise ValueError("TIFF is not georeferenced by ModelTiepoint and ModelPixelScale")
+
+    i, j, k, x, y, z = tags[MODEL_TIEPOINT][:6]
+    scale_x, scale_y = tags[MODEL_PIXEL_SCALE][:2]
+    return (x - i * scale_x, scale_x, 0.0, y + j * scale_y, 0.0, -scale_y)
+
+def validate_cog(path, block_size=512):
+    """
+    Checks that a GeoTIFF has the layout of a Cloud-Optimized GeoTIFF: a tiled image with
+    overviews, all IFDs ahead of the image data, and the data of smaller overviews stored before
+    that of larger ones, so a client reads the overview it needs with few range requests.
+
+    Args:
+        path (str): Path of the TIFF file.
+        block_size (int): Images larger than this many pixels in either direction need tiles and overviews.
+
+    Returns:
+        list: Descriptions of the problems found; empty for a valid COG.
+    """
+    with open(path, 'rb') as file:
+        ifds = TiffReader(file).ifds()
+
+    problems = []
+    main = ifds[0][1]
+    large = main.get(IMAGE_WIDTH, 0) > block_size or main.get(IMAGE_LENGTH, 0) > block_size
+    if large and TILE_WIDTH not in main:
+        problems.append("the image is not tiled")
+    if large and len(ifds) == 1:
+        problems.append("the image has no overviews")
+
+    data_offsets = []
+    for offset, tags in ifds:
+        offsets = tags.get(TILE_OFFSETS, tags.get(STRIP_OFFSETS, ()))
+        offsets = offsets if isinstance(offsets, tuple) else (offsets,)
+        data_offsets.append(min((value for value in offsets if value), default=None))
+    first_data = min((value for value in data_offsets if value is not None), default=None)
+    if first_data is not None and any(offset > first_data for offset, tags in ifds):
+        problems.append("IFDs are not at the start of the file")
+
+    for index in range(1, len(ifds)):
+        if None not in (data_offsets[index - 1], data_offsets[index]) and data_offsets[index] > data_offsets[index - 1]:
+            problems.append(f"data of overview {index} is stored after the larger image before it")
+            break
+    return problems
@@ -0,0 +1,141 @@
+import os
+import math
+import logging
+from xml.sax.saxutils import escape
+from pipeline import tiff
+
+# GDAL data type of TIFF samples, by (SampleFormat, BitsPerSample)
+GDAL_DATA_TYPES = {
+    (1, 8): "Byte",
+    (1, 16): "UInt16",
+    (1, 32): "UInt32",
+    (2, 16): "Int16",
+    (2, 32): "Int32",
+    (3, 32): "Float32",
+    (3, 64): "Float64",
+}
+
+# GeoTIFF keys holding the EPSG code of the coordinate system
+PROJECTED_CS_TYPE = 3072
+GEOGRAPHIC_TYPE = 2048
+
+def tile_grid(size_x, size_y, tile_size, overlap):
+    """
+    Splits a rectangular region into a grid of equally sized, overlapping tiles.
+
+    Args:
+        size_x (float): Width of the region.
+        size_y (float): Height of the region.
+        tile_size (float): Maximum width and height of a tile without its overlap.
+        overlap (float): Extent added on every side of a tile.
+
+    Returns:
+        list: (center x, center y, width, height) of every tile, relative to the region center,
+        row by row.
+    """
+    columns = max(1, math.ceil(size_x / tile_size))
+    rows = max(1, math.ceil(size_y / tile_size))
+    step_x = size_x / columns
+    step_y = size_y / rows
+
+    tiles = []
+    for row in range(rows):
+        for column in range(columns):
+            tiles.append((-size_x / 2 + (column + 0.5) * step_x,
+                          -size_y / 2 + (row + 0.5) * step_y,
+                          step_x + 2 * overlap,
+                          step_y + 2 * overlap))
+    return tiles
+
+def epsg_code(tags):
+    """
+    Reads the EPSG code of a GeoTIFF from its GeoKey directory.
+
+    Args:
+        tags (dict): Tags of the GeoTIFF image.
+
+    Returns:
+        int: EPSG code, or None if the coordinate system is not given by code.
+    """
+    directory = tags.get(tiff.GEO_KEY_DIRECTORY)
+    if not directory:
+        return None
+    keys = {}
+    for index in range(4, 4 + 4 * directory[3], 4):
+        key, location, count, value = directory[index:index + 4]
+        if location == 0:
+            keys[key] = value
+    return keys.get(PROJECTED_CS_TYPE) or keys.get(GEOGRAPHIC_TYPE)
+
+def write_vrt(vrt_path, tile_paths):
+    """
+    Writes a GDAL virtual raster mosaicking GeoTIFF tiles of the same resolution. Transparent
+    and no-data pixels of a tile do not cover the tiles before it, so overlaps blend cleanly.
+
+    Args:
+        vrt_path (str): Path of the VRT file; tile paths are stored relative to it.
+        tile_paths (list): Paths of the GeoTIFF tiles.
+
+    Raises:
+        ValueError: If no tiles are given or the tiles are not georeferenced.
+    """
+    if not tile_paths:
+        raise ValueError(f"No tiles to mosaic into {vrt_path}")
+
+    tiles = []
+    for path in tile_paths:
+        tags = tiff.read_tags(path)
+        tiles.append((path, tags, tiff.geotransform(tags)))
+
+    first_tags = tiles[0][1]
+    pixel_x, pixel_y = tiles[0][2][1], tiles[0][2][5]
+    min_x = min(transform[0] for path, tags, transform in tiles)
+    max_y = max(transform[3] for path, tags, transform in tiles)
+    max_x = max(transform[0] + tags[tiff.IMAGE_WIDTH] * transform[1] for path, tags, transform in tiles)
+    min_y = min(transform[3] + tags[tiff.IMAGE_LENGTH] * transform[5] for path, tags, transform in tiles)
+    width = round((max_x - min_x) / pixel_x)
+    height = round((min_y - max_y) / pixel_y)
+
+    bands = first_tags.get(tiff.SAMPLES_PER_PIXEL, 1)
+    bits = first_tags.get(tiff.BITS_PER_SAMPLE, 8)
+    bits = bits[0] if isinstance(bits, tuple) else bits
+    sample_format = first_tags.get(tiff.SAMPLE_FORMAT, 1)
+    sample_format = sample_format[0] if isinstance(sample_format, tuple) else sample_format
+    data_type = GDAL_DATA_TYPES.get((sample_format, bits), "Byte")
+    nodata = first_tags.get(tiff.GDAL_NODATA)
+    has_alpha = tiff.EXTRA_SAMPLES in first_tags
+
+    lines = [f'<VRTDataset rasterXSize="{width}" rasterYSize="{height}">']
+    epsg = epsg_code(first_tags)
+    if epsg:
+        lines.append(f"  <SRS>EPSG:{epsg}</SRS>")
+    lines.append(f"  <GeoTransform>{min_x!r}, {pixel_x!r}, 0.0, {max_y!r}, 0.0, {pixel_y!r}</GeoTransform>")
+
+    vrt_folder = os.path.dirname(os.path.abspath(vrt_path))
+    for band in range(1, bands + 1):
+        lines.append(f'  <VRTRasterBand dataType="{data_type}" band="{band}">')
+        if has_alpha and band == bands:
+            lines.append("    <ColorInterp>Alpha</ColorInterp>")
+        if nodata is not None:
+            lines.append(f"    <NoDataValue>{escape(nodata.strip())}</NoDataValue>")
+        for path, tags, transform in tiles:
+            x_offset = round((transform[0] - min_x) / pixel_x)
+            y_offset = round((transform[3] - max_y) / pixel_y)
+            tile_width, tile_height = tags[tiff.IMAGE_WIDTH], tags[tiff.IMAGE_LENGTH]
+            lines.append("    <ComplexSource>")
+            lines.append(f'      <SourceFilename relativeToVRT="1">'
+                         f'{escape(os.path.relpath(os.path.abspath(path), vrt_folder))}</SourceFilename>')
+            lines.append(f"      <SourceBand>{band}</SourceBand>")
+            lines.append(f'      <SrcRect xOff="0" yOff="0" xSize="{tile_width}" ySize="{tile_height}"/>')
+            lines.append(f'      <DstRect xOff="{x_offset}" yOff="{y_offset}" xSize="{tile_width}" ySize="{tile_height}"/>')
+            if nodata is not None:
+                lines.append(f"      <NODATA>{escape(nodata.strip())}</NODATA>")
+            elif has_alpha:
+                lines.append("      <UseMaskBand>true</UseMaskBand>")
+            lines.append("    </ComplexSource>")
+        lines.append("  </VRTRasterBand>")
+    lines.append("</VRTDataset>")
+
+    with open(vrt_path, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    logging.info(f"Wrote mosaic of {len(tiles)} tiles to {vrt_path}")
@@ -0,0 +1,275 @@
+import os
+import time
+import errno
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Kernel copy primitives tried in order; 'read' is the portable buffered fallback
+COPY_METHODS = [method for method in ("copy_file_range", "sendfile") if hasattr(os, method)] + ["read"]
+
+# Errors meaning a copy primitive is not supported for this pair of files
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+PART_SUFFIX = ".part"
+
+class TransferEngine:
+    """
+    Moves directory trees from the temporary folder to the campaign folders.
+
+    Within one filesystem files are renamed. Across filesystems they are copied by a pool of
+    threads using kernel copies where available, written to '<file>.part' first so interrupted
+    transfers resume where they stopped, and verified by checksum. A source file is deleted only
+    after its copy was verified.
+
+    Attributes:
+        workers (int): Number of files copied concurrently.
+        buffer_size (int): Bytes copied per system call.
+        checksum (str): hashlib algorithm used for verification, or 'none' to compare sizes only.
+    """
+    def __init__(self, config=None):
+        """
+        Initializes the engine from the optional 'transfer' section of the configuration.
+
+        Args:
+            config (dict): 'transfer' section with 'workers', 'buffer_mb' and 'checksum'.
+
+        Raises:
+            ValueError: If the checksum algorithm is not available in hashlib.
+        """
+        config = config or {}
+        self.workers = int(config.get("workers", 4))
+        self.buffer_size = int(config.get("buffer_mb", 16)) * 1024 ** 2
+        self.checksum = config.get("checksum", "blake2b")
+        if self.checksum != "none" and self.checksum not in hashlib.algorithms_available:
+            raise ValueError(f"Unknown checksum algorithm '{self.checksum}'.")
+
+    def move_tree(self, src_dir, dest_dir):
+        """
+        Moves all files and subfolders of a directory into another directory, merging with
+        existing subfolders. The (then empty) source directory itself is kept.
+
+        Args:
+            src_dir (str): Source directory.
+            dest_dir (str): Destination directory.
+
+        Returns:
+            dict: Number of files, bytes copied, seconds and throughput in MB/s.
+
+        Raises:
+            RuntimeError: If any file could not be transferred; its source is kept.
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        same_device = same_filesystem(src_dir, dest_dir)
+
+        files = []
+        for root, dirs, file_names in os.walk(src_dir):
+            target_root = os.path.join(dest_dir, os.path.relpath(root, src_dir))
+            for name in dirs:
+                os.makedirs(os.path.join(target_root, name), exist_ok=True)
+            files.extend((os.path.join(root, name), os.path.join(target_root, name)) for name in file_names)
+
+        started = time.perf_counter()
+        copied = 0
+        failed = []
+        if same_device:
+            for src_path, dest_path in files:
+                os.replace(src_path, dest_path)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self.move_file, src_path, dest_path): src_path
+                           for src_path, dest_path in files}
+                for future in as_completed(futures):
+                    try:
+                        copied += future.result()
+                    except Exception as e:
+                        logging.error(f"Error transferring {futures[future]}: {e}")
+                        failed.append(futures[future])
+
+        # Remove the emptied source subfolders, deepest first
+        for root, dirs, file_names in os.walk(src_dir, topdown=False):
+            if root != src_dir and not os.listdir(root):
+                os.rmdir(root)
+
+        seconds = time.perf_counter() - started
+        throughput = copied / 1024 ** 2 / seconds if seconds > 0 else 0.0
+        logging.info(f"Transferred {len(files) - len(failed)} files ({copied / 1024 ** 3:.2f} GB copied) "
+                     f"from {src_dir} to {dest_dir} in {seconds:.1f} s ({throughput:.1f} MB/s)")
+        if failed:
+            raise RuntimeError(f"{len(failed)} files could not be transferred from {src_dir}; rerun to resume.")
+
+        return {"files": len(files), "bytes": copied, "seconds": seconds, "mb_per_s": throughput}
+
+    def move_file(self, src_path, dest_path):
+        """
+        Copies a file to another filesystem, verifies the copy and deletes the source.
+
+        Args:
+            src_path (str): Source file path.
+            dest_path (str): Destination file path.
+
+        Returns:
+            int: Number of bytes copied in this call, excluding resumed parts.
+
+        Raises:
+            OSError: If the copy still differs from the source after copying it again.
+        """
+        copied = self.copy_file(src_path, dest_path)
+        os.remove(src_path)
+        return copied
+
+    def copy_file(self, src_path, dest_path):
+        """
+        Copies a file through '<file>.part' and verifies the copy; the source is kept.
+
+        Args:
+            src_path (str): Source file path.
+            dest_path (str): Destination file path.
+
+        Returns:
+            int: Number of bytes copied in this call, excluding resumed parts.
+
+        Raises:
+            OSError: If the copy still differs from the source after copying it again.
+        """
+        size = os.stat(src_path).st_size
+        part_path = dest_path + PART_SUFFIX
+
+        # A previous run already copied and verified the file
+        if os.path.exists(dest_path) and not os.path.exists(part_path) and os.stat(dest_path).st_size == size:
+            if self.verify(src_path, dest_path):
+                return 0
+
+        copied = self._copy(src_path, part_path, size)
+        if not self.verify(src_path, part_path):
+            # The resumed part may stem from a different file version; start over once
+            logging.warning(f"Checksum mismatch for {dest_path}, copying it again")
+            os.remove(part_path)
+            copied += self._copy(src_path, part_path, size)
+            if not self.verify(src_path, part_path):
+                raise OSError(f"Checksum mismatch after copying {src_path} to {dest_path}")
+
+        shutil.copystat(src_path, part_path)
+        os.replace(part_path, dest_path)
+        return copied
+
+    def verify(self, src_path, dest_path):
+        """
+        Compares a copy with its source by size and checksum.
+
+        Args:
+            src_path (str): Source file path.
+            dest_path (str): Path of the copy.
+
+        Returns:
+            bool: True if the copy matches the source.
+        """
+        if os.stat(src_path).st_size != os.stat(dest_path).st_size:
+            return False
+        if self.checksum == "none":
+            return True
+        return self.digest(src_path) == self.digest(dest_path)
+
+    def digest(self, path):
+        """
+        Computes the checksum of a file.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            str: Hexadecimal digest.
+        """
+        digest = hashlib.new(self.checksum)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(self.buffer_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _copy(self, src_path, part_path, size):
+        """
+        Copies a file into its part file, continuing after the bytes already in the part file.
+
+        Returns:
+            int: Number of bytes copied.
+        """
+        offset = os.stat(part_path).st_size if os.path.exists(part_path) else 0
+        if offset > size:
+            offset = 0
+        elif offset:
+            logging.info(f"Resuming transfer of {src_path} at {offset} of {size} bytes")
+
+        src_fd = os.open(src_path, os.O_RDONLY)
+        try:
+            dst_fd = os.open(part_path, os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(dst_fd, offset)
+                copy_range(src_fd, dst_fd, offset, size, self.buffer_size)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        return size - offset
+
+def same_filesystem(src_dir, dest_dir):
+    """
+    Checks whether two directories are on the same filesystem, so files can be renamed.
+
+    Args:
+        src_dir (str): Source directory.
+        dest_dir (str): Destination directory.
+
+    Returns:
+        bool: True if both directories are on the same device.
+    """
+    return os.stat(src_dir).st_dev == os.stat(dest_dir).st_dev
+
+def copy_range(src_fd, dst_fd, offset, size, buffer_size):
+    """
+    Copies bytes [offset, size) between two file descriptors at the same positions, using the
+    first copy primitive in COPY_METHODS that the filesystems support.
+
+    Args:
+        src_fd (int): Source file descriptor.
+        dst_fd (int): Destination file descriptor.
+        offset (int): Position of the first byte to copy.
+        size (int): Size of the source file.
+        buffer_size (int): Maximum number of bytes per system call.
+    """
+    methods = list(COPY_METHODS)
+    position = offset
+    while position < size:
+        count = min(buffer_size, size - position)
+        try:
+            copied = _copy_chunk(methods[0], src_fd, dst_fd, position, count)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED or len(methods) == 1:
+                raise
+            methods.pop(0)
+            continue
+        if copied == 0:
+            raise OSError(f"Source file ended at {position} of {size} bytes")
+        position += copied
+
+def _copy_chunk(method, src_fd, dst_fd, position, count):
+    """
+    Copies up to count bytes at a position with one copy primitive.
+
+    Returns:
+        int: Number of bytes copied.
+    """
+    if method == "copy_file_range":
+        return os.copy_file_range(src_fd, dst_fd, count, position, position)
+
+    os.lseek(dst_fd, position, os.SEEK_SET)
+    if method == "sendfile":
+        return os.sendfile(dst_fd, src_fd, position, count)
+
+    os.lseek(src_fd, position, os.SEEK_SET)
+    data = memoryview(os.read(src_fd, count))
+    written = 0
+    while written < len(data):
+        written += os.write(dst_fd, data[written:])
+    return len(data)
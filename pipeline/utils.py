@@ -1,77 +1,236 @@
 import os
+import re
 import sys
+import time
+import queue
+import atexit
 import shutil
 import logging
+import threading
+import contextlib
 import yaml
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
+from pipeline.profiles import validate_profiles
+from pipeline.stages import validate_outputs, validate_retention
+from pipeline.transfer import TransferEngine
+
+# Metashape progress output ends in a percentage, e.g. "BuildDepthMaps: 45.3%"
+PROGRESS_LINE = re.compile(r"(\d+(?:\.\d+)?)\s*%\]?\s*$")
+
+# Background writer of the log records, started by setup_logger
+_listener = None
+# Per-thread paths of the chunk and folder logs that records are copied to
+_chunk_context = threading.local()
 
 class StreamToLogger:
     """
     Redirects stdout and stderr to the logger.
 
+    Metashape reports progress many times per second; progress lines are passed on at most once
+    per progress_interval seconds (and always at 100 %), so the console output of long stages does
+    not flood the log.
+
     Args:
         logger (logging.Logger): The logger instance to use.
         log_level (int): The logging level for the output stream.
+        progress_interval (float): Minimum seconds between two logged progress lines.
     """
-    def __init__(self, logger, log_level):
+    def __init__(self, logger, log_level, progress_interval=0.0):
         self.logger = logger
         self.log_level = log_level
+        self.progress_interval = progress_interval
         self.linebuf = ''
+        self._last_progress = None
 
     def write(self, buf):
         """
-        Writes output to the logger, line by line.
+        Writes output to the logger, line by line. An incomplete last line is kept until it is
+        completed; carriage returns, used to redraw progress in place, end a line as well.
         """
-        for line in buf.rstrip().splitlines():
-            self.logger.log(self.log_level, line.rstrip())
+        lines = (self.linebuf + buf).replace("\r", "\n").split("\n")
+        self.linebuf = lines.pop()
+        for line in lines:
+            self._log(line.rstrip())
+        return len(buf)
+
+    def _log(self, line):
+        if not line:
+            return
+        match = PROGRESS_LINE.search(line)
+        if match and float(match.group(1)) < 100:
+            now = time.monotonic()
+            if self._last_progress is not None and now - self._last_progress < self.progress_interval:
+                return
+            self._last_progress = now
+        self.logger.log(self.log_level, line)
 
     def flush(self):
         """
-        Flush method, required by the IO base class.
+        Logs an incomplete last line.
         """
-        pass
+        if self.linebuf:
+            line, self.linebuf = self.linebuf, ''
+            self._log(line.rstrip())
 
-def setup_logger(log_file):
+class ChunkLogHandler(logging.Handler):
+    """
+    Copies records logged within chunk_logging to the log files of the enclosing blocks. Files
+    are opened on the first record and closed when their chunk_logging block ends.
+    """
+    def __init__(self):
+        super().__init__()
+        self._files = {}
+
+    def emit(self, record):
+        paths = getattr(record, "chunk_log", ())
+        if not paths:
+            return
+        try:
+            line = self.format(record) + "\n"
+            for path in paths:
+                file = self._files.get(path)
+                if file is None:
+                    file = self._files[path] = open(path, 'a')
+                file.write(line)
+                file.flush()
+                if getattr(record, "close_chunk_log", None) == path:
+                    self._files.pop(path).close()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+        super().close()
+
+def _tag_chunk(record):
+    """
+    Marks a record with the chunk and folder logs of the logging thread; used as filter of the queue handler.
+    """
+    record.chunk_log = getattr(_chunk_context, "paths", ())
+    return True
+
+def setup_logger(log_file, progress_interval=10.0):
     """
     Sets up the logging configuration, redirecting stdout and stderr 
     to the logger. Logs to both console and file.
 
+    Records are only put on a queue by the logging thread; a background listener formats them
+    and writes them to the console, the log file and the chunk logs, so a slow disk never
+    stalls processing. Repeated calls with the same log file reuse the running setup; a new
+    log file replaces it. Handlers added before, such as the implicit console handler of a
+    logging call made before this setup, are detached until stop_logging, so no line is printed twice.
+
     Args:
         log_file (str): Path of the log file.
+        progress_interval (float): Minimum seconds between two logged Metashape progress lines.
 
     Returns:
         logging.Logger: Configured logger.
     """
-    print("Setting up logger")
+    global _listener
     logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
 
     # Avoid adding handlers multiple times
-    logger.setLevel(logging.DEBUG)
+    if _listener is not None:
+        if _listener.log_file == log_file:
+            return logger
+        stop_logging()
 
-    # Create handlers for file and console
+    print("Setting up logger")
+
+    # Create handlers for file and console; the console is the real stderr, which is redirected below
     file_handler = logging.FileHandler(log_file)
     file_handler.setLevel(logging.DEBUG)
     
-    console_handler = logging.StreamHandler()
+    console_handler = logging.StreamHandler(sys.__stderr__)
     console_handler.setLevel(logging.INFO)
 
+    chunk_handler = ChunkLogHandler()
+    chunk_handler.setLevel(logging.DEBUG)
+
     # Define log format
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     
     # Set formatter for handlers
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    for handler in (file_handler, console_handler, chunk_handler):
+        handler.setFormatter(formatter)
+
+    # The logger only enqueues; the listener thread does the formatting and writing
+    queue_handler = QueueHandler(queue.Queue())
+    queue_handler.addFilter(_tag_chunk)
+    previous_handlers = list(logger.handlers)
+    for handler in previous_handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+
+    _listener = QueueListener(queue_handler.queue, file_handler, console_handler, chunk_handler,
+                              respect_handler_level=True)
+    _listener.log_file = log_file
+    _listener.queue_handler = queue_handler
+    _listener.previous_handlers = previous_handlers
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
 
     # Redirect stdout and stderr
-    sys.stdout = StreamToLogger(logger, logging.INFO)
-    sys.stderr = StreamToLogger(logger, logging.ERROR)
+    _listener.streams = (sys.stdout, sys.stderr)
+    sys.stdout = StreamToLogger(logger, logging.INFO, progress_interval)
+    sys.stderr = StreamToLogger(logger, logging.ERROR, progress_interval)
 
     return logger
 
+def flush_logging():
+    """
+    Waits until the background listener has written all records logged so far.
+    """
+    if _listener is not None:
+        for stream in (sys.stdout, sys.stderr):
+            if isinstance(stream, StreamToLogger):
+                stream.flush()
+        _listener.queue.join()
+
+def stop_logging():
+    """
+    Writes all pending records, stops the background listener, closes the log files and restores
+    stdout and stderr.
+    """
+    global _listener
+    if _listener is None:
+        return
+    flush_logging()
+    sys.stdout, sys.stderr = _listener.streams
+    logger = logging.getLogger()
+    logger.removeHandler(_listener.queue_handler)
+    for handler in _listener.previous_handlers:
+        logger.addHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+@contextlib.contextmanager
+def chunk_logging(log_path):
+    """
+    Copies everything the current thread logs within the block to a log file, e.g. of a chunk or
+    of a folder. Blocks nest, so a folder log also gets the records of the chunk logs inside it.
+    The file is complete and closed when the block ends.
+
+    Args:
+        log_path (str): Path of the log file.
+    """
+    previous = getattr(_chunk_context, "paths", ())
+    _chunk_context.paths = previous + (log_path,)
+    try:
+        yield
+    finally:
+        logging.getLogger().debug(f"End of log {log_path}", extra={"close_chunk_log": log_path})
+        _chunk_context.paths = previous
+        flush_logging()
+
 def create_log_file(input_folder):
     """
     Creates a log file in the 'log-files' directory inside the input folder.
@@ -109,13 +268,19 @@ def move_file(source_path, destination_path):
     except Exception as e:
         logging.error(f"Unexpected error moving file from {source_path} to {destination_path}: {e}")
 
-def move_all_files(src_dir, dest_dir):
+def move_all_files(src_dir, dest_dir, transfer=None):
     """
     Moves all files and subfolders from source directory to destination directory.
+    Existing subfolders in the destination are merged; across filesystems every file is
+    copied in parallel, verified and only then deleted from the source.
 
     Args:
         src_dir (str): Source directory.
         dest_dir (str): Destination directory.
+        transfer (TransferEngine): Engine doing the transfer. Defaults to a TransferEngine with default settings.
+
+    Returns:
+        dict: Transfer statistics, see TransferEngine.move_tree.
 
     Raises:
         FileNotFoundError: If the source directory doesn't exist.
@@ -127,27 +292,15 @@ def move_all_files(src_dir, dest_dir):
     if not os.path.exists(dest_dir):
         os.makedirs(dest_dir)
         logging.info(f"Created destination directory: {dest_dir}")
-    
-    for item in os.listdir(src_dir):
-        src_path = os.path.join(src_dir, item)
-        dest_path = os.path.join(dest_dir, item)
 
-        try:
-            if os.path.isdir(src_path):
-                shutil.move(src_path, dest_path)
-                logging.info(f"Moved directory: {src_path} to {dest_path}")
-            else:
-                shutil.move(src_path, dest_path)
-                logging.info(f"Moved file: {src_path} to {dest_path}")
-        except FileNotFoundError:
-            logging.error(f"File or directory not found: {src_path}")
-        except PermissionError:
-            logging.error(f"Permission denied when moving: {src_path}")
-        except Exception as e:
-            logging.error(f"Unexpected error moving {src_path} to {dest_path}: {e}")
-            raise
+    try:
+        stats = (transfer or TransferEngine()).move_tree(src_dir, dest_dir)
+    except Exception as e:
+        logging.error(f"Unexpected error moving {src_dir} to {dest_dir}: {e}")
+        raise
 
     logging.info(f"All files and subfolders moved from {src_dir} to {dest_dir}")
+    return stats
 
 def check_free_space(min_required_space_gb, folder):
     """
@@ -168,6 +321,37 @@ def check_free_space(min_required_space_gb, folder):
     
     logging.info(f"Disk space check passed: {free_gb:.2f} GB available.")
 
+def format_bytes(num_bytes):
+    """
+    Formats a byte count for display.
+
+    Args:
+        num_bytes (int): Number of bytes.
+
+    Returns:
+        str: Human readable size, e.g. '1.50 GB'.
+    """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.2f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.2f} TB"
+
+def campaign_name(folder_path):
+    """
+    Returns the name of a campaign folder without its '_unprocessed' or '_processed' marker, which
+    stays the same when the folder is renamed after processing. Like the rename, which replaces
+    '_unprocessed' with '_processed' anywhere in the name, the marker is removed wherever it occurs.
+
+    Args:
+        folder_path (str): Path of the campaign folder.
+
+    Returns:
+        str: Folder name without the processing marker.
+    """
+    name = os.path.basename(os.path.normpath(folder_path))
+    return name.replace("_unprocessed", "").replace("_processed", "")
+
 def load_config(config_file='config.yaml'):
     """
     Loads configuration from a YAML file.
@@ -180,6 +364,7 @@ def load_config(config_file='config.yaml'):
 
     Raises:
         FileNotFoundError: If the config file is not found.
+        ValueError: If the processing profiles, requested outputs or retention policy in the config are invalid.
     """
     if not os.path.exists(config_file):
         logging.error(f"Config file not found: {config_file}")
@@ -187,6 +372,14 @@ def load_config(config_file='config.yaml'):
     
     with open(config_file, 'r') as file:
         config = yaml.safe_load(file)
+
+    try:
+        validate_profiles(config or {})
+        validate_outputs(config or {})
+        validate_retention(config or {})
+    except ValueError as e:
+        logging.error(f"Invalid config file {config_file}: {e}")
+        raise
     
     logging.info(f"Configuration loaded from {config_file}")
     return config
@@ -0,0 +1,343 @@
+import os
+import json
+import time
+import fnmatch
+import logging
+from datetime import datetime, timedelta
+
+class ProcessingQueue:
+    """
+    Priority queue of folders waiting for processing, persisted as JSON so it survives restarts.
+
+    Attributes:
+        queue_file (str): Path to the JSON file holding the queue.
+        entries (dict): Entry per folder path with its priority, state, enqueue time and the folder
+            signature it was queued with; deferred entries also hold their retry time and attempts.
+    """
+    def __init__(self, queue_file):
+        """
+        Initializes the queue and loads its persisted state. Folders that were being processed
+        when the previous run stopped are queued again; their projects resume from the stage manifest.
+
+        Args:
+            queue_file (str): Path to the JSON file holding the queue.
+        """
+        self.queue_file = queue_file
+        self.entries = {}
+
+        if os.path.exists(self.queue_file):
+            try:
+                with open(self.queue_file, 'r') as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable processing queue {self.queue_file}: {e}")
+            for folder_path, entry in self.entries.items():
+                if entry["state"] == "processing":
+                    logging.info(f"Requeueing interrupted folder: {folder_path}")
+                    entry["state"] = "queued"
+            self.save()
+
+    def save(self):
+        """
+        Writes the queue to disk atomically.
+        """
+        tmp_path = f"{self.queue_file}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.entries, file, indent=2)
+        os.replace(tmp_path, self.queue_file)
+
+    def __contains__(self, folder_path):
+        return folder_path in self.entries
+
+    def push(self, folder_path, priority=0, signature=None):
+        """
+        Adds a folder to the queue.
+
+        Args:
+            folder_path (str): Path to the folder.
+            priority (int): Folders with a higher priority are processed first.
+            signature (tuple): File count, total size and latest directory modification time of
+                the folder when it was queued.
+        """
+        self.entries[folder_path] = {
+            "priority": priority,
+            "state": "queued",
+            "enqueued_at": datetime.now().isoformat(timespec="seconds"),
+            "signature": list(signature) if signature is not None else None,
+        }
+        self.save()
+        logging.info(f"Queued folder {folder_path} with priority {priority}")
+
+    def pop(self):
+        """
+        Takes the queued folder with the highest priority, the oldest first among equal priorities,
+        and marks it as processing.
+
+        Returns:
+            str: Path to the folder, or None if no folder is queued.
+        """
+        queued = [(-entry["priority"], entry["enqueued_at"], folder_path)
+                  for folder_path, entry in self.entries.items() if entry["state"] == "queued"]
+        if not queued:
+            return None
+
+        folder_path = min(queued)[2]
+        self.entries[folder_path]["state"] = "processing"
+        self.save()
+        return folder_path
+
+    def remove(self, folder_path):
+        """
+        Forgets a folder, so it is queued again once it is found.
+
+        Args:
+            folder_path (str): Path to the folder.
+        """
+        if self.entries.pop(folder_path, None) is not None:
+            self.save()
+
+    def mark(self, folder_path, state):
+        """
+        Sets the state of a folder, e.g. 'done' or 'failed'.
+
+        Args:
+            folder_path (str): Path to the folder.
+            state (str): New state of the folder.
+        """
+        self.entries[folder_path]["state"] = state
+        self.save()
+
+    def defer(self, folder_path, delay):
+        """
+        Marks a folder that could not be processed for now, e.g. for lack of disk space, to be
+        queued again after a delay.
+
+        Args:
+            folder_path (str): Path to the folder.
+            delay (float): Seconds until the folder is queued again.
+
+        Returns:
+            int: Number of times the folder was deferred.
+        """
+        entry = self.entries[folder_path]
+        entry["state"] = "deferred"
+        entry["retry_at"] = (datetime.now() + timedelta(seconds=delay)).isoformat(timespec="seconds")
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        self.save()
+        return entry["attempts"]
+
+    def requeue_due(self):
+        """
+        Queues the deferred folders whose retry time has passed.
+
+        Returns:
+            list: Paths of the folders queued again.
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        due = [folder_path for folder_path, entry in self.entries.items()
+               if entry["state"] == "deferred" and entry["retry_at"] <= now]
+        for folder_path in due:
+            logging.info(f"Requeueing deferred folder: {folder_path}")
+            self.entries[folder_path]["state"] = "queued"
+        if due:
+            self.save()
+        return due
+
+class FolderWatcher:
+    """
+    Watches the input folder for new '_unprocessed' folders and processes them continuously.
+
+    A folder is queued once its photos have stopped changing (same file count and total size)
+    for the settle time, so folders still being uploaded are not picked up. All queued folders are
+    processed as one batch through MetashapeProcessor.process_batch, like a single run, so
+    previews, disk admission, pipelining, staging and incremental updates apply to them as well.
+
+    A folder is done once it was renamed to '_processed'. A folder the batch did not get to, because
+    it did not fit into the temporary folder or the batch stopped with an error, is deferred and
+    queued again after the retry interval, up to 'max_retries' times. Any other folder failed and
+    is queued again when its content changes. A folder found again under the path of a done one,
+    i.e. uploaded again under the same name, is queued as a new folder.
+
+    Attributes:
+        processor (MetashapeProcessor): Processor used for every queued folder.
+        input_folder (str): Folder that is watched.
+        poll_interval (float): Seconds between two scans of the input folder.
+        settle_time (float): Seconds a folder must stay unchanged before it is queued.
+        priorities (dict): Priority per folder name glob pattern; the first match wins.
+        retry_interval (float): Seconds after which a deferred folder is queued again.
+        max_retries (int): Number of times a folder is deferred before it counts as failed.
+        queue (ProcessingQueue): Persistent queue of folders.
+    """
+    def __init__(self, processor, config):
+        """
+        Initializes the watcher from the optional 'watch' section of the configuration.
+
+        Args:
+            processor (MetashapeProcessor): Processor used for every queued folder.
+            config (dict): Configuration dictionary.
+        """
+        watch = config.get("watch") or {}
+        self.processor = processor
+        self.input_folder = config["input_folder"]
+        self.poll_interval = float(watch.get("poll_interval", 60))
+        self.settle_time = float(watch.get("settle_time", 300))
+        self.priorities = watch.get("priorities") or {}
+        self.retry_interval = float(watch.get("retry_interval", 600))
+        self.max_retries = int(watch.get("max_retries", 3))
+        self.queue = ProcessingQueue(watch.get("queue_file", os.path.join(config["tmp_folder"], "watch_queue.json")))
+        self._snapshots = {}
+        self._stopped = False
+
+    def stop(self):
+        """
+        Stops watching after the batch of folders currently being processed.
+        """
+        logging.info("Stopping folder watcher")
+        self._stopped = True
+
+    def priority(self, folder_name):
+        """
+        Determines the priority of a folder from the configured patterns.
+
+        Args:
+            folder_name (str): Name of the folder.
+
+        Returns:
+            int: Priority of the folder, 0 if no pattern matches.
+        """
+        for pattern, priority in self.priorities.items():
+            if fnmatch.fnmatch(folder_name, pattern):
+                return int(priority)
+        return 0
+
+    def poll(self):
+        """
+        Scans the input folder once and queues every new folder whose upload is complete.
+
+        Returns:
+            list: Paths of the folders queued by this scan.
+        """
+        queued = self.queue.requeue_due()
+        now = time.monotonic()
+        for folder_name in sorted(os.listdir(self.input_folder)):
+            folder_path = os.path.join(self.input_folder, folder_name)
+            if "_unprocessed" not in folder_name or not os.path.isdir(folder_path):
+                continue
+
+            if folder_path in self.queue:
+                entry = self.queue.entries[folder_path]
+                # Only the directories are checked, so unchanged failed folders are not walked file by file
+                changed = entry["state"] == "failed" and (entry.get("signature") or [])[2:] != [folder_mtime(folder_path)]
+                rearm = entry["state"] == "done" or changed
+                if not rearm:
+                    continue
+                logging.info(f"Folder {folder_path} changed since it was {entry['state']}; watching it again")
+                self.queue.remove(folder_path)
+
+            signature = folder_signature(folder_path)
+            previous = self._snapshots.get(folder_path)
+            if previous is None or previous[0] != signature:
+                # New or still changing: restart the settle timer
+                self._snapshots[folder_path] = (signature, now)
+                continue
+
+            if signature[0] > 0 and now - previous[1] >= self.settle_time:
+                self.queue.push(folder_path, self.priority(folder_name), signature)
+                del self._snapshots[folder_path]
+                queued.append(folder_path)
+
+        return queued
+
+    def run(self, max_cycles=None):
+        """
+        Polls the input folder and processes queued folders until stopped.
+
+        Args:
+            max_cycles (int): Number of poll cycles after which to return, or None to run until stopped.
+        """
+        logging.info(f"Watching {self.input_folder} every {self.poll_interval} s")
+        cycles = 0
+        while not self._stopped:
+            self.poll()
+
+            batch = []
+            folder_path = self.queue.pop()
+            while folder_path is not None:
+                batch.append(folder_path)
+                folder_path = self.queue.pop()
+            if batch:
+                self.process(batch)
+
+            cycles += 1
+            if max_cycles is not None and cycles >= max_cycles:
+                break
+            if not self._stopped:
+                time.sleep(self.poll_interval)
+
+    def process(self, batch):
+        """
+        Processes a batch of dequeued folders and marks each as done if it was renamed to
+        '_processed', as deferred if the batch skipped it or stopped with an error, or as failed otherwise.
+
+        Args:
+            batch (list): Paths of the folders in priority order.
+        """
+        try:
+            skipped = self.processor.process_batch(batch) or []
+        except Exception as e:
+            logging.error(f"Error processing queued folders {batch}: {str(e)}")
+            # The error may be transient, and the folders after it were not attempted
+            skipped = batch
+        for folder_path in batch:
+            processed_folder = folder_path.replace("_unprocessed", "_processed")
+            if os.path.isdir(processed_folder) and not os.path.exists(folder_path):
+                self.queue.mark(folder_path, "done")
+                continue
+            if folder_path in skipped and self.queue.entries[folder_path].get("attempts", 0) < self.max_retries:
+                attempts = self.queue.defer(folder_path, self.retry_interval)
+                logging.warning(f"Queued folder {folder_path} was not processed; retrying in {self.retry_interval} s "
+                                f"(attempt {attempts} of {self.max_retries})")
+                continue
+            self.queue.mark(folder_path, "failed")
+            logging.error(f"Queued folder {folder_path} was not processed; it is retried once it changes")
+
+def folder_signature(folder_path):
+    """
+    Counts the files below a folder and sums their sizes, to detect uploads still in progress.
+
+    Args:
+        folder_path (str): Path to the folder.
+
+    Returns:
+        tuple: Number of files, total size in bytes and latest directory modification time, see folder_mtime.
+    """
+    count = 0
+    size = 0
+    for root, dirs, files in os.walk(folder_path):
+        for file_name in files:
+            try:
+                size += os.stat(os.path.join(root, file_name)).st_size
+                count += 1
+            except FileNotFoundError:
+                pass
+    return count, size, folder_mtime(folder_path)
+
+def folder_mtime(folder_path):
+    """
+    Determines the latest modification time of a folder and its subfolders, which changes whenever
+    a file is added, removed or renamed below it. Only directories are stat'ed, so this is cheap on
+    network file systems.
+
+    Args:
+        folder_path (str): Path to the folder.
+
+    Returns:
+        int: Latest modification time in nanoseconds, 0 if the folder does not exist.
+    """
+    latest = 0
+    for root, dirs, files in os.walk(folder_path):
+        try:
+            latest = max(latest, os.stat(root).st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return latest
@@ -0,0 +1,37 @@
+import sys
+import logging
+import pytest
+import fake_metashape
+
+# Allow the pipeline to be imported on machines without a Metashape installation
+try:
+    import Metashape
+except ImportError:
+    sys.modules["Metashape"] = fake_metashape
+
+@pytest.fixture
+def fake_metashape_module(monkeypatch):
+    """
+    Replaces Metashape in the processor module with the recording fake.
+    """
+    import pipeline.metashape_processor as metashape_processor
+
+    fake_metashape.reset()
+    monkeypatch.setattr(metashape_processor, "Metashape", fake_metashape)
+    monkeypatch.setattr(metashape_processor, "setup_logger", lambda log_file, *args: logging.getLogger())
+    yield fake_metashape
+    fake_metashape.reset()
+
+@pytest.fixture
+def chunk_project(tmp_path, fake_metashape_module):
+    """
+    A processor with an empty project and stage manifest in its temporary folder, for running single chunks.
+    """
+    from helpers import make_processor
+    from pipeline.metashape_processor import MetashapeProject
+    from pipeline.checkpoint import StageManifest
+
+    processor = make_processor(tmp_path)
+    project = MetashapeProject(str(tmp_path / "tmp" / "project.psx"))
+    manifest = StageManifest(str(tmp_path / "tmp" / "stages.json"))
+    return processor, project, manifest
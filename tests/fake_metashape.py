@@ -0,0 +1,282 @@
+"""
+Stand-in for the Metashape module that records every processing call, so the pipeline
+can be tested without a license, GPUs or image data.
+
+Documents are persisted as small JSON files, which lets tests reopen a saved project
+the same way a resumed run does. Calls can be given a latency, so benchmarks can model the
+time Metashape spends per stage; latencies set in FAKE_METASHAPE_LATENCIES (a JSON object
+of method name -> seconds) also apply in spawned worker processes.
+"""
+import os
+import json
+import time
+import struct
+
+# (chunk label, method name, keyword arguments) of every processing call
+calls = []
+
+# Method name -> exception (or list of exceptions) raised the next time(s) the method is called
+fail_on = {}
+
+# Method name (or 'save') -> seconds every call takes
+latencies = json.loads(os.environ.get("FAKE_METASHAPE_LATENCIES", "{}"))
+
+def reset():
+    """
+    Clears recorded calls and pending failures.
+    """
+    calls.clear()
+    fail_on.clear()
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+MildFiltering = "MildFiltering"
+DepthMapsData = "DepthMapsData"
+PointCloudData = "PointCloudData"
+TiePointsData = "TiePointsData"
+OrthomosaicData = "OrthomosaicData"
+ElevationData = "ElevationData"
+PointCloudFormatLAZ = "PointCloudFormatLAZ"
+MultiplaneLayout = "MultiplaneLayout"
+RasterTransformValue = "RasterTransformValue"
+DataSource = _Namespace(ModelData="ModelData", DepthMapsData="DepthMapsData", ElevationData="ElevationData")
+
+class Vector(list):
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def norm(self):
+        return sum(value * value for value in self) ** 0.5
+
+class _Identity:
+    def __mul__(self, vector):
+        return Vector(vector)
+
+    def t(self):
+        return self
+
+class Region:
+    def __init__(self, center=(0.0, 0.0, 0.0), size=(100.0, 60.0, 10.0)):
+        self.center = Vector(center)
+        self.size = Vector(size)
+        self.rot = _Identity()
+
+def write_geotiff(path, region):
+    """
+    Writes a header-only GeoTIFF covering the region at one unit per pixel.
+    """
+    width, height = round(region.size.x), round(region.size.y)
+    origin = (region.center.x - region.size.x / 2, region.center.y + region.size.y / 2)
+    scale = struct.pack("<3d", 1.0, 1.0, 0.0)
+    tiepoint = struct.pack("<6d", 0.0, 0.0, 0.0, origin[0], origin[1], 0.0)
+    entries = [(256, 4, 1, struct.pack("<I", width)), (257, 4, 1, struct.pack("<I", height)),
+               (258, 3, 1, struct.pack("<HH", 8, 0)), (277, 3, 1, struct.pack("<HH", 1, 0)),
+               (33550, 12, 3, scale), (33922, 12, 6, tiepoint)]
+    data_offset = 8 + 2 + 12 * len(entries) + 4
+    ifd, data = b"", b""
+    for tag, field_type, count, value in entries:
+        if len(value) > 4:
+            ifd += struct.pack("<HHII", tag, field_type, count, data_offset + len(data))
+            data += value
+        else:
+            ifd += struct.pack("<HHI", tag, field_type, count) + value
+    with open(path, 'wb') as file:
+        file.write(b"II*\0" + struct.pack("<I", 8) + struct.pack("<H", len(entries)) + ifd + b"\0\0\0\0" + data)
+
+app = _Namespace(gpu_mask=0, cpu_enable=False, version="2.1.0")
+
+class ImageCompression:
+    TiffCompressionLZW = "LZW"
+
+    def __init__(self):
+        self.tiff_compression = None
+        self.jpeg_quality = None
+        self.tiff_big = False
+        self.tiff_overviews = False
+        self.tiff_tiled = False
+
+class OrthoProjection:
+    Type = _Namespace(Planar="Planar")
+
+    def __init__(self):
+        self.type = None
+        self.crs = None
+
+class CoordinateSystem:
+    def __init__(self, definition):
+        self.definition = definition
+
+    def project(self, point):
+        # Every fake chunk lies in UTM zone 32N
+        return Vector((7.5, 48.0, 0.0))
+
+class _Matrix:
+    def mulp(self, point):
+        return Vector(point)
+
+class Transform:
+    def __init__(self, aligned=False):
+        self.scale = 1.0 if aligned else None
+        self.rotation = 1.0 if aligned else None
+        self.translation = 1.0 if aligned else None
+        self.matrix = _Matrix()
+
+class Camera:
+    _keys = iter(range(1 << 30))
+
+    def __init__(self, path):
+        self.key = next(Camera._keys)
+        self.photo = _Namespace(path=path)
+        self.label = os.path.splitext(os.path.basename(path))[0]
+        self.center = None
+
+def _place(cameras):
+    """
+    Gives aligned cameras a position: 10 units apart along x, 50 units above the ground.
+    """
+    for index, camera in enumerate(cameras):
+        if camera.center is None:
+            camera.center = Vector([index * 10.0, 0.0, 50.0])
+
+class _Data:
+    def __init__(self, product):
+        self.product = product
+
+def _data_property(product):
+    return property(lambda chunk: _Data(product) if product in chunk.products else None)
+
+class Chunk:
+    depth_maps = _data_property("depth_maps")
+    point_cloud = _data_property("point_cloud")
+    model = _data_property("model")
+    elevation = _data_property("dem")
+    orthomosaic = _data_property("orthomosaic")
+
+    def __init__(self, label="Chunk", photos=None, products=None, region=None, document=None):
+        self.label = label
+        self.document = document
+        self.region = Region(*region) if region else Region()
+        self.cameras = [Camera(path) for path in photos or []]
+        self.products = list(products or [])
+        self.transform = Transform(aligned="alignment" in self.products)
+        self.crs = CoordinateSystem("EPSG::4326")
+        if "alignment" in self.products:
+            _place(self.cameras)
+        self.raster_transform = _Namespace(formula=None)
+        self.primary_channel = -1
+
+    def _record(self, method, product=None, progress=None, **kwargs):
+        calls.append((self.label, method, kwargs))
+        if latencies.get(method):
+            time.sleep(latencies[method])
+        if method in fail_on:
+            failure = fail_on.pop(method)
+            # A list fails the next calls in turn
+            if isinstance(failure, list):
+                if failure[1:]:
+                    fail_on[method] = failure[1:]
+                failure = failure[0]
+            raise failure
+        if progress is not None:
+            progress(50.0)
+            progress(100.0)
+        if product and product not in self.products:
+            self.products.append(product)
+
+    def copy(self):
+        self._record("copy")
+        chunk = Chunk(f"Copy of {self.label}", [camera.photo.path for camera in self.cameras], self.products,
+                      [self.region.center, self.region.size], self.document)
+        self.document.chunks.append(chunk)
+        return chunk
+
+    def remove(self, items):
+        for item in items:
+            self._record("remove", product=None, data=item.product)
+            self.products.remove(item.product)
+
+    def addPhotos(self, filenames, **kwargs):
+        self._record("addPhotos", filenames=list(filenames), **kwargs)
+        self.cameras.extend(Camera(path) for path in filenames)
+
+    def matchPhotos(self, **kwargs):
+        self._record("matchPhotos", "tie_points", **kwargs)
+
+    def alignCameras(self, cameras=None, **kwargs):
+        if cameras is not None:
+            kwargs["cameras"] = [camera.key for camera in cameras]
+        self._record("alignCameras", "alignment", **kwargs)
+        self.transform = Transform(aligned=True)
+        _place(self.cameras)
+
+    def buildDepthMaps(self, **kwargs):
+        self._record("buildDepthMaps", "depth_maps", **kwargs)
+
+    def buildPointCloud(self, **kwargs):
+        self._record("buildPointCloud", "point_cloud", **kwargs)
+
+    def buildModel(self, **kwargs):
+        self._record("buildModel", "model", **kwargs)
+
+    def smoothModel(self, **kwargs):
+        self._record("smoothModel", **kwargs)
+
+    def buildDem(self, **kwargs):
+        self._record("buildDem", "dem", **kwargs)
+
+    def buildOrthomosaic(self, **kwargs):
+        self._record("buildOrthomosaic", "orthomosaic", **kwargs)
+
+    def exportPointCloud(self, path, **kwargs):
+        self._record("exportPointCloud", path=path, **kwargs)
+        with open(path, 'wb') as file:
+            file.write(b"fake point cloud")
+
+    def exportRaster(self, path, **kwargs):
+        self._record("exportRaster", path=path, formula=self.raster_transform.formula, **kwargs)
+        if kwargs.get("split_in_blocks"):
+            root, extension = os.path.splitext(path)
+            for block in ("1-1", "1-2"):
+                write_geotiff(f"{root}-{block}{extension}", self.region)
+        else:
+            write_geotiff(path, self.region)
+
+class Document:
+    def __init__(self):
+        self.chunks = []
+        self.path = None
+
+    def addChunk(self):
+        chunk = Chunk(document=self)
+        self.chunks.append(chunk)
+        return chunk
+
+    def remove(self, items):
+        for item in items:
+            self.chunks.remove(item)
+
+    def save(self, path=None):
+        if latencies.get("save"):
+            time.sleep(latencies["save"])
+        self.path = path or self.path
+        data = [{"label": chunk.label,
+                 "photos": [camera.photo.path for camera in chunk.cameras],
+                 "products": chunk.products,
+                 "region": [chunk.region.center, chunk.region.size]} for chunk in self.chunks]
+        with open(self.path, 'w') as file:
+            json.dump({"chunks": data}, file)
+
+    def open(self, path, **kwargs):
+        self.path = path
+        with open(path, 'r') as file:
+            data = json.load(file)
+        self.chunks = [Chunk(document=self, **chunk) for chunk in data["chunks"]]
@@ -0,0 +1,24 @@
+import os
+from pipeline.metashape_processor import MetashapeProcessor
+
+def make_processor(tmp_path):
+    """
+    A processor with the input and temporary folders below tmp_path and no reserved disk space.
+    """
+    config = {
+        "input_folder": str(tmp_path / "input"),
+        "gpu_option": "0",
+        "cpu_enabled": False,
+        "tmp_folder": str(tmp_path / "tmp"),
+        "disk": {"reserve_gb": 0},
+    }
+    os.makedirs(config["input_folder"])
+    os.makedirs(config["tmp_folder"])
+    (tmp_path / "run.log").write_text("")
+    return MetashapeProcessor(config, str(tmp_path / "run.log"))
+
+def stage_calls(fake, method):
+    """
+    The recorded calls of one Metashape method.
+    """
+    return [call for call in fake.calls if call[1] == method]
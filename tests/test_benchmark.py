@@ -0,0 +1,24 @@
+import os
+import sys
+import importlib.util
+
+def load_benchmark():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "benchmark.py")
+    spec = importlib.util.spec_from_file_location("benchmark", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_benchmark_runs_on_small_campaign(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.setattr(sys, "stderr", sys.stderr)
+    benchmark = load_benchmark()
+
+    results = benchmark.run(str(tmp_path), folders=2, subfolders=2, images=5, image_kb=1, latency=0.001,
+                            log_lines=100)
+
+    assert (results["chunks"], results["images"]) == (4, 20)
+    # Every stage call of every chunk took at least its latency
+    assert results["stage_seconds"] >= 4 * 7 * 0.001
+    assert results["process_seconds"] >= results["stage_seconds"]
+    assert sorted(os.listdir(tmp_path / "input")) == ["flight000_processed", "flight001_processed"]
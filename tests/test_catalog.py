@@ -0,0 +1,52 @@
+import os
+from pipeline.catalog import ImageCatalog
+
+def make_flight(tmp_path):
+    subfolder = tmp_path / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(subfolder)
+    for name, size in [("DJI_0001_D.JPG", 10), ("DJI_0001_MS_R.TIF", 3), ("DJI_0001_MS_RE.TIF", 4), ("notes.txt", 1)]:
+        (subfolder / name).write_bytes(b"x" * size)
+    return tmp_path / "flight_unprocessed", subfolder
+
+def test_scan_classifies_channels(tmp_path):
+    flight, subfolder = make_flight(tmp_path)
+    catalog = ImageCatalog()
+
+    [(name, index)] = catalog.flight(str(flight))
+
+    assert name == "sub"
+    assert index.images("R") == [str(subfolder / "DJI_0001_MS_R.TIF")]
+    assert index.images("RE") == [str(subfolder / "DJI_0001_MS_RE.TIF")]
+    assert index.count() == 3
+    assert index.size_bytes("RGB") == 10
+    assert index.size_bytes() == 17
+
+def test_scan_is_cached_until_folder_changes(tmp_path):
+    flight, subfolder = make_flight(tmp_path)
+    catalog = ImageCatalog()
+
+    first = catalog.scan(str(subfolder))
+    assert catalog.scan(str(subfolder)) is first
+
+    (subfolder / "DJI_0002_D.JPG").write_bytes(b"")
+    os.utime(subfolder, ns=(first.mtime_ns + 1, first.mtime_ns + 1))
+    assert catalog.scan(str(subfolder)).count("RGB") == 2
+
+def test_custom_suffix_table(tmp_path):
+    flight, subfolder = make_flight(tmp_path)
+    catalog = ImageCatalog({"RGB": "_D.JPG"})
+
+    assert catalog.scan(str(subfolder)).channels.keys() == {"RGB"}
+
+def test_metadata_index_is_kept_in_tmp_folder(tmp_path):
+    flight, subfolder = make_flight(tmp_path)
+    path = str(subfolder / "DJI_0001_D.JPG")
+
+    assert ImageCatalog().metadata(str(flight), [path]) == {}
+    # The summary only reads headers if enabled; the index is still built on demand
+    catalog = ImageCatalog(tmp_folder=str(tmp_path / "tmp"))
+    assert not catalog.metadata_enabled
+    assert catalog.metadata(str(flight), [path])[path]["latitude"] is None
+
+    assert os.listdir(tmp_path / "tmp" / "metadata") == ["flight.sqlite"]
+    assert "metadata_index.sqlite" not in os.listdir(flight)
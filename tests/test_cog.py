@@ -0,0 +1,106 @@
+import os
+import shutil
+import struct
+from pipeline import cog, tiff
+from pipeline.profiles import build_profiles
+from pipeline.metashape_processor import MetashapeChunkProcessor
+
+def write_tiff(path, images, ifds_first=True):
+    """
+    Writes a TIFF of IFDs only, each image given as (width, tiled, data offset).
+    """
+    ifds = []
+    for width, tiled, data_offset in images:
+        entries = [(256, 4, width), (257, 4, width)]
+        entries += [(322, 4, 256), (324, 4, data_offset)] if tiled else [(273, 4, data_offset)]
+        ifds.append(entries)
+
+    start = 8 if ifds_first else 100000
+    offsets = []
+    for entries in ifds:
+        offsets.append(start)
+        start += 2 + 12 * len(entries) + 4
+    content = bytearray(b"II*\0" + struct.pack("<I", offsets[0]))
+    for index, entries in enumerate(ifds):
+        next_offset = offsets[index + 1] if index + 1 < len(ifds) else 0
+        ifd = struct.pack("<H", len(entries))
+        ifd += b"".join(struct.pack("<HHII", tag, field_type, 1, value) for tag, field_type, value in entries)
+        ifd += struct.pack("<I", next_offset)
+        content = content.ljust(offsets[index], b"\0") + ifd
+    with open(path, 'wb') as file:
+        file.write(bytes(content))
+
+def make_processor(chunk, **export_params):
+    params = build_profiles()["standard"]
+    params["export_raster"].update(export_params)
+    return MetashapeChunkProcessor(chunk, params)
+
+def test_utm_crs():
+    assert cog.utm_crs(7.5, 48.0) == "EPSG::32632"
+    assert cog.utm_crs(-70.6, -33.4) == "EPSG::32719"
+    assert cog.utm_crs(180.0, 10.0) == "EPSG::32660"
+
+def test_cog_options():
+    options = cog.cog_options({"compression": "ZSTD", "predictor": 2, "block_size": 256})
+    assert options[:2] == ["COMPRESS=ZSTD", "BLOCKSIZE=256"]
+    assert "PREDICTOR=2" in options
+
+    options = cog.cog_options({"compression": "JPEG", "predictor": 2})
+    assert "QUALITY=90" in options and not any(option.startswith("PREDICTOR") for option in options)
+
+def test_validate_cog(tmp_path):
+    path = str(tmp_path / "valid.tif")
+    write_tiff(path, [(2048, True, 90000), (1024, True, 80000), (512, True, 70000)])
+    assert tiff.validate_cog(path) == []
+
+    path = str(tmp_path / "striped.tif")
+    write_tiff(path, [(2048, False, 1000)])
+    assert tiff.validate_cog(path) == ["the image is not tiled", "the image has no overviews"]
+
+    path = str(tmp_path / "unordered.tif")
+    write_tiff(path, [(2048, True, 70000), (1024, True, 80000)])
+    assert tiff.validate_cog(path) == ["data of overview 1 is stored after the larger image before it"]
+
+    path = str(tmp_path / "trailing_ifds.tif")
+    write_tiff(path, [(2048, True, 90000), (1024, True, 80000)], ifds_first=False)
+    assert tiff.validate_cog(path) == ["IFDs are not at the start of the file"]
+    assert not cog.check_cogs([path])
+
+def test_export_crs(fake_metashape_module):
+    chunk = fake_metashape_module.Chunk(products=["alignment"])
+
+    assert make_processor(chunk, crs="utm")._export_crs().definition == "EPSG::32632"
+    assert make_processor(chunk, crs="native")._export_crs() is chunk.crs
+    assert make_processor(chunk)._export_crs().definition == "EPSG::4326"
+
+def test_cog_export_falls_back_without_gdal(tmp_path, fake_metashape_module, monkeypatch):
+    monkeypatch.setattr(cog, "gdal", None)
+    chunk = fake_metashape_module.Chunk(products=["alignment", "dem"])
+
+    make_processor(chunk, cog=True).export_dem(str(tmp_path))
+
+    call = fake_metashape_module.calls[-1]
+    assert call[2]["path"] == str(tmp_path / "Chunk_dem.tif")
+    assert call[2]["image_compression"].tiff_overviews
+    assert os.listdir(tmp_path) == ["Chunk_dem.tif"]
+
+def test_cog_export_in_blocks(tmp_path, fake_metashape_module, monkeypatch):
+    converted = []
+    def write_cogs(sources, destinations, params, workers):
+        converted.append(workers)
+        for source, destination in zip(sources, destinations):
+            shutil.copy(source, destination)
+    monkeypatch.setattr(cog, "gdal", object())
+    monkeypatch.setattr(cog, "write_cogs", write_cogs)
+    chunk = fake_metashape_module.Chunk(products=["alignment", "dem"])
+
+    make_processor(chunk, cog=True, split_blocks=4096, workers=2).export_dem(str(tmp_path))
+
+    call = fake_metashape_module.calls[-1]
+    assert call[2]["path"] == str(tmp_path / "Chunk_dem.raw.tif")
+    assert (call[2]["block_width"], call[2]["image_compression"].tiff_overviews) == (4096, False)
+    assert converted == [2]
+    assert sorted(os.listdir(tmp_path)) == ["Chunk_dem.vrt", "Chunk_dem_blocks"]
+    blocks_folder = tmp_path / "Chunk_dem_blocks"
+    assert cog.raster_files(str(tmp_path / "Chunk_dem.tif")) == [str(blocks_folder / "Chunk_dem-1-1.tif"),
+                                                                str(blocks_folder / "Chunk_dem-1-2.tif")]
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from pipeline.catalog import FolderIndex
+from pipeline.grouping import FlightGrouper
+
+START = datetime(2024, 5, 1, 10, 0, 0)
+
+def make_flight(subfolders):
+    """
+    Builds a flight from {subfolder: [(seconds after START, latitude offset in meters)]}.
+    """
+    flight = []
+    metadata = {}
+    for name, photos in subfolders.items():
+        entries = []
+        for number, (seconds, meters) in enumerate(photos):
+            path = f"/flight/photos/{name}/DJI_{number:04d}.JPG"
+            entries.append((path, 100))
+            metadata[path] = {"captured_at": (START + timedelta(seconds=seconds)).isoformat(),
+                              "latitude": 48.0 + meters / 111320.0, "longitude": 7.5}
+        flight.append((name, FolderIndex(f"/flight/photos/{name}", 1, {"RGB": entries})))
+    return flight, metadata
+
+def names(flight):
+    return [name for name, index in flight]
+
+def test_grouping_merges_subfolders_of_one_flight():
+    flight, metadata = make_flight({
+        "a": [(0, 0), (2, 10), (4, 20)],
+        # Second battery, continuing next to where the first one stopped
+        "b": [(900, 40), (902, 50)],
+    })
+
+    regrouped = FlightGrouper({"enabled": True}).group(flight, metadata)
+
+    assert names(regrouped) == ["a_to_b"]
+    assert regrouped[0][1].members == ["a", "b"]
+    assert regrouped[0][1].count("RGB") == 5
+
+def test_grouping_splits_disjoint_flights_in_one_subfolder():
+    flight, metadata = make_flight({
+        "a": [(0, 0), (2, 10), (4000, 5000), (4002, 5010)],
+    })
+
+    regrouped = FlightGrouper({"enabled": True}).group(flight, metadata)
+
+    assert names(regrouped) == ["a_flight01", "a_flight02"]
+    assert [index.count() for name, index in regrouped] == [2, 2]
+
+def test_grouping_keeps_distant_flights_apart():
+    flight, metadata = make_flight({
+        "a": [(0, 0), (2, 10)],
+        "b": [(600, 2000), (602, 2010)],
+    })
+
+    regrouped = FlightGrouper({"enabled": True}).group(flight, metadata)
+
+    assert names(regrouped) == ["a", "b"]
+    assert regrouped[0][1].path == "/flight/photos/a"
+
+def test_grouping_needs_capture_times():
+    flight, metadata = make_flight({"a": [(0, 0)], "b": [(2, 10)]})
+    metadata[flight[1][1].images("RGB")[0]]["captured_at"] = None
+
+    assert FlightGrouper({"enabled": True}).group(flight, metadata) is flight
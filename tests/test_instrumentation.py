@@ -0,0 +1,58 @@
+import csv
+import json
+import pytest
+from pipeline.instrumentation import StageRecorder, directory_size
+
+def test_measure_records_stage(tmp_path):
+    recorder = StageRecorder(str(tmp_path))
+
+    with recorder.measure("flight_RGB", "build_depth_maps", image_count=3, gpu_mask=1):
+        (tmp_path / "depth.bin").write_bytes(b"x" * 100)
+
+    [record] = recorder.records
+    assert record["stage"] == "build_depth_maps"
+    assert record["status"] == "ok"
+    assert record["disk_bytes_written"] == 100
+    assert record["image_count"] == 3
+    assert record["wall_seconds"] >= 0
+
+def test_measure_counts_only_the_given_files(tmp_path):
+    recorder = StageRecorder(str(tmp_path))
+    own = tmp_path / "chunk.files"
+    own.mkdir()
+
+    with recorder.measure("flight_RGB", "build_depth_maps", size=lambda: directory_size(str(own))):
+        (own / "depth.bin").write_bytes(b"x" * 100)
+        # Written by another chunk meanwhile
+        (tmp_path / "other.bin").write_bytes(b"x" * 1000)
+
+    assert recorder.records[0]["disk_bytes_written"] == 100
+    assert "process_peak_rss_mb" in recorder.records[0]
+
+def test_measure_records_failed_stage(tmp_path):
+    recorder = StageRecorder(str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        with recorder.measure("flight_RGB", "build_model"):
+            raise RuntimeError("out of memory")
+
+    assert recorder.records[0]["status"] == "failed"
+
+def test_write_report(tmp_path):
+    recorder = StageRecorder(str(tmp_path))
+    with recorder.measure("flight_RGB", "align_photos"):
+        pass
+    with recorder.measure("flight_NIR", "align_photos"):
+        pass
+
+    json_path, csv_path = recorder.write_report(str(tmp_path), "flight", {"metashape_version": "2.1.0"})
+
+    with open(json_path) as file:
+        report = json.load(file)
+    assert report["metashape_version"] == "2.1.0"
+    assert report["stage_totals"]["align_photos"]["count"] == 2
+    with open(csv_path) as file:
+        assert len(list(csv.DictReader(file))) == 2
+
+def test_directory_size_missing_folder(tmp_path):
+    assert directory_size(str(tmp_path / "missing")) == 0
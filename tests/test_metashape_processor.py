@@ -0,0 +1,367 @@
+import os
+import pytest
+from pipeline.checkpoint import StageManifest, ImageManifest, SavePolicy
+from pipeline.scheduler import ChunkScheduler, ChunkJob
+from pipeline.metashape_processor import MetashapeProject
+from pipeline.planner import DiskPlanner
+import fake_metashape
+from helpers import make_processor, stage_calls
+
+def test_process_chunk_records_stages(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG", "b.JPG"]), str(tmp_path / "tmp"))
+
+    # The point cloud is not needed for the orthomosaic and is pruned
+    assert manifest.completed_stages("flight_RGB") == [
+        "add_photos", "align_photos", "build_depth_maps", "build_model",
+        "smooth_model", "build_orthomosaic", "export_raster"]
+    assert os.path.exists(tmp_path / "tmp" / "flight_RGB_orthomosaic.tif")
+
+def test_process_chunk_reports_progress(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    updates = []
+    processor.progress.update = lambda value: updates.append((processor.progress.current["stage"], value))
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG", "b.JPG"]), str(tmp_path / "tmp"))
+
+    # Matching and aligning each make up half of the alignment
+    assert updates[:4] == [("align_photos", 25.0), ("align_photos", 50.0),
+                           ("align_photos", 75.0), ("align_photos", 100.0)]
+    assert ("export_raster", 100.0) in updates
+    assert processor.progress.chunks["flight_RGB"]["remaining"] == []
+    assert os.path.exists(tmp_path / "tmp" / "status.json")
+
+def test_process_chunk_resumes_after_failure(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    project_path = str(tmp_path / "tmp" / "project.psx")
+    manifest_path = str(tmp_path / "tmp" / "stages.json")
+    images = ["a.JPG", "b.JPG"]
+
+    fake_metashape_module.fail_on["buildModel"] = RuntimeError("killed")
+    with pytest.raises(RuntimeError):
+        processor.process_chunk(MetashapeProject(project_path), StageManifest(manifest_path),
+                                ChunkJob("flight_RGB", images), str(tmp_path / "tmp"))
+
+    fake_metashape_module.calls.clear()
+    processor.process_chunk(MetashapeProject(project_path), StageManifest(manifest_path),
+                            ChunkJob("flight_RGB", images), str(tmp_path / "tmp"))
+
+    assert not stage_calls(fake_metashape_module, "addPhotos")
+    assert not stage_calls(fake_metashape_module, "matchPhotos")
+    assert not stage_calls(fake_metashape_module, "buildDepthMaps")
+    assert len(stage_calls(fake_metashape_module, "buildModel")) == 1
+    assert len(stage_calls(fake_metashape_module, "exportRaster")) == 1
+
+def test_process_chunk_restarts_when_images_change(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    project_path = str(tmp_path / "tmp" / "project.psx")
+    manifest_path = str(tmp_path / "tmp" / "stages.json")
+
+    processor.process_chunk(MetashapeProject(project_path), StageManifest(manifest_path),
+                            ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+    fake_metashape_module.calls.clear()
+
+    project = MetashapeProject(project_path)
+    processor.process_chunk(project, StageManifest(manifest_path),
+                            ChunkJob("flight_RGB", ["a.JPG", "b.JPG"]), str(tmp_path / "tmp"))
+
+    assert len(project.doc.chunks) == 1
+    assert len(stage_calls(fake_metashape_module, "matchPhotos")) == 1
+
+def test_save_points_limit_saves(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    project.save_policy = SavePolicy({"points": ["build_model"]})
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+
+    # One save after build_model and one when the chunk is finished
+    assert len(project.save_timings) == 2
+    assert manifest.completed_stages("flight_RGB")[-1] == "export_raster"
+
+def test_stage_manifest_invalidates_later_stages(tmp_path):
+    manifest = StageManifest(str(tmp_path / "stages.json"))
+    manifest.mark_complete("c", "align_photos", {"downscale": 1})
+    manifest.mark_complete("c", "build_depth_maps", {"downscale": 2})
+
+    reloaded = StageManifest(str(tmp_path / "stages.json"))
+    assert reloaded.is_complete("c", "align_photos", {"downscale": 1})
+    assert not reloaded.is_complete("c", "align_photos", {"downscale": 2})
+
+    reloaded.invalidate_from("c", "align_photos")
+    assert reloaded.completed_stages("c") == []
+
+def test_image_manifest_finds_new_captures(tmp_path):
+    folder = str(tmp_path / "flight_unprocessed")
+    images = [os.path.join(folder, "sub", f"DJI_{capture}_{band}.TIF") for capture in (1, 2) for band in "GR"]
+    manifest = ImageManifest(str(tmp_path / "images.json"))
+    manifest.record(folder, [ChunkJob("sub_MS", images[:2], ["G", "R"])])
+
+    moved = str(tmp_path / "flight_processed")
+    reloaded = ImageManifest(str(tmp_path / "images.json"))
+    job = ChunkJob("sub_MS", [image.replace(folder, moved) for image in images], ["G", "R"])
+    assert reloaded.new_images(moved, job) == job.image_list[2:]
+    assert reloaded.moved_paths(moved)[images[0]] == job.image_list[0]
+    assert ImageManifest(str(tmp_path / "missing.json")).new_images(moved, job) == job.image_list
+
+def test_image_manifest_keeps_members_of_regrouped_chunks(tmp_path):
+    folder = str(tmp_path / "flight_unprocessed")
+    job = ChunkJob("a_to_c_RGB", [os.path.join(folder, "a", "DJI_0001_D.JPG")], members=["a", "b", "c"])
+    ImageManifest(str(tmp_path / "images.json")).record(folder, [job, ChunkJob("d_RGB", [])])
+
+    assert ImageManifest(str(tmp_path / "images.json")).members == {"a_to_c_RGB": ["a", "b", "c"]}
+
+def test_chunk_scheduler_worker_slots():
+    config = {"parallel": {"max_workers": 4, "gpu_devices": [0, 1], "cpu_workers": 1}}
+    scheduler = ChunkScheduler(config, "run.log")
+
+    assert scheduler.worker_slots() == ["0", "1", "cpu"]
+    assert scheduler.max_workers == 3
+    assert scheduler.enabled
+    assert not ChunkScheduler({}, "run.log").enabled
+
+def test_folder_processing_sequential(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    for name in ["DJI_0001_D.JPG", "DJI_0002_D.JPG", "DJI_0001_MS_NIR.TIF"]:
+        (flight / name).write_bytes(b"")
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    export = tmp_path / "input" / "flight_processed" / "export"
+    assert sorted(os.listdir(export)) == [
+        "flight_unprocessed_run_report.csv", "flight_unprocessed_run_report.json",
+        "sub_NIR_orthomosaic.tif", "sub_RGB_orthomosaic.tif"]
+
+def test_multiplane_mode_aligns_bands_once(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.multispectral = {"mode": "multiplane", "bands": ["G", "NIR"], "master_band": "NIR"}
+    flight = tmp_path / "input" / "flight_unprocessed"
+    os.makedirs(flight / "photos" / "sub")
+    for name in ["DJI_0001_D.JPG", "DJI_0001_MS_G.TIF", "DJI_0001_MS_NIR.TIF",
+                 "DJI_0002_MS_G.TIF", "DJI_0002_MS_NIR.TIF", "DJI_0003_MS_G.TIF"]:
+        (flight / "photos" / "sub" / name).write_bytes(b"")
+
+    jobs = processor.collect_chunk_jobs(str(flight))
+    assert [(job.chunk_name, len(job.image_list), job.bands) for job in jobs] == [
+        ("sub_RGB", 1, None), ("sub_MS", 4, ["G", "NIR"])]
+
+    processor.process_chunk(project, manifest, jobs[1], str(tmp_path / "tmp"))
+
+    assert len(stage_calls(fake_metashape, "matchPhotos")) == 1
+    assert project.find_chunk("sub_MS").primary_channel == 1
+    exports = stage_calls(fake_metashape, "exportRaster")
+    assert [(os.path.basename(kwargs["path"]), kwargs["formula"]) for label, method, kwargs in exports] == [
+        ("sub_G_orthomosaic.tif", ["B1"]), ("sub_NIR_orthomosaic.tif", ["B2"])]
+
+def test_profiles_select_stage_parameters(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.config["channel_profiles"] = {"NIR": "high"}
+    flight = tmp_path / "input" / "flight_unprocessed"
+    os.makedirs(flight / "photos" / "sub")
+    for name in ["DJI_0001_D.JPG", "DJI_0001_MS_NIR.TIF"]:
+        (flight / "photos" / "sub" / name).write_bytes(b"")
+
+    jobs = processor.collect_chunk_jobs(str(flight))
+    assert [(job.chunk_name, job.profile) for job in jobs] == [("sub_RGB", "standard"), ("sub_NIR", "high")]
+
+    processor.process_chunk(project, manifest, jobs[1], str(tmp_path / "tmp"))
+
+    [(label, method, kwargs)] = stage_calls(fake_metashape, "buildDepthMaps")
+    assert kwargs["downscale"] == 1
+
+def test_preview_pass_exports_before_full_pass(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    processor.preview = {"enabled": True}
+    flight = tmp_path / "input" / "flight_unprocessed"
+    os.makedirs(flight / "photos" / "sub")
+    (flight / "photos" / "sub" / "DJI_0001_D.JPG").write_bytes(b"")
+
+    processor.process_preview(str(flight))
+
+    assert os.path.exists(flight / "export" / "sub_RGB_preview_orthomosaic.tif")
+    assert not stage_calls(fake_metashape_module, "buildDepthMaps")
+    [(label, method, kwargs)] = stage_calls(fake_metashape_module, "buildDem")
+    assert kwargs["source_data"] == "TiePointsData"
+    assert not os.path.exists(tmp_path / "tmp" / "flight_unprocessed" / "preview")
+
+    processor.process_folders()
+
+    export = tmp_path / "input" / "flight_processed" / "export"
+    assert "sub_RGB_preview_orthomosaic.tif" in os.listdir(export)
+    assert "sub_RGB_orthomosaic.tif" in os.listdir(export)
+    assert not os.path.exists(tmp_path / "input" / "flight_processed" / "preview")
+
+def test_requested_outputs_add_stages(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.outputs = ["orthomosaic", "point_cloud"]
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+
+    assert "build_point_cloud" in manifest.completed_stages("flight_RGB")
+    assert os.path.exists(tmp_path / "tmp" / "flight_RGB_point_cloud.laz")
+
+def test_project_retention_purges_depth_maps(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.retention = "project"
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+
+    chunk = project.find_chunk("flight_RGB")
+    assert chunk.depth_maps is None
+    assert chunk.model is not None
+
+    # Smoothing again does not need the purged depth maps
+    processor.profiles["standard"]["smooth_model"]["strength"] = 3
+    fake_metashape.reset()
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+    assert [method for label, method, kwargs in fake_metashape.calls] == [
+        "smoothModel", "buildOrthomosaic", "exportRaster"]
+
+    # Rebuilding the model does
+    manifest.invalidate_from("flight_RGB", "build_model")
+    fake_metashape.reset()
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+    assert [method for label, method, kwargs in fake_metashape.calls] == [
+        "buildDepthMaps", "buildModel", "remove", "smoothModel", "buildOrthomosaic", "exportRaster"]
+
+def test_ortho_retention_keeps_only_exports(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    processor.retention = "ortho"
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    (flight / "DJI_0001_D.JPG").write_bytes(b"")
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    processed = tmp_path / "input" / "flight_processed"
+    assert not os.path.exists(processed / "project.psx")
+    assert not os.path.exists(processed / "stages.json")
+    assert "sub_RGB_orthomosaic.tif" in os.listdir(processed / "export")
+
+def test_disk_planner_defers_and_learns(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    (flight / "DJI_0001_D.JPG").write_bytes(b"x" * 1000)
+
+    [job] = processor.collect_chunk_jobs(str(tmp_path / "input" / "flight_unprocessed"))
+    assert job.input_bytes == 1000
+    assert processor.estimate_folder(str(tmp_path / "input" / "flight_unprocessed")) == 4160
+    # A preview project does not count as progress of the full-resolution run
+    os.makedirs(tmp_path / "tmp" / "flight_unprocessed" / "preview")
+    (tmp_path / "tmp" / "flight_unprocessed" / "preview" / "preview.psx").write_bytes(b"x" * 1000)
+    assert processor.estimate_folder(str(tmp_path / "input" / "flight_unprocessed")) == 4160
+
+    processor.planner.reserve_bytes = processor.planner.free_bytes() + processor.planner.reserve_bytes
+    assert not processor.admit(str(tmp_path / "input" / "flight_unprocessed"))
+
+    processor.planner.reserve_bytes = 0
+    processor.process_folders()
+
+    # Learned from the fake run, which writes a few bytes per stage
+    assert "standard/build_depth_maps" in processor.planner.ratios
+    assert os.path.exists(processor.planner.history_file)
+
+def test_disk_planner_before_tmp_folder_exists(tmp_path):
+    planner = DiskPlanner(str(tmp_path / "missing" / "tmp"), {"reserve_gb": 0})
+
+    assert planner.free_bytes() > 0
+    assert not os.path.exists(tmp_path / "missing")
+
+def test_tiling_runs_dense_stages_per_tile(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.tiling = {"enabled": True, "tile_size": 50, "overlap": 5}
+    export = tmp_path / "tmp" / "export"
+    os.makedirs(export)
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(export))
+
+    assert len(stage_calls(fake_metashape, "matchPhotos")) == 1
+    assert len(stage_calls(fake_metashape, "buildDepthMaps")) == 4
+    assert len(os.listdir(export / "flight_RGB_tiles")) == 4
+    assert (export / "flight_RGB_orthomosaic.vrt").read_text().count("<ComplexSource>") == 4
+
+    # Resuming skips the finished tiles
+    fake_metashape.reset()
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(export))
+    assert fake_metashape.calls == []
+
+def test_pipelined_folders_overlap_staging_and_transfer(tmp_path, fake_metashape_module, monkeypatch):
+    import threading
+    processor = make_processor(tmp_path)
+    processor.pipelining = {"enabled": True}
+    for name in ["a_unprocessed", "b_unprocessed", "c_unprocessed"]:
+        os.makedirs(tmp_path / "input" / name / "photos" / "sub")
+        (tmp_path / "input" / name / "photos" / "sub" / "DJI_0001_D.JPG").write_bytes(b"x")
+
+    events = []
+    second_prepared = threading.Event()
+    prepare, run, finish = processor.prepare_folder, processor.run_folder, processor.finish_folder
+    def prepare_folder(folder_path, reserved_bytes=0):
+        chunk_jobs = prepare(folder_path, reserved_bytes)
+        events.append(("prepare", os.path.basename(folder_path)))
+        if folder_path.endswith("b_unprocessed"):
+            second_prepared.set()
+        return chunk_jobs
+    def run_folder(folder_path, chunk_jobs):
+        # The next folder is prepared while the first one is processed
+        if folder_path.endswith("a_unprocessed"):
+            assert second_prepared.wait(5)
+        events.append(("run", os.path.basename(folder_path)))
+        return run(folder_path, chunk_jobs)
+    def finish_folder(folder_path, errors=None):
+        finish(folder_path, errors)
+        events.append(("finish", os.path.basename(folder_path)))
+    monkeypatch.setattr(processor, "prepare_folder", prepare_folder)
+    monkeypatch.setattr(processor, "run_folder", run_folder)
+    monkeypatch.setattr(processor, "finish_folder", finish_folder)
+
+    processor.process_folders()
+
+    assert sorted(os.listdir(tmp_path / "input")) == ["a_processed", "b_processed", "c_processed"]
+    assert events.index(("prepare", "b_unprocessed")) < events.index(("run", "a_unprocessed"))
+    # The transfer of a folder finishes before the next transfer starts
+    finished = [name for event, name in events if event == "finish"]
+    assert finished == ["a_unprocessed", "b_unprocessed", "c_unprocessed"]
+
+def test_update_processed_folder_adds_only_new_images(tmp_path, fake_metashape_module):
+    import json
+    processor = make_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    for name in ["DJI_0001_D.JPG", "DJI_0002_D.JPG"]:
+        (flight / name).write_bytes(b"")
+    processor.process_folders()
+
+    processed = tmp_path / "input" / "flight_processed"
+    new_image = processed / "photos" / "sub" / "DJI_0003_D.JPG"
+    new_image.write_bytes(b"")
+    processor.incremental = {"enabled": True, "neighbors": 1}
+    fake_metashape_module.reset()
+    processor.process_folders()
+
+    [add_photos] = stage_calls(fake_metashape_module, "addPhotos")
+    assert add_photos[2]["filenames"] == [str(new_image)]
+    [match] = stage_calls(fake_metashape_module, "matchPhotos")
+    assert match[2]["reset_matches"] is False
+    [align] = stage_calls(fake_metashape_module, "alignCameras")
+    assert align[2]["reset_alignment"] is False and len(align[2]["cameras"]) == 1
+    # The new camera and its closest neighbor
+    [depth_maps] = stage_calls(fake_metashape_module, "buildDepthMaps")
+    assert len(depth_maps[2]["cameras"]) == 2 and depth_maps[2]["reuse_depth"]
+    # Only the changed region is rebuilt and exported
+    assert [call[0] for call in stage_calls(fake_metashape_module, "buildOrthomosaic")] == ["sub_RGB_update01"]
+    assert os.listdir(processed / "export" / "sub_RGB_updates") == ["sub_RGB_update01_orthomosaic.tif"]
+    assert (processed / "export" / "sub_RGB_orthomosaic.vrt").read_text().count("<ComplexSource>") == 2
+
+    # The project refers to the images in the renamed folder
+    with open(processed / "project.psx") as file:
+        photos = json.load(file)["chunks"][0]["photos"]
+    assert photos == [str(processed / "photos" / "sub" / name)
+                      for name in ["DJI_0001_D.JPG", "DJI_0002_D.JPG", "DJI_0003_D.JPG"]]
+
+    fake_metashape_module.reset()
+    assert processor.update_processed_folder(str(processed)) == 0
+    assert fake_metashape_module.calls == []
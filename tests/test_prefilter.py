@@ -0,0 +1,186 @@
+import os
+import csv
+import struct
+import pytest
+from pipeline import metadata
+from pipeline.metadata import MetadataIndex, read_metadata, summarize
+from pipeline.prefilter import PhotoFilter, position_distance, write_report
+from pipeline.scheduler import ChunkJob
+
+def _ifd(entries, offset, next_offset=0):
+    """
+    Packs a little-endian IFD at the given offset; entries are (tag, type, count, value bytes).
+    """
+    data = struct.pack("<H", len(entries))
+    extra = b""
+    extra_offset = offset + 2 + 12 * len(entries) + 4
+    for tag, field_type, count, value in entries:
+        if len(value) <= 4:
+            data += struct.pack("<HHI", tag, field_type, count) + value.ljust(4, b"\0")
+        else:
+            data += struct.pack("<HHII", tag, field_type, count, extra_offset + len(extra))
+            extra += value
+    return data + struct.pack("<I", next_offset) + extra
+
+def _rational(*values):
+    return b"".join(struct.pack("<II", round(value * 1000), 1000) for value in values)
+
+def write_jpeg(path, latitude, longitude, altitude, captured_at="2024:05:01 10:00:00", relative_altitude=None):
+    """
+    Writes a JPEG header with EXIF capture time and GPS position, optional DJI XMP and a frame size.
+    """
+    gps = _ifd([
+        (1, 2, 2, b"N\0"),
+        (2, 5, 3, _rational(latitude, 0, 0)),
+        (3, 2, 2, b"E\0"),
+        (4, 5, 3, _rational(longitude, 0, 0)),
+        (6, 5, 1, _rational(altitude)),
+    ], 100)
+    exif = _ifd([(36867, 2, 20, captured_at.encode() + b"\0")], 300)
+    ifd0 = _ifd([(34665, 4, 1, struct.pack("<I", 300)), (34853, 4, 1, struct.pack("<I", 100))], 8)
+    tiff = (b"II*\0" + struct.pack("<I", 8) + ifd0).ljust(100, b"\0")
+    tiff = (tiff + gps).ljust(300, b"\0") + exif
+
+    segments = [b"\xff\xe1" + struct.pack(">H", len(tiff) + 8) + b"Exif\0\0" + tiff]
+    if relative_altitude is not None:
+        xmp = (b"http://ns.adobe.com/xap/1.0/\0"
+               + f'<rdf:Description drone-dji:RelativeAltitude="+{relative_altitude}"/>'.encode())
+        segments.append(b"\xff\xe1" + struct.pack(">H", len(xmp) + 2) + xmp)
+    segments.append(b"\xff\xc0" + struct.pack(">HBHHB", 8, 8, 3000, 4000, 0))
+    with open(path, 'wb') as file:
+        file.write(b"\xff\xd8" + b"".join(segments) + b"\xff\xda\0\2" + b"\0" * 64 + b"\xff\xd9")
+    return str(path)
+
+def test_read_metadata_from_jpeg_header(tmp_path):
+    path = write_jpeg(tmp_path / "DJI_0001.JPG", 48.0, 7.5, 300.0, relative_altitude=80.5)
+
+    metadata = read_metadata(path)
+
+    assert (metadata["width"], metadata["height"]) == (4000, 3000)
+    assert metadata["captured_at"] == "2024-05-01T10:00:00"
+    assert metadata["latitude"] == pytest.approx(48.0)
+    assert metadata["longitude"] == pytest.approx(7.5)
+    assert metadata["altitude"] == pytest.approx(300.0)
+    assert metadata["relative_altitude"] == pytest.approx(80.5)
+
+def test_read_metadata_rejects_unknown_format(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not an image")
+
+    with pytest.raises(ValueError):
+        read_metadata(str(path))
+
+def count_reads(monkeypatch):
+    calls = []
+    def read(path):
+        calls.append(path)
+        return read_metadata(path)
+    monkeypatch.setattr(metadata, "read_metadata", read)
+    return calls
+
+def test_metadata_index_reads_only_new_or_changed_images(tmp_path, monkeypatch):
+    paths = [write_jpeg(tmp_path / f"DJI_{index:04d}.JPG", 48.0 + index / 1000, 7.5, 300.0) for index in range(3)]
+    calls = count_reads(monkeypatch)
+
+    first = MetadataIndex(str(tmp_path)).update(paths)
+    assert len(calls) == 3
+    assert first[paths[1]]["latitude"] == pytest.approx(48.001)
+
+    assert MetadataIndex(str(tmp_path)).update(paths) == first
+    assert len(calls) == 3
+
+    write_jpeg(tmp_path / "DJI_0001.JPG", 49.0, 7.5, 300.0)
+    stat = os.stat(paths[1])
+    os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert MetadataIndex(str(tmp_path)).update(paths)[paths[1]]["latitude"] == pytest.approx(49.0)
+    assert calls[3:] == [paths[1]]
+
+def test_metadata_index_survives_folder_rename(tmp_path, monkeypatch):
+    folder = tmp_path / "flight_unprocessed"
+    os.makedirs(folder)
+    MetadataIndex(str(folder)).update([write_jpeg(folder / "DJI_0001.JPG", 48.0, 7.5, 300.0)])
+    os.rename(folder, tmp_path / "flight_processed")
+    calls = count_reads(monkeypatch)
+
+    path = str(tmp_path / "flight_processed" / "DJI_0001.JPG")
+    assert MetadataIndex(str(tmp_path / "flight_processed")).update([path])[path]["altitude"] == pytest.approx(300.0)
+    assert calls == []
+
+def test_metadata_index_keeps_unreadable_images(tmp_path):
+    path = tmp_path / "DJI_0001.JPG"
+    path.write_bytes(b"not a jpeg")
+
+    assert MetadataIndex(str(tmp_path)).update([str(path)])[str(path)]["latitude"] is None
+
+def test_summarize():
+    summary = summarize([
+        {"captured_at": "2024-05-01T10:05:00", "latitude": 48.1, "longitude": 7.4},
+        {"captured_at": "2024-05-01T10:00:00", "latitude": 48.0, "longitude": 7.6},
+        {"captured_at": None, "latitude": None, "longitude": None},
+    ])
+
+    assert summary == {"count": 3, "with_gps": 2, "first": "2024-05-01T10:00:00", "last": "2024-05-01T10:05:00",
+                       "bbox": (48.0, 7.4, 48.1, 7.6)}
+
+def test_filter_is_disabled_by_default(tmp_path):
+    paths = [write_jpeg(tmp_path / f"DJI_{index:04d}.JPG", 48.0, 7.5, 300.0, relative_altitude=1.0)
+             for index in range(3)]
+
+    assert PhotoFilter().filter(paths) == (paths, {})
+
+def test_filter_drops_photos_below_min_altitude(tmp_path):
+    low = write_jpeg(tmp_path / "DJI_0001.JPG", 48.0, 7.5, 250.0, relative_altitude=2.0)
+    high = write_jpeg(tmp_path / "DJI_0002.JPG", 48.001, 7.5, 330.0, relative_altitude=80.0)
+
+    kept, excluded = PhotoFilter({"enabled": True, "min_altitude": 20}).filter([low, high])
+
+    assert kept == [high]
+    assert excluded == {low: ("below_min_altitude", 2.0)}
+
+def test_filter_uses_lowest_gps_altitude_without_xmp(tmp_path):
+    ground = write_jpeg(tmp_path / "DJI_0001.JPG", 48.0, 7.5, 250.0)
+    high = write_jpeg(tmp_path / "DJI_0002.JPG", 48.001, 7.5, 330.0)
+
+    kept, excluded = PhotoFilter({"enabled": True, "min_altitude": 20}).filter([ground, high])
+
+    assert kept == [high]
+    assert excluded[ground] == ("below_min_altitude", 0.0)
+
+def test_filter_drops_hovering_duplicates(tmp_path):
+    first = write_jpeg(tmp_path / "DJI_0001.JPG", 48.0, 7.5, 300.0, "2024:05:01 10:00:00")
+    hover = write_jpeg(tmp_path / "DJI_0002.JPG", 48.0, 7.5, 300.0, "2024:05:01 10:00:02")
+    moved = write_jpeg(tmp_path / "DJI_0003.JPG", 48.001, 7.5, 300.0, "2024:05:01 10:00:04")
+
+    kept, excluded = PhotoFilter({"enabled": True, "duplicate_distance": 1.0}).filter([first, hover, moved])
+
+    assert kept == [first, moved]
+    assert list(excluded) == [hover]
+    assert excluded[hover][0] == "duplicate_position"
+
+def test_filter_keeps_or_drops_multispectral_captures_whole(tmp_path):
+    paths = []
+    for capture, height in enumerate([2.0, 80.0]):
+        for band in ["G", "R"]:
+            paths.append(write_jpeg(tmp_path / f"DJI_{capture:04d}_{band}.TIF", 48.0 + capture / 1000, 7.5,
+                                    300.0, relative_altitude=height))
+
+    kept, excluded = PhotoFilter({"enabled": True, "min_altitude": 20}).filter(paths, group_size=2)
+
+    assert kept == paths[2:]
+    assert list(excluded) == [paths[0]]
+
+def test_position_distance():
+    first = {"latitude": 48.0, "longitude": 7.5, "altitude": 300.0}
+
+    assert position_distance(first, first) == 0.0
+    assert position_distance(first, dict(first, latitude=48.001)) == pytest.approx(111.2, abs=0.1)
+    assert position_distance(first, dict(first, altitude=303.0)) == pytest.approx(3.0)
+
+def test_write_report(tmp_path):
+    job = ChunkJob("flight_RGB", ["b.JPG"], excluded={"a.JPG": ("below_min_altitude", 2.0)})
+
+    assert write_report(str(tmp_path / "report.csv"), [job]) == 1
+
+    with open(tmp_path / "report.csv", newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert rows == [{"chunk": "flight_RGB", "path": "a.JPG", "reason": "below_min_altitude", "value": "2.0"}]
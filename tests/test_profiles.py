@@ -0,0 +1,35 @@
+import pytest
+from pipeline.profiles import build_profiles, select_profile, validate_profiles
+
+def test_build_profiles_merges_overrides():
+    profiles = build_profiles({"standard": {"build_depth_maps": {"downscale": 4}}, "night": {"smooth_model": {"strength": 2}}})
+
+    assert profiles["standard"]["build_depth_maps"] == {"downscale": 4, "filter_mode": "MildFiltering"}
+    assert profiles["night"]["smooth_model"]["strength"] == 2
+    assert profiles["night"]["align_photos"]["keypoint_limit"] == 60000
+    assert profiles["preview"]["build_depth_maps"]["downscale"] == 8
+
+def test_select_profile_precedence():
+    config = {"profile": "high", "folder_profiles": {"*_fresh_*": "preview"}, "channel_profiles": {"NIR": "standard"}}
+
+    assert select_profile(config, "2024_fresh_unprocessed", "NIR") == "standard"
+    assert select_profile(config, "2024_fresh_unprocessed", "RGB") == "preview"
+    assert select_profile(config, "2024_unprocessed", "RGB") == "high"
+    assert select_profile({}, "2024_unprocessed", "RGB") == "standard"
+
+@pytest.mark.parametrize("config", [
+    {"profiles": {"fast": {"build_mesh": {}}}},
+    {"profiles": {"fast": {"build_depth_maps": {"quality": 1}}}},
+    {"profiles": {"fast": {"build_depth_maps": {"downscale": "2"}}}},
+    {"profiles": {"fast": {"build_depth_maps": {"filter_mode": "Strong"}}}},
+    {"profiles": {"fast": {"align_photos": {"keypoint_limit": True}}}},
+    {"profile": "ultra"},
+    {"channel_profiles": {"NIR": "ultra"}},
+])
+def test_validate_profiles_rejects_invalid(config):
+    with pytest.raises(ValueError):
+        validate_profiles(config)
+
+def test_validate_profiles_accepts_valid():
+    validate_profiles({"profiles": {"fast": {"build_depth_maps": {"downscale": 4}}}, "folder_profiles": {"*": "fast"}})
+    validate_profiles({})
@@ -0,0 +1,104 @@
+import os
+import json
+import pytest
+from pipeline import progress as progress_module
+from pipeline.progress import ProgressTracker, DEFAULT_SECONDS_PER_IMAGE
+from pipeline.scheduler import ChunkJob
+
+def make_tracker(tmp_path, **config):
+    return ProgressTracker(str(tmp_path), dict({"interval": 0}, **config))
+
+def read_status(tracker):
+    with open(tracker.status_file) as file:
+        return json.load(file)
+
+def test_eta_from_default_throughput(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"] * 10), ["align_photos", "build_depth_maps"])])
+
+    assert tracker.eta() == pytest.approx(10 * (DEFAULT_SECONDS_PER_IMAGE["align_photos"]
+                                                + DEFAULT_SECONDS_PER_IMAGE["build_depth_maps"]))
+    assert read_status(tracker)["chunks"] == {
+        "flight_RGB": {"done": [], "remaining": ["align_photos", "build_depth_maps"], "failed": False}}
+
+def test_track_publishes_progress_and_learns_throughput(tmp_path, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(progress_module.time, "monotonic", lambda: clock[0])
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"] * 10), ["align_photos", "build_depth_maps"])])
+
+    with tracker.track("flight_RGB", "align_photos") as callback:
+        clock[0] += 30.0
+        callback(25.0)
+        status = read_status(tracker)
+        assert (status["stage"], status["stage_progress"]) == ("align_photos", 25.0)
+        # 30 s for the first quarter, so 90 s for the rest of the stage, plus the depth maps still to run
+        assert status["stage_eta_seconds"] == 90
+        assert status["eta_seconds"] == 90 + 10 * DEFAULT_SECONDS_PER_IMAGE["build_depth_maps"]
+        clock[0] += 90.0
+
+    assert tracker.rate("standard", "align_photos") == pytest.approx(12.0)
+    assert read_status(tracker)["chunks"]["flight_RGB"]["done"] == ["align_photos"]
+    # The history is written once the folder is finished
+    assert ProgressTracker(str(tmp_path)).rate("standard", "align_photos") == DEFAULT_SECONDS_PER_IMAGE["align_photos"]
+    tracker.close()
+    assert ProgressTracker(str(tmp_path)).rate("standard", "align_photos") == pytest.approx(12.0)
+
+def test_retried_stage_learns_successful_attempt_only(tmp_path, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(progress_module.time, "monotonic", lambda: clock[0])
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"] * 10), ["align_photos"])])
+
+    with tracker.track("flight_RGB", "align_photos"):
+        # A failed attempt and the delay before the retry
+        clock[0] += 500.0
+        tracker.restart()
+        clock[0] += 20.0
+
+    assert tracker.rate("standard", "align_photos") == pytest.approx(2.0)
+
+def test_history_merges_rates_of_other_processes(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"] * 10), ["align_photos"])])
+    other = make_tracker(tmp_path)
+    other.start_folder("/flight", [(ChunkJob("flight_NIR", ["a.TIF"] * 10, profile="preview"), ["align_photos"])])
+
+    other.complete("flight_NIR", "align_photos", 10.0)
+    tracker.complete("flight_RGB", "align_photos", 30.0)
+    other.save_history()
+    tracker.save_history()
+
+    assert ProgressTracker(str(tmp_path)).read_history() == {"preview/align_photos": pytest.approx(1.0),
+                                                             "standard/align_photos": pytest.approx(3.0)}
+
+def test_worker_removes_its_status_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(progress_module.multiprocessing, "parent_process", lambda: object())
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"]), ["align_photos"])])
+    assert os.path.basename(tracker.status_file) == f"status_{os.getpid()}.json"
+    assert os.path.exists(tracker.status_file)
+
+    tracker.close()
+    assert not os.path.exists(tracker.status_file)
+
+def test_failed_stage_clears_remaining_work(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"]), ["align_photos", "build_depth_maps"])])
+
+    with pytest.raises(RuntimeError):
+        with tracker.track("flight_RGB", "align_photos"):
+            raise RuntimeError("killed")
+
+    assert read_status(tracker)["chunks"]["flight_RGB"] == {"done": [], "remaining": [], "failed": True}
+    assert tracker.eta() == 0.0
+
+def test_split_moves_remaining_stages_to_tiles(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.start_folder("/flight", [(ChunkJob("flight_RGB", ["a.JPG"] * 8), ["build_depth_maps"])])
+
+    tracker.split("flight_RGB", ["flight_RGB_tile00", "flight_RGB_tile01"])
+
+    assert tracker.chunks["flight_RGB"]["remaining"] == []
+    assert tracker.estimate("flight_RGB_tile01", "build_depth_maps") == pytest.approx(
+        4 * DEFAULT_SECONDS_PER_IMAGE["build_depth_maps"])
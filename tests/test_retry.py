@@ -0,0 +1,147 @@
+import os
+import json
+import glob
+from pipeline.checkpoint import StageManifest
+from pipeline.scheduler import ChunkJob
+from pipeline.instrumentation import StageRecorder
+from pipeline.retry import RetryPolicy, classify
+import fake_metashape
+from helpers import make_processor, stage_calls
+
+def make_retrying_processor(tmp_path):
+    processor = make_processor(tmp_path)
+    processor.retry = RetryPolicy({"enabled": True, "delay": 0})
+    return processor
+
+def test_classify():
+    assert classify(RuntimeError("Not enough memory")) == "oom"
+    assert classify(MemoryError()) == "oom"
+    assert classify(RuntimeError("CUDA error: out of memory")) == "oom"
+    assert classify(RuntimeError("Kernel failed: CUDA_ERROR_LAUNCH_FAILED")) == "gpu"
+    assert classify(OSError("Input/output error")) == "io"
+    assert classify(RuntimeError("Can't open file: photo.jpg")) == "io"
+    assert classify(RuntimeError("Empty surface")) == "data"
+
+def test_retry_policy_downgrades_memory_failures():
+    policy = RetryPolicy({"enabled": True, "attempts": {"oom": 3}})
+
+    assert policy.next_action("oom", 1, {"downscale": 2}, True) == ("downscale", 4)
+    assert policy.next_action("oom", 2, {"downscale": 4}, True) == ("downscale", 8)
+    assert policy.next_action("oom", 3, {"downscale": 8}, True) == ("cpu", None)
+    assert policy.next_action("oom", 4, {"downscale": 8}, False) is None
+    assert policy.next_action("gpu", 1, {}, True) == ("cpu", None)
+    assert policy.next_action("io", 1, {}, False) == ("retry", None)
+    assert policy.next_action("data", 1, {}, True) is None
+    assert RetryPolicy().next_action("io", 1, {}, False) is None
+
+def test_memory_failure_retries_with_higher_downscale(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.retry = RetryPolicy({"enabled": True, "delay": 0})
+    recorder = StageRecorder(str(tmp_path / "tmp"))
+    fake_metashape.fail_on["buildDepthMaps"] = RuntimeError("Not enough memory")
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"), recorder)
+
+    assert [call[2]["downscale"] for call in stage_calls(fake_metashape, "buildDepthMaps")] == [2, 4]
+    failed = [record for record in recorder.records if record["status"] == "failed"]
+    assert [(record["failure"], record["retry"]) for record in failed] == [("oom", "downscale 4")]
+
+    # A resumed run keeps the downscale that worked
+    fake_metashape.reset()
+    manifest = StageManifest(manifest.manifest_path)
+    assert manifest.overrides == {"flight_RGB": {"build_depth_maps": {"downscale": 4}}}
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"))
+    assert fake_metashape.calls == []
+
+def test_gpu_failure_retries_on_cpu(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.retry = RetryPolicy({"enabled": True, "delay": 0})
+    recorder = StageRecorder(str(tmp_path / "tmp"))
+    fake_metashape.fail_on["buildModel"] = RuntimeError("Kernel failed: CUDA_ERROR_LAUNCH_FAILED")
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(tmp_path / "tmp"), recorder)
+
+    assert [record["gpu_mask"] for record in recorder.records if record["stage"] == "build_model"] == [1, 0]
+    assert fake_metashape.app.gpu_mask == 1
+
+def test_memory_failure_falls_back_to_tiles(tmp_path, chunk_project):
+    processor, project, manifest = chunk_project
+    processor.retry = RetryPolicy({"enabled": True, "delay": 0, "attempts": {"oom": 1}})
+    processor.tiling = {"tile_size": 50, "overlap": 5}
+    export = tmp_path / "tmp" / "export"
+    os.makedirs(export)
+    fake_metashape.fail_on["buildDepthMaps"] = [RuntimeError("Not enough memory")] * 2
+
+    processor.process_chunk(project, manifest, ChunkJob("flight_RGB", ["a.JPG"]), str(export))
+
+    # Two failed attempts on the whole chunk, then one per tile with the higher downscale
+    assert [call[2]["downscale"] for call in stage_calls(fake_metashape, "buildDepthMaps")] == [2, 4] + [4] * 4
+    assert (export / "flight_RGB_orthomosaic.vrt").read_text().count("<ComplexSource>") == 4
+
+def test_failure_summary_lists_failed_chunks(tmp_path, fake_metashape_module):
+    processor = make_retrying_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    for name in ["DJI_0001_D.JPG", "DJI_0001_MS_NIR.TIF"]:
+        (flight / name).write_bytes(b"")
+    fake_metashape_module.fail_on["buildModel"] = [OSError("Input/output error"), RuntimeError("Empty surface")]
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    [path] = glob.glob(str(tmp_path / "**" / "flight_unprocessed_failures.json"), recursive=True)
+    with open(path) as file:
+        summary = json.load(file)
+    [(chunk_name, failure)] = summary["failed_chunks"].items()
+    assert (failure["failure"], failure["stage"], failure["missing_outputs"]) == ("data", "build_model", ["orthomosaic"])
+    assert [(attempt["failure"], attempt["retry"]) for attempt in summary["attempts"]] == [("io", "same settings"),
+                                                                                          ("data", None)]
+
+def test_failure_summary_lists_only_missing_outputs(tmp_path, fake_metashape_module):
+    processor = make_retrying_processor(tmp_path)
+    processor.outputs = ["orthomosaic", "point_cloud"]
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    (flight / "DJI_0001_D.JPG").write_bytes(b"")
+    fake_metashape_module.fail_on["exportPointCloud"] = RuntimeError("Empty point cloud")
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    [path] = glob.glob(str(tmp_path / "**" / "flight_unprocessed_failures.json"), recursive=True)
+    with open(path) as file:
+        summary = json.load(file)
+    assert summary["failed_chunks"]["sub_RGB"]["missing_outputs"] == ["point_cloud"]
+
+def test_chunk_without_transform_fails_the_folder(tmp_path, fake_metashape_module, monkeypatch):
+    processor = make_retrying_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    (flight / "DJI_0001_D.JPG").write_bytes(b"")
+    # Alignment that finds no cameras leaves the chunk without a transform
+    monkeypatch.setattr(fake_metashape_module.Chunk, "alignCameras",
+                        lambda chunk, cameras=None, **kwargs: chunk._record("alignCameras", **kwargs))
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    assert os.listdir(tmp_path / "input") == ["flight_unprocessed"]
+    assert stage_calls(fake_metashape_module, "exportRaster") == []
+    [path] = glob.glob(str(tmp_path / "tmp" / "**" / "flight_unprocessed_failures.json"), recursive=True)
+    with open(path) as file:
+        summary = json.load(file)
+    assert summary["failed_chunks"]["sub_RGB"]["missing_outputs"] == ["orthomosaic"]
+
+def test_failure_summary_lists_chunks_without_exports(tmp_path, fake_metashape_module, monkeypatch):
+    processor = make_retrying_processor(tmp_path)
+    flight = tmp_path / "input" / "flight_unprocessed" / "photos" / "sub"
+    os.makedirs(flight)
+    (flight / "DJI_0001_D.JPG").write_bytes(b"")
+    # The export finishes without writing the orthomosaic
+    monkeypatch.setattr(fake_metashape_module.Chunk, "exportRaster",
+                        lambda chunk, path, **kwargs: chunk._record("exportRaster", path=path, **kwargs))
+
+    processor.process_unprocessed_folder(str(tmp_path / "input" / "flight_unprocessed"))
+
+    assert os.listdir(tmp_path / "input") == ["flight_unprocessed"]
+    [path] = glob.glob(str(tmp_path / "tmp" / "**" / "flight_unprocessed_failures.json"), recursive=True)
+    with open(path) as file:
+        summary = json.load(file)
+    assert summary["failed_chunks"]["sub_RGB"]["missing_outputs"] == ["orthomosaic"]
@@ -0,0 +1,40 @@
+import pytest
+from pipeline.profiles import build_profiles
+from pipeline.stages import plan_stages, release_points, validate_outputs, validate_retention
+
+def test_plan_prunes_point_cloud_for_orthomosaic():
+    planned, pruned = plan_stages(build_profiles()["standard"], ["orthomosaic"])
+
+    assert planned == ["align_photos", "build_depth_maps", "build_model", "smooth_model",
+                       "build_orthomosaic", "export_raster"]
+    assert "build_point_cloud" in pruned
+
+def test_plan_dem_from_point_cloud():
+    planned, pruned = plan_stages(build_profiles()["standard"], ["dem"])
+
+    assert planned == ["align_photos", "build_depth_maps", "build_point_cloud", "build_dem", "export_dem"]
+
+def test_plan_preview_uses_tie_point_dem():
+    planned, pruned = plan_stages(build_profiles()["preview"], ["orthomosaic"])
+
+    assert planned == ["align_photos", "build_dem", "build_orthomosaic", "export_raster"]
+
+def test_validate_outputs():
+    validate_outputs({"outputs": ["orthomosaic", "dem"]})
+    with pytest.raises(ValueError):
+        validate_outputs({"outputs": ["mesh"]})
+
+def test_release_points_after_last_consumer():
+    params = build_profiles()["standard"]
+    planned, pruned = plan_stages(params, ["orthomosaic", "point_cloud"])
+
+    releases = release_points(params, planned, ["depth_maps", "point_cloud", "model"])
+
+    # Depth maps feed both the model and the point cloud; the smoothed model is the same data as the model
+    assert releases == {"build_point_cloud": ["depth_maps"], "build_orthomosaic": ["model"],
+                        "export_point_cloud": ["point_cloud"]}
+
+def test_validate_retention():
+    validate_retention({"retention": "project"})
+    with pytest.raises(ValueError):
+        validate_retention({"retention": "nothing"})
@@ -0,0 +1,145 @@
+import os
+import json
+import pytest
+from pipeline import staging
+from pipeline.staging import ImageStager
+from pipeline.scheduler import ChunkJob
+import fake_metashape
+from helpers import make_processor, stage_calls
+
+@pytest.fixture
+def other_filesystem(monkeypatch):
+    """
+    Treats the input and the staging folder as different filesystems, as an NFS mount and a local disk.
+    """
+    monkeypatch.setattr(staging, "same_filesystem", lambda src_dir, dest_dir: False)
+
+def make_flight(folder, names):
+    os.makedirs(folder / "photos" / "sub")
+    paths = []
+    for name in names:
+        (folder / "photos" / "sub" / name).write_bytes(name.encode())
+        paths.append(str(folder / "photos" / "sub" / name))
+    return paths
+
+def test_stage_copies_images_and_release_removes_them(tmp_path, other_filesystem):
+    folder = tmp_path / "flight_unprocessed"
+    paths = make_flight(folder, ["DJI_0001_D.JPG", "DJI_0002_D.JPG"])
+    job = ChunkJob("sub_RGB", paths, input_bytes=28)
+    stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True})
+
+    assert stager.required_bytes(str(folder), [job]) == 28
+    assert stager.stage(str(folder), [job]) == 2
+
+    staged = tmp_path / "tmp" / "staging" / "flight" / "photos" / "sub" / "DJI_0001_D.JPG"
+    assert job.staged[paths[0]] == str(staged)
+    assert staged.read_bytes() == b"DJI_0001_D.JPG"
+    assert os.path.exists(paths[0])
+    assert stager.required_bytes(str(folder), [job]) == 0
+
+    stager.release(str(folder))
+    assert not os.path.exists(tmp_path / "tmp" / "staging" / "flight")
+
+def test_stage_is_skipped_without_space_or_on_same_filesystem(tmp_path):
+    folder = tmp_path / "flight_unprocessed"
+    job = ChunkJob("sub_RGB", make_flight(folder, ["DJI_0001_D.JPG"]), input_bytes=14)
+
+    assert ImageStager(str(tmp_path / "tmp")).stage(str(folder), [job]) == 0
+    assert ImageStager(str(tmp_path / "tmp"), {"enabled": True}).stage(str(folder), [job]) == 0
+    assert job.staged == {}
+
+def test_cache_reuses_unchanged_copies(tmp_path, other_filesystem):
+    folder = tmp_path / "flight_unprocessed"
+    paths = make_flight(folder, ["DJI_0001_D.JPG", "DJI_0002_D.JPG"])
+    stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 1})
+    stager.stage(str(folder), [ChunkJob("sub_RGB", paths)])
+    stager.release(str(folder))
+
+    # A new run finds the copies through the index; the changed image is copied again
+    (folder / "photos" / "sub" / "DJI_0002_D.JPG").write_bytes(b"changed")
+    stat = os.stat(paths[1])
+    os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 1})
+    job = ChunkJob("sub_RGB", paths)
+    assert stager.stage(str(folder), [job]) == 2
+
+    assert stager.stats["hits"] == 1
+    assert stager.stats["misses"] == 1
+    assert stager.stats["bytes_saved"] == 14
+    assert open(job.staged[paths[1]], 'rb').read() == b"changed"
+
+def test_cache_survives_folder_rename(tmp_path, other_filesystem):
+    folder = tmp_path / "flight_unprocessed"
+    paths = make_flight(folder, ["DJI_0001_D.JPG"])
+    stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 1})
+    stager.stage(str(folder), [ChunkJob("sub_RGB", paths)])
+    stager.release(str(folder))
+
+    # The incremental pass stages the processed folder
+    processed = tmp_path / "flight_processed"
+    os.rename(folder, processed)
+    job = ChunkJob("sub_RGB", [path.replace(str(folder), str(processed)) for path in paths])
+    assert stager.stage(str(processed), [job]) == 1
+
+    assert stager.stats["hits"] == 1
+    staged = tmp_path / "tmp" / "staging" / "flight" / "photos" / "sub" / "DJI_0001_D.JPG"
+    assert job.staged[job.image_list[0]] == str(staged)
+
+def test_incremental_update_reuses_copies_of_renamed_folder(tmp_path, fake_metashape_module, other_filesystem):
+    processor = make_processor(tmp_path)
+    processor.stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 1})
+    make_flight(tmp_path / "input" / "flight_unprocessed", ["DJI_0001_D.JPG", "DJI_0002_D.JPG"])
+    processor.process_folders()
+
+    processed = tmp_path / "input" / "flight_processed"
+    (processed / "photos" / "sub" / "DJI_0003_D.JPG").write_bytes(b"new")
+    processor.incremental = {"enabled": True, "neighbors": 1}
+    fake_metashape_module.reset()
+    processor.update_processed_folder(str(processed))
+
+    # The copies made before the rename are reused; only the new image is copied
+    assert processor.stager.stats["hits"] == 2
+    staged = tmp_path / "tmp" / "staging" / "flight" / "photos" / "sub" / "DJI_0003_D.JPG"
+    [add_photos] = stage_calls(fake_metashape_module, "addPhotos")
+    assert add_photos[2]["filenames"] == [str(staged)]
+    with open(processed / "project.psx") as file:
+        assert json.load(file)["chunks"][0]["photos"][-1] == str(processed / "photos" / "sub" / "DJI_0003_D.JPG")
+
+def test_cache_evicts_least_recently_used_unpinned_folders(tmp_path, other_filesystem):
+    stager = ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 30 / 1024 ** 3})
+    jobs = {}
+    for name in ["a_unprocessed", "b_unprocessed", "c_unprocessed"]:
+        jobs[name] = ChunkJob("sub_RGB", make_flight(tmp_path / name, ["DJI_0001_D.JPG"]))
+
+    stager.stage(str(tmp_path / "a_unprocessed"), [jobs["a_unprocessed"]])
+    stager.release(str(tmp_path / "a_unprocessed"))
+    stager.stage(str(tmp_path / "b_unprocessed"), [jobs["b_unprocessed"]])
+    stager.stage(str(tmp_path / "c_unprocessed"), [jobs["c_unprocessed"]])
+
+    # 'a' was released and is evicted; 'b' is still pinned
+    assert sorted(os.listdir(tmp_path / "tmp" / "staging")) == ["b", "c", "cache_index.json"]
+    assert stager.stats["evicted"] == 1
+    assert stager.cached_bytes() == 28
+
+def test_cache_budget_limits_staged_images(tmp_path, other_filesystem):
+    folder = tmp_path / "flight_unprocessed"
+    paths = make_flight(folder, ["DJI_0001_D.JPG", "DJI_0002_D.JPG"])
+    job = ChunkJob("sub_RGB", paths)
+
+    assert ImageStager(str(tmp_path / "tmp"), {"enabled": True, "max_gb": 20 / 1024 ** 3}).stage(str(folder), [job]) == 1
+    assert list(job.staged) == paths[:1]
+
+def test_staged_chunk_is_relinked_to_originals(tmp_path, chunk_project, other_filesystem):
+    processor, project, manifest = chunk_project
+    processor.stager.enabled = True
+    folder = tmp_path / "input" / "flight_unprocessed"
+    paths = make_flight(folder, ["DJI_0001_D.JPG", "DJI_0002_D.JPG"])
+
+    [job] = processor.prepare_folder(str(folder))
+    processor.process_chunk(project, manifest, job, str(tmp_path / "tmp"))
+
+    # Photos were loaded from the staged copies, the saved project points at the originals
+    [add_photos] = [call for call in fake_metashape.calls if call[1] == "addPhotos"]
+    assert add_photos[2]["filenames"] == [job.staged[path] for path in paths]
+    with open(tmp_path / "tmp" / "project.psx") as file:
+        assert json.load(file)["chunks"][0]["photos"] == paths
@@ -0,0 +1,40 @@
+import os
+import pytest
+from pipeline import tiff
+from pipeline.tiling import tile_grid, write_vrt
+from fake_metashape import Region, write_geotiff
+
+def test_tile_grid_covers_region_with_overlap():
+    tiles = tile_grid(100.0, 60.0, 50.0, 5.0)
+
+    assert len(tiles) == 4
+    assert tiles[0] == (-25.0, -15.0, 60.0, 40.0)
+    assert tiles[-1] == (25.0, 15.0, 60.0, 40.0)
+    assert tile_grid(10.0, 10.0, 50.0, 0.0) == [(0.0, 0.0, 10.0, 10.0)]
+
+def test_geotransform_from_tiff_tags(tmp_path):
+    path = str(tmp_path / "tile.tif")
+    write_geotiff(path, Region(center=(10.0, 20.0, 0.0), size=(4.0, 2.0, 1.0)))
+
+    tags = tiff.read_tags(path)
+
+    assert (tags[tiff.IMAGE_WIDTH], tags[tiff.IMAGE_LENGTH]) == (4, 2)
+    assert tiff.geotransform(tags) == (8.0, 1.0, 0.0, 21.0, 0.0, -1.0)
+
+def test_write_vrt_places_tiles(tmp_path):
+    os.makedirs(tmp_path / "tiles")
+    paths = []
+    for index, center in enumerate([(-5.0, 0.0, 0.0), (5.0, 0.0, 0.0)]):
+        paths.append(str(tmp_path / "tiles" / f"tile{index}.tif"))
+        write_geotiff(paths[-1], Region(center=center, size=(12.0, 10.0, 1.0)))
+
+    write_vrt(str(tmp_path / "mosaic.vrt"), paths)
+
+    vrt = (tmp_path / "mosaic.vrt").read_text()
+    assert 'rasterXSize="22" rasterYSize="10"' in vrt
+    assert '<SourceFilename relativeToVRT="1">tiles/tile1.tif</SourceFilename>' in vrt
+    assert '<DstRect xOff="10" yOff="0" xSize="12" ySize="10"/>' in vrt
+
+def test_write_vrt_needs_tiles(tmp_path):
+    with pytest.raises(ValueError):
+        write_vrt(str(tmp_path / "mosaic.vrt"), [])
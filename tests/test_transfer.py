@@ -0,0 +1,55 @@
+import os
+import pytest
+from pipeline import transfer
+from pipeline.transfer import TransferEngine, PART_SUFFIX
+
+def make_tree(root):
+    os.makedirs(root / "project.files" / "0", exist_ok=True)
+    (root / "project.psx").write_bytes(b"psx")
+    (root / "project.files" / "0" / "depth.zip").write_bytes(os.urandom(300000))
+    return root
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    # Take the copy path even though tmp_path is a single filesystem
+    monkeypatch.setattr(transfer, "same_filesystem", lambda src_dir, dest_dir: False)
+
+def test_move_tree_copies_verifies_and_removes_source(tmp_path, cross_device):
+    src = make_tree(tmp_path / "src")
+    payload = (src / "project.files" / "0" / "depth.zip").read_bytes()
+    os.makedirs(tmp_path / "dest" / "project.files")
+
+    stats = TransferEngine({"workers": 2, "buffer_mb": 1}).move_tree(str(src), str(tmp_path / "dest"))
+
+    assert stats["files"] == 2
+    assert stats["bytes"] == len(payload) + 3
+    assert (tmp_path / "dest" / "project.files" / "0" / "depth.zip").read_bytes() == payload
+    assert os.listdir(src) == []
+
+def test_move_file_resumes_partial_copy(tmp_path):
+    src = tmp_path / "ortho.tif"
+    src.write_bytes(b"a" * 1000 + b"b" * 1000)
+    dest = tmp_path / "dest.tif"
+    (tmp_path / ("dest.tif" + PART_SUFFIX)).write_bytes(b"a" * 1000)
+
+    copied = TransferEngine().move_file(str(src), str(dest))
+
+    assert copied == 1000
+    assert dest.read_bytes() == b"a" * 1000 + b"b" * 1000
+    assert not src.exists()
+
+def test_move_file_recopies_corrupt_part(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "COPY_METHODS", ["read"])
+    src = tmp_path / "ortho.tif"
+    src.write_bytes(b"a" * 2000)
+    dest = tmp_path / "dest.tif"
+    (tmp_path / ("dest.tif" + PART_SUFFIX)).write_bytes(b"x" * 1000)
+
+    TransferEngine({"buffer_mb": 1}).move_file(str(src), str(dest))
+
+    assert dest.read_bytes() == b"a" * 2000
+    assert not (tmp_path / ("dest.tif" + PART_SUFFIX)).exists()
+
+def test_unknown_checksum_is_rejected():
+    with pytest.raises(ValueError):
+        TransferEngine({"checksum": "crc99"})
@@ -1,5 +1,9 @@
+import sys
+import logging
 import pytest
-from pipeline.utils import load_config, check_free_space
+from pipeline import utils
+from pipeline.utils import (load_config, check_free_space, StreamToLogger, setup_logger, stop_logging, chunk_logging,
+                            campaign_name)
 
 def test_load_config_valid():
     config = load_config("tests/test_config.yaml")
@@ -22,3 +26,56 @@ def test_check_free_space_not_enough_space(monkeypatch):
     monkeypatch.setattr("shutil.disk_usage", mock_disk_usage)
     with pytest.raises(RuntimeError):
         check_free_space(100, "/mnt/data/")
+
+def test_load_config_invalid_profile(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("profiles:\n  fast:\n    build_depth_maps:\n      downscale: fast\n")
+    with pytest.raises(ValueError):
+        load_config(str(config_file))
+
+def test_stream_to_logger_limits_progress_lines(caplog):
+    stream = StreamToLogger(logging.getLogger("metashape"), logging.INFO, progress_interval=60)
+
+    with caplog.at_level(logging.INFO):
+        stream.write("BuildDepthMaps: 10%\rBuildDepthMaps: 20%\rBuildDepthMaps: 100%\n")
+        stream.write("finished depth maps in 12.3 sec")
+        assert [record.message for record in caplog.records] == ["BuildDepthMaps: 10%", "BuildDepthMaps: 100%"]
+        stream.flush()
+
+    assert caplog.records[-1].message == "finished depth maps in 12.3 sec"
+
+def test_setup_logger_is_idempotent_and_writes_chunk_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.setattr(sys, "stderr", sys.stderr)
+    stop_logging()
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    try:
+        logger = setup_logger(str(tmp_path / "run.log"))
+        assert setup_logger(str(tmp_path / "run.log")) is logger
+        assert [type(handler).__name__ for handler in root.handlers] == ["QueueHandler"]
+
+        with chunk_logging(str(tmp_path / "folder.log")):
+            with chunk_logging(str(tmp_path / "chunk.log")):
+                logger.info("inside chunk")
+                print("metashape output")
+            logger.info("inside folder")
+        logger.info("outside chunk")
+    finally:
+        stop_logging()
+
+    assert root.handlers == handlers
+    chunk_log = (tmp_path / "chunk.log").read_text()
+    assert "inside chunk" in chunk_log and "metashape output" in chunk_log
+    assert "outside chunk" not in chunk_log and "inside folder" not in chunk_log
+    folder_log = (tmp_path / "folder.log").read_text()
+    assert "inside chunk" in folder_log and "inside folder" in folder_log
+    assert "outside chunk" not in folder_log
+    assert "outside chunk" in (tmp_path / "run.log").read_text()
+    assert utils._listener is None
+
+def test_campaign_name_matches_the_rename():
+    assert campaign_name("/input/flight_unprocessed/") == "flight"
+    assert campaign_name("/input/flight_processed") == "flight"
+    # The rename replaces the marker anywhere in the name
+    assert campaign_name("/input/a_unprocessed_rgb") == campaign_name("/input/a_processed_rgb") == "a_rgb"
@@ -0,0 +1,131 @@
+import os
+import shutil
+from pipeline.watcher import FolderWatcher, ProcessingQueue
+from helpers import make_processor
+
+class RecordingProcessor:
+    def __init__(self, renames=True):
+        self.processed = []
+        self.renames = renames
+
+    def process_batch(self, folder_paths):
+        for folder_path in folder_paths:
+            self.processed.append(folder_path)
+            if self.renames:
+                os.rename(folder_path, folder_path.replace("_unprocessed", "_processed"))
+
+def make_watcher(tmp_path, processor, **watch):
+    config = {"input_folder": str(tmp_path / "input"), "tmp_folder": str(tmp_path),
+              "watch": dict({"poll_interval": 0, "settle_time": 0}, **watch)}
+    return FolderWatcher(processor, config)
+
+def make_folder(tmp_path, name, images=1):
+    photos = tmp_path / "input" / name / "photos" / "sub"
+    os.makedirs(photos, exist_ok=True)
+    for index in range(images):
+        (photos / f"DJI_{index:04d}_D.JPG").write_bytes(b"x")
+    return str(tmp_path / "input" / name)
+
+def test_queue_orders_by_priority_and_survives_restart(tmp_path):
+    queue = ProcessingQueue(str(tmp_path / "queue.json"))
+    queue.push("a", priority=0)
+    queue.push("b", priority=5)
+    assert queue.pop() == "b"
+
+    # 'b' was being processed when the daemon stopped
+    restarted = ProcessingQueue(str(tmp_path / "queue.json"))
+    assert restarted.pop() == "b"
+    restarted.mark("b", "done")
+    assert restarted.pop() == "a"
+    assert restarted.pop() is None
+
+def test_watcher_waits_for_stable_uploads(tmp_path):
+    processor = RecordingProcessor()
+    watcher = make_watcher(tmp_path, processor)
+    folder = make_folder(tmp_path, "flight_unprocessed")
+
+    assert watcher.poll() == []
+    make_folder(tmp_path, "flight_unprocessed", images=2)
+    assert watcher.poll() == []
+    assert watcher.poll() == [folder]
+
+def test_watcher_processes_by_priority(tmp_path):
+    processor = RecordingProcessor()
+    watcher = make_watcher(tmp_path, processor, priorities={"*urgent*": 10})
+    first = make_folder(tmp_path, "a_unprocessed")
+    second = make_folder(tmp_path, "b_urgent_unprocessed")
+
+    watcher.run(max_cycles=2)
+
+    assert processor.processed == [second, first]
+    assert watcher.queue.entries[first]["state"] == "done"
+
+def test_watcher_retries_failed_folders_once_changed(tmp_path):
+    processor = RecordingProcessor(renames=False)
+    watcher = make_watcher(tmp_path, processor)
+    folder = make_folder(tmp_path, "a_unprocessed")
+
+    watcher.run(max_cycles=3)
+
+    # Not renamed to '_processed', so not done, and not retried while unchanged
+    assert processor.processed == [folder]
+    assert watcher.queue.entries[folder]["state"] == "failed"
+
+    make_folder(tmp_path, "a_unprocessed", images=2)
+    processor.renames = True
+    watcher.run(max_cycles=3)
+    assert processor.processed == [folder, folder]
+    assert watcher.queue.entries[folder]["state"] == "done"
+
+def test_watcher_queues_folders_uploaded_again(tmp_path):
+    processor = RecordingProcessor()
+    watcher = make_watcher(tmp_path, processor)
+    folder = make_folder(tmp_path, "a_unprocessed")
+    watcher.run(max_cycles=2)
+
+    # The processed folder is archived and a flight is uploaded again under the same name
+    shutil.rmtree(tmp_path / "input" / "a_processed")
+    make_folder(tmp_path, "a_unprocessed")
+    watcher.run(max_cycles=3)
+
+    assert processor.processed == [folder, folder]
+
+def test_watcher_builds_previews(tmp_path, fake_metashape_module):
+    processor = make_processor(tmp_path)
+    processor.preview = {"enabled": True}
+    watcher = make_watcher(tmp_path, processor)
+    make_folder(tmp_path, "flight_unprocessed")
+
+    watcher.run(max_cycles=2)
+
+    export = tmp_path / "input" / "flight_processed" / "export"
+    assert "sub_RGB_preview_orthomosaic.tif" in os.listdir(export)
+    assert "sub_RGB_orthomosaic.tif" in os.listdir(export)
+    # The run log stays in place for the next batch
+    assert (tmp_path / "run.log").exists()
+
+class SkippingProcessor(RecordingProcessor):
+    def process_batch(self, folder_paths):
+        # Nothing fits into the temporary folder
+        self.processed.extend(folder_paths)
+        return list(folder_paths)
+
+def test_watcher_retries_deferred_folders(tmp_path):
+    processor = SkippingProcessor()
+    watcher = make_watcher(tmp_path, processor, retry_interval=0, max_retries=2)
+    folder = make_folder(tmp_path, "a_unprocessed")
+
+    watcher.run(max_cycles=2)
+    assert watcher.queue.entries[folder]["state"] == "deferred"
+
+    # Retried on the next polls without any change, then given up
+    watcher.run(max_cycles=2)
+    assert processor.processed == [folder, folder, folder]
+    assert watcher.queue.entries[folder]["state"] == "failed"
+
+def test_queue_ignores_corrupt_file(tmp_path):
+    (tmp_path / "queue.json").write_text("{")
+    queue = ProcessingQueue(str(tmp_path / "queue.json"))
+    assert queue.entries == {}
+    queue.push("a")
+    assert ProcessingQueue(str(tmp_path / "queue.json")).pop() == "a"